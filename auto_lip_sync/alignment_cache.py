@@ -0,0 +1,154 @@
+# On-disk cache of MFA alignments, keyed by a hash of the wav, the transcript,
+# the lexicon and the acoustic model. Entries are TextGrid files, stored in
+# Praat's binary format when the textgrid module is available (it reads both
+# formats); the least recently used ones are evicted once the cache grows
+# past max_bytes.
+# Several Maya sessions may share one cache folder: entries are written with
+# an atomic rename and eviction runs under a lock file.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import textgrid
+except ImportError:
+    textgrid = None
+
+ENTRY_EXTENSION = ".TextGrid"
+
+# (path, size, mtime) -> sha256, so the acoustic model zip is hashed once a session.
+_digest_memo = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+class CacheLock(object):
+    """
+    Cross-process lock based on exclusive creation of a lock file. A lock
+    older than stale_after seconds is assumed to belong to a dead session.
+    """
+
+    def __init__(self, path, timeout=10.0, stale_after=60.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.fd = None
+
+    def __enter__(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return self
+            except OSError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info):
+        os.close(self.fd)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class AlignmentCache(object):
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, wav_path, transcript_path, lexicon_path, model_path):
+        sha = hashlib.sha256()
+        for path in (wav_path, transcript_path, lexicon_path, model_path):
+            sha.update(file_digest(path).encode("ascii"))
+        return sha.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_EXTENSION)
+
+    def fetch(self, key, destination):
+        """
+        Copies the cached TextGrid for key to destination (a file path) and
+        returns True, or returns False on a cache miss.
+        """
+        entry = self.entry_path(key)
+        try:
+            shutil.copyfile(entry, destination)
+            os.utime(entry, None)  # mark as recently used
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, textgrid_path):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            try:
+                grid = textgrid.TextGrid.fromFile(textgrid_path)
+                grid.write(tmp_path, format="binary")
+            except Exception:
+                shutil.copyfile(textgrid_path, tmp_path)
+            os.replace(tmp_path, self.entry_path(key))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def invalidate(self, key):
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits max_bytes.
+        """
+        with CacheLock(os.path.join(self.cache_dir, ".lock")):
+            entries = []
+            for file in os.listdir(self.cache_dir):
+                if file.endswith(ENTRY_EXTENSION):
+                    path = os.path.join(self.cache_dir, file)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for mtime, size, path in entries)
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
@@ -0,0 +1,278 @@
+# Decoded audio cache. Every input wav is decoded once, mixed down to mono and
+# stored as float32 .npy arrays, one per sample rate a consumer asks for, in a
+# folder named after the hash of the wav's contents. Arrays are opened memory
+# mapped, so SER, amplitude analysis and the MFA corpus preparation share one
+# decode and repeat generations skip decoding and resampling entirely.
+#
+#   <cache_dir>/<sha256>/22050.npy    samples resampled for SER (librosa's default rate)
+#   <cache_dir>/<sha256>/16000.wav    16 kHz mono PCM copy for MFA
+#   <cache_dir>/<sha256>/source.json  sample rate, channels and length of the input
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from .alignment_cache import CacheLock, file_digest
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+SER_SAMPLE_RATE = 22050
+MFA_SAMPLE_RATE = 16000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioCacheError(Exception):
+    pass
+
+
+def read_wav(path):
+    """
+    Decodes a RIFF/WAVE file (8/16/24/32-bit PCM or 32/64-bit float) and
+    returns (samples, sample_rate, channels), samples being a float32 mono
+    mix in [-1, 1].
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:4] not in (b"RIFF", b"RF64") or data[8:12] != b"WAVE":
+        raise AudioCacheError("Not a wav file: {}".format(path))
+
+    fmt = None
+    payload = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            tag, channels, rate, _, block_align, bits = struct.unpack_from("<HHIIHH", data, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (tag, channels, rate, block_align, bits)
+        elif chunk_id == b"data":
+            if size == 0xFFFFFFFF or body + size > len(data):
+                size = len(data) - body  # streamed or truncated file
+            payload = data[body:body + size]
+            break
+        pos = body + size + (size & 1)
+    if fmt is None or payload is None:
+        raise AudioCacheError("Missing fmt or data chunk: {}".format(path))
+
+    tag, channels, rate, block_align, bits = fmt
+    payload = payload[:len(payload) - len(payload) % block_align]
+    if tag == WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(payload, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif tag == WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(payload, "<i2").astype(np.float32) / 32768.0
+    elif tag == WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(payload, np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) << 8 >> 8
+        samples = ints.astype(np.float32) / 8388608.0
+    elif tag == WAVE_FORMAT_PCM and bits == 32:
+        samples = (np.frombuffer(payload, "<i4") / 2147483648.0).astype(np.float32)
+    elif tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(payload, "<f4" if bits == 32 else "<f8").astype(np.float32)
+    else:
+        raise AudioCacheError("Unsupported wav encoding (format {}, {} bits): {}".format(
+            tag, bits, path))
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples, rate, channels
+
+
+def write_wav(path, samples, sample_rate):
+    """
+    Writes float samples as a 16-bit PCM mono wav.
+    """
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+    header = struct.pack("<4sI4s4sIHHIIHH4sI",
+                         b"RIFF", 36 + len(pcm), b"WAVE",
+                         b"fmt ", 16, WAVE_FORMAT_PCM, 1, sample_rate, sample_rate * 2, 2, 16,
+                         b"data", len(pcm))
+    with open(path, "wb") as file:
+        file.write(header)
+        file.write(pcm)
+
+
+def resample(samples, source_rate, target_rate):
+    """
+    Band-limited resampling: polyphase filtering when SciPy is available,
+    otherwise by zero-padding or truncating the spectrum.
+    """
+    if source_rate == target_rate or not len(samples):
+        return np.asarray(samples, dtype=np.float32)
+    if resample_poly is not None:
+        a, b = target_rate, source_rate
+        while b:
+            a, b = b, a % b
+        return resample_poly(samples, target_rate // a, source_rate // a).astype(np.float32)
+
+    n_out = int(round(len(samples) * float(target_rate) / source_rate))
+    spectrum = np.fft.rfft(samples)
+    resized = np.zeros(n_out // 2 + 1, dtype=spectrum.dtype)
+    keep = min(len(spectrum), len(resized))
+    resized[:keep] = spectrum[:keep]
+    return (np.fft.irfft(resized, n_out) * (float(n_out) / len(samples))).astype(np.float32)
+
+
+class AudioCache(object):
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def __repr__(self):
+        return "AudioCache({0})".format(self.cache_dir)
+
+    def entry_dir(self, wav_path):
+        return os.path.join(self.cache_dir, file_digest(wav_path))
+
+    def info(self, wav_path):
+        """
+        {"sample_rate", "channels", "frames"} of the source wav, decoding
+        it if it isn't cached yet.
+        """
+        entry = self.entry_dir(wav_path)
+        try:
+            with open(os.path.join(entry, "source.json")) as file:
+                return json.load(file)
+        except (IOError, OSError, ValueError):
+            self._decode(wav_path, entry)
+            with open(os.path.join(entry, "source.json")) as file:
+                return json.load(file)
+
+    def samples_path(self, wav_path, sample_rate=SER_SAMPLE_RATE):
+        """
+        Path of the float32 mono .npy array of wav_path at sample_rate
+        (None for the wav's own rate), creating it if needed.
+        """
+        entry = self.entry_dir(wav_path)
+        if sample_rate is None:
+            sample_rate = self.info(wav_path)["sample_rate"]
+        path = os.path.join(entry, "{}.npy".format(sample_rate))
+        if os.path.exists(path):
+            self._touch(entry)
+            return path
+
+        source_rate, source = self._decode(wav_path, entry)
+        if source_rate != sample_rate:
+            self._save_array(path, resample(source, source_rate, sample_rate))
+        self.evict()
+        return path
+
+    def samples(self, wav_path, sample_rate=SER_SAMPLE_RATE):
+        """
+        Read-only memory mapped float32 samples of wav_path at sample_rate.
+        """
+        return np.load(self.samples_path(wav_path, sample_rate), mmap_mode="r")
+
+    def wav_path(self, wav_path, sample_rate=MFA_SAMPLE_RATE):
+        """
+        Path of a 16-bit PCM mono copy of wav_path at sample_rate, creating
+        it from the cached samples if needed.
+        """
+        entry = self.entry_dir(wav_path)
+        path = os.path.join(entry, "{}.wav".format(sample_rate))
+        if os.path.exists(path):
+            self._touch(entry)
+            return path
+        samples = self.samples(wav_path, sample_rate)
+        fd, tmp_path = tempfile.mkstemp(dir=entry, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_wav(tmp_path, samples, sample_rate)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        return path
+
+    def _decode(self, wav_path, entry):
+        """
+        Returns (sample_rate, samples) at the wav's own rate, decoding and
+        storing them unless they're cached.
+        """
+        info_path = os.path.join(entry, "source.json")
+        try:
+            with open(info_path) as file:
+                info = json.load(file)
+            path = os.path.join(entry, "{}.npy".format(info["sample_rate"]))
+            samples = np.load(path, mmap_mode="r")
+            self._touch(entry)
+            return info["sample_rate"], samples
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+        start = time.time()
+        samples, sample_rate, channels = read_wav(wav_path)
+        if not os.path.isdir(entry):
+            os.makedirs(entry)
+        self._save_array(os.path.join(entry, "{}.npy".format(sample_rate)), samples)
+        info = {"sample_rate": sample_rate, "channels": channels, "frames": len(samples)}
+        fd, tmp_path = tempfile.mkstemp(dir=entry, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(info, file)
+        os.replace(tmp_path, info_path)
+        print("Decoded {} ({} Hz, {} ch) in {:.2f} sec".format(
+            wav_path, sample_rate, channels, time.time() - start))
+        return sample_rate, samples
+
+    def _save_array(self, path, samples):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.save(file, np.ascontiguousarray(samples, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+    def _touch(self, entry):
+        try:
+            os.utime(entry, None)  # mark as recently used
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits max_bytes.
+        """
+        with CacheLock(os.path.join(self.cache_dir, ".lock")):
+            entries = []
+            for folder in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, folder)
+                if not os.path.isdir(path):
+                    continue
+                try:
+                    size = sum(os.path.getsize(os.path.join(path, file))
+                               for file in os.listdir(path))
+                    entries.append((os.path.getmtime(path), size, path))
+                except OSError:
+                    continue
+
+            total = sum(size for mtime, size, path in entries)
+            # the newest entry is the one just written, always keep it
+            for mtime, size, path in sorted(entries)[:-1]:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
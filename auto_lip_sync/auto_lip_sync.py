@@ -1,12 +1,11 @@
-
 # How to run:
 # 1. Add the auto_lip_sync folder to your Maya scripts folder (username\Documents\maya\*version*\scripts).
-# 2. Insert your conda.exe path to the code (usually found in: C:\Users\username\miniconda3\Scripts\conda.exe). Be sure of the dependencies for each virtual ambient.
+# 2. Create the "aligner" and "ser" conda environments. They are found through conda (CONDA_EXE or conda on PATH); otherwise set
+#    AUTO_LIP_SYNC_CONDA, AUTO_LIP_SYNC_ALIGNER_PREFIX/AUTO_LIP_SYNC_SER_PREFIX or auto_lip_sync_settings.json (see launcher.py).
 # 3. To start the auto lipsync tool in Maya, execute the following lines of code in the Script editor:
 #    import auto_lip_sync
 #    auto_lip_sync.start()
 
-import shutil
 import os
 import sys
 import json
@@ -20,14 +19,11 @@ from shiboken2 import wrapInstance
 from collections import OrderedDict
 from PySide2 import QtCore, QtGui, QtWidgets
 
-# Insert your full conda path
-conda_exe = 'C:/Users/ferni/miniconda3/Scripts/conda.exe'
-
-# Import Textgrid module (kylebgorman/textgrid).
-try:
-    import textgrid
-except ImportError:
-    print("error in importing textgrid module")
+from . import (alignment_cache, audio_cache, generation, keyframe_planner, languages, launcher,
+               mfa, scene_writer, ser_client)
+from .pose_store import pose_store
+from .pipeline import Pipeline
+from .workspace import RunWorkspace
 
 
 class PoseConnectWidget(QtWidgets.QWidget):
@@ -65,8 +61,7 @@ class LipSyncDialog(QtWidgets.QDialog):
     PYTHON_VERSION = float(re.search(r'\d+\.\d+', sys.version).group())
 
     USER_SCRIPT_DIR = cmds.internalVar(userScriptDir=True)
-    OUTPUT_FOLDER_PATH = USER_SCRIPT_DIR+"output"
-    INPUT_FOLDER_PATH = USER_SCRIPT_DIR+"input"
+    RUNS_FOLDER_PATH = USER_SCRIPT_DIR+"runs"
 
     MFA_PATH = USER_SCRIPT_DIR+"montreal-forced-aligner/bin"
     if os.path.exists(MFA_PATH) == False:
@@ -74,13 +69,23 @@ class LipSyncDialog(QtWidgets.QDialog):
                            message="This path doesn't exist: "+MFA_PATH)
 
     SER_SCRIPT_PATH = USER_SCRIPT_DIR+"emotion-classifier/predict_script.py"
+    SER_WORKER_PATH = USER_SCRIPT_DIR+"emotion-classifier/ser_worker.py"
     SER_MODEL_PATH = USER_SCRIPT_DIR+"emotion-classifier/SER_model1.h5"
     SER_PATH = USER_SCRIPT_DIR + 'temp/'
+    ALIGNMENT_CACHE_PATH = USER_SCRIPT_DIR + "cache/alignment"
+    ALIGNMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    AUDIO_CACHE_PATH = USER_SCRIPT_DIR + "cache/audio"
+    AUDIO_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+    PHONE_TIER_NAME = generation.PHONE_TIER_NAME
+    INTENSITY_FLOOR = generation.INTENSITY_FLOOR
+    STAGE_STEPS = 100  # progress bar steps per pipeline stage
 
     sound_clip_path = ""
     text_file_path = ""
     pose_folder_path = ""
     active_controls = []
+    progress_dialog = None
+    scene_session = None
 
     phone_dict = {}
     phone_path_dict = OrderedDict([
@@ -139,10 +144,56 @@ class LipSyncDialog(QtWidgets.QDialog):
 
         self.language_label = QtWidgets.QLabel("Select language:")
         self.language_combo_box = QtWidgets.QComboBox()
-        self.language_combo_box.addItems(["English", "Japanese"])
+        self.language_combo_box.addItems(list(languages.LANGUAGES))
         self.language_combo_box.currentIndexChanged.connect(
             self.update_language_paths)
 
+        self.emotion_timeline_checkbox = QtWidgets.QCheckBox("Emotion timeline")
+        self.emotion_timeline_checkbox.setToolTip(
+            "Predict the emotion over sliding windows of the whole clip instead of once.")
+        self.emotion_window_spinbox = QtWidgets.QDoubleSpinBox()
+        self.emotion_window_spinbox.setRange(0.5, 10.0)
+        self.emotion_window_spinbox.setSingleStep(0.5)
+        self.emotion_window_spinbox.setValue(3.0)
+        self.emotion_window_spinbox.setPrefix("window ")
+        self.emotion_window_spinbox.setSuffix(" s")
+        self.emotion_hop_spinbox = QtWidgets.QDoubleSpinBox()
+        self.emotion_hop_spinbox.setRange(0.1, 10.0)
+        self.emotion_hop_spinbox.setSingleStep(0.5)
+        self.emotion_hop_spinbox.setValue(1.0)
+        self.emotion_hop_spinbox.setPrefix("hop ")
+        self.emotion_hop_spinbox.setSuffix(" s")
+
+        self.api_keying_checkbox = QtWidgets.QCheckBox("Fast keying")
+        self.api_keying_checkbox.setChecked(False)
+        self.api_keying_checkbox.setToolTip(
+            "Write animation curves in bulk through the Maya API. "
+            "These keys can't be undone with Ctrl+Z.")
+
+        self.intensity_checkbox = QtWidgets.QCheckBox("Amplitude intensity")
+        self.intensity_checkbox.setToolTip(
+            "Scale every phone pose towards the rest pose by the loudness of the audio.")
+
+        self.snap_frames_checkbox = QtWidgets.QCheckBox("Snap to frames")
+        self.snap_frames_checkbox.setChecked(True)
+        self.snap_frames_checkbox.setToolTip(
+            "Key on whole frames of the scene frame rate, keeping the longest phone on each frame.")
+
+        self.simplify_checkbox = QtWidgets.QCheckBox("Simplify curves")
+        self.simplify_checkbox.setChecked(False)
+        self.simplify_checkbox.setToolTip(
+            "Remove the keys inside holds, values within the tolerance counting as one hold.")
+        self.simplify_tolerance_spinbox = QtWidgets.QDoubleSpinBox()
+        self.simplify_tolerance_spinbox.setDecimals(4)
+        self.simplify_tolerance_spinbox.setRange(0.0, 10.0)
+        self.simplify_tolerance_spinbox.setSingleStep(0.001)
+        self.simplify_tolerance_spinbox.setValue(0.0)
+        self.simplify_tolerance_spinbox.setPrefix("tolerance ")
+
+        self.force_align_checkbox = QtWidgets.QCheckBox("Force re-align")
+        self.force_align_checkbox.setToolTip(
+            "Run MFA even if a cached alignment exists for these inputs.")
+
         self.pose_folder_label = QtWidgets.QLabel("Pose folder:")
         self.pose_filepath_line = QtWidgets.QLineEdit()
         self.pose_filepath_button = QtWidgets.QPushButton()
@@ -177,6 +228,16 @@ class LipSyncDialog(QtWidgets.QDialog):
         language_selection_row.addWidget(self.language_label)
         language_selection_row.addWidget(self.language_combo_box)
 
+        emotion_row = QtWidgets.QHBoxLayout()
+        emotion_row.addWidget(self.emotion_timeline_checkbox)
+        emotion_row.addWidget(self.emotion_window_spinbox)
+        emotion_row.addWidget(self.emotion_hop_spinbox)
+
+        simplify_row = QtWidgets.QHBoxLayout()
+        simplify_row.addWidget(self.snap_frames_checkbox)
+        simplify_row.addWidget(self.simplify_checkbox)
+        simplify_row.addWidget(self.simplify_tolerance_spinbox)
+
         pose_input_row = QtWidgets.QHBoxLayout()
         pose_input_row.addWidget(self.pose_folder_label)
         pose_input_row.addWidget(self.pose_filepath_line)
@@ -188,6 +249,9 @@ class LipSyncDialog(QtWidgets.QDialog):
         pose_buttons_row.addWidget(self.save_pose_button)
 
         bottom_buttons_row = QtWidgets.QHBoxLayout()
+        bottom_buttons_row.addWidget(self.api_keying_checkbox)
+        bottom_buttons_row.addWidget(self.intensity_checkbox)
+        bottom_buttons_row.addWidget(self.force_align_checkbox)
         bottom_buttons_row.addWidget(self.generate_keys_button)
         bottom_buttons_row.addWidget(self.close_button)
 
@@ -203,6 +267,8 @@ class LipSyncDialog(QtWidgets.QDialog):
         main_layout.addLayout(sound_input_row)
         main_layout.addLayout(text_input_row)
         main_layout.addLayout(language_selection_row)
+        main_layout.addLayout(emotion_row)
+        main_layout.addLayout(simplify_row)
         main_layout.addWidget(self.separator_line)
         main_layout.addLayout(pose_input_row)
         main_layout.addLayout(pose_buttons_row)
@@ -256,60 +322,14 @@ class LipSyncDialog(QtWidgets.QDialog):
             self.text_filepath_line.setText(file_path[0])
             self.text_file_path = file_path[0]
 
-    def find_textgrid_file(self):
-        path = self.OUTPUT_FOLDER_PATH
-        textgrid_file = ""
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.endswith(".TextGrid"):
-                    textgrid_file = root+"/"+file
-        return textgrid_file
-
-    def find_txt_file(self):
-        path = self.OUTPUT_FOLDER_PATH
-        txt_file = ""
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                if file.endswith(".txt"):
-                    txt_file = root+"/"+file
-        return txt_file
-
     def update_language_paths(self):
         selected_language = self.language_combo_box.currentText()
-        if selected_language == "English":
-            self.LANGUAGE_PATH = self.USER_SCRIPT_DIR + \
-                "montreal-forced-aligner/pretrained_models/english_us_arpa.zip"
-            print("LANGUAGE_PATH: ", self.LANGUAGE_PATH)
-            self.LEXICON_PATH = self.USER_SCRIPT_DIR + "librispeech-lexicon.txt"
-            self.phone_dict = {
-                "AA0": "AA", "AA1": "AA", "AA2": "AA", "AE0": "AA", "AE1": "AA", "AE2": "AA",
-                "AH0": "AA", "AH1": "AA", "AH2": "AA", "AO0": "AA", "AO1": "AA", "AO2": "AA",
-                "AW0": "WQ", "AW1": "WQ", "AW2": "WQ", "AY0": "AA", "AY1": "AA", "AY2": "AA",
-                "EH0": "EE", "EH1": "EE", "EH2": "EE", "ER0": "O", "ER1": "O", "ER2": "O", "EY0": "EE",
-                "EY1": "EE", "EY2": "E", "IH0": "AA", "IH1": "AA", "IH2": "AA", "IY0": "EE", "IY1": "EE",
-                "IY2": "EE", "OW0": "O", "OW1": "O", "OW2": "O", "OY0": "O", "OY1": "O", "OY2": "O",
-                "UH0": "U", "UH1": "U", "UH2": "U", "UW0": "U", "UW1": "U", "UW2": "U", "B": "BMP",
-                "CH": "TSCH", "D": "KSTN", "DH": "KSTN", "F": "FV", "G": "KSTN", "HH": "EE", "JH": "EE",
-                "K": "KSTN", "L": "L", "M": "BMP", "N": "KSTN", "NG": "KSTN", "P": "BMP", "R": "KSTN",
-                "S": "KSTN", "SH": "TSCH", "T": "TSCH", "TH": "KSTN", "V": "FV", "W": "WQ", "Y": "EE",
-                "Z": "EE", "ZH": "KSTN", "sil": "rest", "None": "rest", "sp": "rest", "spn": "rest", "": "rest"
-            }
-        elif selected_language == "Japanese":
-            self.LANGUAGE_PATH = self.USER_SCRIPT_DIR + \
-                "montreal-forced-aligner/pretrained_models/jp_model2.zip"
-            self.LEXICON_PATH = self.USER_SCRIPT_DIR + "jp_dict_simple.txt"
-            self.phone_dict = {
-                "a": "AA", "i": "EE", "u": "U", "e": "Er", "o": "O",
-                "k": "KSTN", "g": "KSTN", "s": "KSTN", "t": "KSTN", "d": "KSTN", "n": "KSTN", "z": "KSTN",
-                "sh": "TSCH", "ch": "TSCH", "ts": "TSCH", "j": "TSCH", "ji": "TSCH", "f": "FV", "v": "FV",
-                "m": "BMP", "b": "BMP", "p": "BMP", "w": "WQ", "nn": "BMP",
-                "ni": "EE", "nu": "U", "ha": "AA", "hi": "EE", "he": "E", "ho": "O",
-                "ra": "AA", "ri": "EE", "ru": "U", "re": "Er", "ro": "O",
-                "an": "AA", "in": "EE", "un": "U", "en": "Er", "on": "O",
-                "nin": "EE", "nun": "U", "han": "A", "hin": "EE", "hen": "Er", "hon": "O",
-                "ran": "AA", "rin": "EE", "run": "U", "ren": "Er", "ron": "O",
-                "sil": "rest", "None": "rest", "sp": "rest", "spn": "rest", "": "rest"
-            }
+        language = languages.LANGUAGES[selected_language]
+        self.LANGUAGE_PATH = self.USER_SCRIPT_DIR + language["model"]
+        print("LANGUAGE_PATH: ", self.LANGUAGE_PATH)
+        self.LEXICON_PATH = self.USER_SCRIPT_DIR + language["lexicon"]
+        self.phone_dict = language["phones"]
+        self.compile_phone_table()
 
         if not os.path.exists(self.LANGUAGE_PATH):
             cmds.confirmDialog(title="Path doesn't exist!",
@@ -323,10 +343,50 @@ class LipSyncDialog(QtWidgets.QDialog):
         pass
 
     def generate_animation(self):
-        number_of_operations = 12
-        current_operation = 0
+        use_timeline = self.emotion_timeline_checkbox.isChecked()
+        window = self.emotion_window_spinbox.value()
+        hop = self.emotion_hop_spinbox.value()
+        force_align = self.force_align_checkbox.isChecked()
+        backend = "api" if self.api_keying_checkbox.isChecked() else "commands"
+        use_intensity = self.intensity_checkbox.isChecked()
+        snap = self.snap_frames_checkbox.isChecked()
+        tolerance = None
+        if self.simplify_checkbox.isChecked():
+            tolerance = self.simplify_tolerance_spinbox.value()
+
+        # SER and MFA only meet at keyframing, so they run side by side on
+        # worker threads; everything touching maya.cmds stays on this thread.
+        RunWorkspace.purge_stale(self.RUNS_FOLDER_PATH)
+        workspace = RunWorkspace(self.RUNS_FOLDER_PATH)
+
+        pipeline = Pipeline(max_workers=2)
+        pipeline.add("audio", lambda inputs: self.prepare_audio())
+        pipeline.add("prepare", lambda inputs: self.prepare_inputs(inputs["audio"]),
+                     requires=["audio"], main_thread=True)
+        pipeline.add("sound", lambda inputs: self.import_sound(),
+                     main_thread=True)
+        pipeline.add("ser", lambda inputs: self.predict_emotion(
+            workspace, use_timeline, window, hop, inputs["audio"].get("ser")),
+                     requires=["audio"])
+        # written by the align stage's thread, shown by on_progress
+        alignment_progress = {"fraction": 0.0, "message": None}
+
+        def on_alignment(fraction, message):
+            alignment_progress["fraction"] = fraction
+            alignment_progress["message"] = message
+
+        pipeline.add("align", lambda inputs: self.run_alignment(
+            workspace, force_align, inputs["prepare"], on_alignment,
+            lambda: pipeline.cancelled),
+                     requires=["prepare"])
+        pipeline.add("keyframes", lambda inputs: self.create_keyframes(
+            workspace, inputs["align"], backend, inputs["audio"] if use_intensity else None, tolerance, snap),
+                     requires=["audio", "prepare", "ser", "align"], main_thread=True)
+
+        number_of_operations = len(pipeline.stages)
         p_dialog = QtWidgets.QProgressDialog(
-            "Analyzing the input data and generating keyframes...", "Cancel", 0, number_of_operations, self)
+            "Analyzing the input data and generating keyframes...", "Cancel", 0,
+            number_of_operations * self.STAGE_STEPS, self)
         p_dialog.setWindowFlags(p_dialog.windowFlags()
                                 ^ QtCore.Qt.WindowCloseButtonHint)
         p_dialog.setWindowTitle("Progress...")
@@ -334,187 +394,206 @@ class LipSyncDialog(QtWidgets.QDialog):
         p_dialog.setWindowModality(QtCore.Qt.WindowModal)
         p_dialog.show()
         QtCore.QCoreApplication.processEvents()
+        self.progress_dialog = p_dialog
+
+        finished_stages = []
+        shown_message = [None]
+
+        def on_progress(name, result):
+            if p_dialog.wasCanceled():
+                pipeline.cancel()
+            if name is not None:
+                print("Stage {}: {} in {:.2f} sec".format(
+                    name, "done" if result.ok else "failed", result.elapsed))
+                finished_stages.append(name)
+                p_dialog.setRange(0, number_of_operations * self.STAGE_STEPS)
+            steps = len(finished_stages) * self.STAGE_STEPS
+            if "align" not in finished_stages:
+                steps += int(alignment_progress["fraction"] * self.STAGE_STEPS)
+                if alignment_progress["message"] != shown_message[0]:
+                    shown_message[0] = alignment_progress["message"]
+                    p_dialog.setLabelText("Aligning: {}".format(shown_message[0]))
+            if p_dialog.maximum() == number_of_operations * self.STAGE_STEPS:
+                p_dialog.setValue(steps)
+            QtCore.QCoreApplication.processEvents()
+
+        def on_keys(done):
+            p_dialog.setValue(done)
+            QtCore.QCoreApplication.processEvents()
+
+        # the keys of the run are one undo step; create_keyframes enters the
+        # session around the keying only
+        session = scene_writer.SceneEditSession(
+            "autoLipSync", is_cancelled=p_dialog.wasCanceled, progress=on_keys)
+        self.scene_session = session
+        try:
+            results = pipeline.run(poll=on_progress)
+        finally:
+            self.scene_session = None
+            self.progress_dialog = None
 
-        self.create_clean_input_folder()
+        if session.cancelled:
+            print("Cancelled, the keys were rolled back.")
+            p_dialog.close()
+            workspace.cleanup()
+            return
+        if not results["keyframes"].ok and (pipeline.cancelled or p_dialog.wasCanceled()):
+            print("Cancelled before keying.")
+            p_dialog.close()
+            workspace.cleanup()
+            return
+        if not results["sound"].ok:
+            print(results["sound"].traceback)
+            cmds.warning("Could not import sound file.")
+        for name in ("audio", "prepare", "ser", "align", "keyframes"):
+            if results[name].traceback:
+                print(results[name].traceback)
+        if results["keyframes"].ok:
+            print("Successfully generated keyframes.")
+        p_dialog.setValue(p_dialog.maximum())
+        p_dialog.close()
+
+        workspace.cleanup()
+
+    def prepare_audio(self):
+        """
+        Decodes the input wav once into the shared audio cache and returns
+        the paths the consumers read: "ser" (float32 .npy at the SER rate)
+        and "mfa" (16 kHz mono wav). Returns an empty dict if the wav can't
+        be decoded, in which case every consumer reads the original file.
+        """
+        try:
+            cache = audio_cache.AudioCache(self.AUDIO_CACHE_PATH, self.AUDIO_CACHE_MAX_BYTES)
+            return {"ser": cache.samples_path(self.sound_clip_path, audio_cache.SER_SAMPLE_RATE),
+                    "mfa": cache.wav_path(self.sound_clip_path, audio_cache.MFA_SAMPLE_RATE)}
+        except Exception:
+            traceback.print_exc()
+            print("Could not cache the decoded audio, using the wav file directly.")
+            return {}
+
+    def prepare_inputs(self, audio=None):
+        """
+        Reads the pose assignments of the dialog and returns the wav MFA
+        should align, the 16 kHz copy if the audio cache made one.
+        """
         self.update_phone_paths()
-        p_dialog.setValue(current_operation + 1)
+        return (audio or {}).get("mfa", self.sound_clip_path)
 
+    def predict_emotion(self, workspace, use_timeline=False, window=3.0, hop=1.0, samples=None):
+        """
+        Writes the clip's emotion into workspace.ser_dir. Failures are only
+        reported: without SER results the neutral pose is keyed.
+        """
         try:
-            self.import_sound()
-        except:
+            env_launcher = launcher.get_launcher(self.USER_SCRIPT_DIR)
+            python_command = env_launcher.command('ser', 'python')
+            environ = env_launcher.environ('ser')
+        except (launcher.LauncherError, OSError):
             traceback.print_exc()
-            cmds.warning("Could not import sound file.")
-        p_dialog.setValue(current_operation + 1)
+            print("No SER environment, keying the neutral pose.")
+            return
+        print("SER output: ", workspace.ser_dir)
+        print("sound_clip_path", self.sound_clip_path)
 
-        # Speech Emotion Recognition ambient
-        conda_environment = 'ser'
+        try:
+            worker = ser_client.get_ser_worker(
+                python_command, self.SER_WORKER_PATH, self.SER_MODEL_PATH, self.SER_PATH,
+                env=environ)
+            if use_timeline:
+                emotion = worker.timeline(
+                    self.sound_clip_path, output=workspace.ser_dir, window=window, hop=hop,
+                    samples=samples)
+            else:
+                emotion = worker.predict(
+                    self.sound_clip_path, output=workspace.ser_dir, samples=samples)
+            print("SER worker OK: ", emotion)
+            return
+        except Exception:
+            traceback.print_exc()
+            print("SER worker failed, running the one-shot SER script.")
 
-        print("SER_PATH: ", self.SER_PATH)
-        print("sound_clip_path", self.sound_clip_path)
-        command = [
-            conda_exe, 'run', '-n', conda_environment, 'python', self.SER_SCRIPT_PATH,
+        command = python_command + [
+            self.SER_SCRIPT_PATH,
             '--model', self.SER_MODEL_PATH,
             '--audio', self.sound_clip_path,
-            '--output', self.SER_PATH
+            '--output', workspace.ser_dir
         ]
+        if samples:
+            command += ['--samples', samples]
+        if use_timeline:
+            command += ['--timeline', '--window', str(window), '--hop', str(hop)]
         print("Comando:", command)
-        subprocess.run(command)
-        print("SER subprocess OK.")
-
-        # MFA ambient
-        conda_environment = 'aligner'
-
-        command = (
-            conda_exe + " run -n " + conda_environment + " mfa align " +
-            self.INPUT_FOLDER_PATH + " " + self.LEXICON_PATH + " " +
-            self.LANGUAGE_PATH + " " + self.OUTPUT_FOLDER_PATH
-        )
-        print("Comando:", command)
-
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-
-        def decode_line(line):
-            try:
-                return line.decode('utf-8')
-            except UnicodeDecodeError:
-                return line.decode('utf-8', errors='ignore')
-
-        print("stdout:")
-        for line in process.stdout:
-            if line.strip():
-                print("STDOUT:", decode_line(line))
-
-        print("stderr:")
-        for line in process.stderr:
-            if line.strip():
-                print("STDERR:", decode_line(line))
-
-        process.wait()
-
         try:
-            self.create_keyframes()
-            print("Successfully generated keyframes.")
-            p_dialog.setValue(number_of_operations)
-            p_dialog.close()
-        except:
+            subprocess.run(command, env=environ)
+            print("SER subprocess OK.")
+        except OSError:
             traceback.print_exc()
-            p_dialog.setValue(number_of_operations)
-            p_dialog.close()
-
-        self.delete_input_folder()
-
-    def get_emotion_shape(self):
+            print("SER subprocess failed, keying the neutral pose.")
+
+    def run_alignment(self, workspace, force=False, corpus_sound=None, progress=None,
+                      is_cancelled=None):
+        """
+        Aligns the clip, or fetches its cached alignment, and returns the
+        TextGrid path. progress and is_cancelled go to the MFA run, from
+        this (worker) thread.
+        """
         try:
-            with open(self.SER_PATH+"class.txt", 'r') as file:
-                emotion_shape = file.read().strip()
-                print(
-                    f'class.txt content: {emotion_shape}')
-        except FileNotFoundError:
-            print('class.txt not found.')
-        except Exception as e:
-            print(
-                f'Error when tried to read class.txt: {e}')
-        return emotion_shape
+            cache = alignment_cache.AlignmentCache(
+                self.ALIGNMENT_CACHE_PATH, self.ALIGNMENT_CACHE_MAX_BYTES)
+        except Exception:
+            traceback.print_exc()
+            cache = None
+
+        queue = mfa.AlignmentQueue(workspace, launcher.get_launcher(self.USER_SCRIPT_DIR),
+                                   self.LEXICON_PATH, self.LANGUAGE_PATH, cache=cache)
+        name = os.path.splitext(os.path.basename(self.sound_clip_path))[0]
+        queue.add(name, self.sound_clip_path, self.text_file_path, corpus_sound)
+        textgrid_path = queue.run(force, progress, is_cancelled)[name]
+        if textgrid_path is None:
+            raise IOError(queue.errors[name])
+        return textgrid_path
 
     def import_sound(self):
         cmds.sound(file=self.sound_clip_path, name="SoundFile")
         gPlayBackSlider = mel.eval("$tmpVar=$gPlayBackSlider")
         cmds.timeControl(gPlayBackSlider, edit=True, sound="SoundFile")
 
-    def delete_input_folder(self):
-        try:
-            shutil.rmtree(self.INPUT_FOLDER_PATH)
-            shutil.rmtree(self.OUTPUT_FOLDER_PATH)
-        except:
-            pass
-
-    def create_clean_input_folder(self):
-
-        self.delete_input_folder()
-
-        # Create temp folder
-        os.mkdir(self.INPUT_FOLDER_PATH)
-        sound_source = self.sound_clip_path
-        text_source = self.text_file_path
-        destination = self.INPUT_FOLDER_PATH
-
-        # Copy files
-        shutil.copy(sound_source, destination)
-        shutil.copy(text_source, destination)
-
-        # Rename text file so it matches sound file (Shutil copy doesn't return path in Python2)
-        sound_name = ""
-        for file in os.listdir(destination):
-            if file.endswith(".wav"):
-                sound_name = file.split(".")[0]
-
-        for file in os.listdir(destination):
-            if file.endswith(".txt"):
-                old_name = self.INPUT_FOLDER_PATH+"/"+file
-                new_name = self.INPUT_FOLDER_PATH+"/"+sound_name+".txt"
-                os.rename(old_name, new_name)
-
-    def create_keyframes(self):
-        textgrid_path = self.find_textgrid_file()
-        tg = textgrid.TextGrid.fromFile(textgrid_path)
-        iterations = len(tg[1])
-        print(tg[1])
-
-        emotion_pos = self.get_emotion_shape()
-        print("Predicted emotion: ", emotion_pos)
-        try:
-            for k in self.phone_path_dict:
-                if emotion_pos in k:
-                    pose_path = self.phone_path_dict.get(k)
-                    print("pose_path: {}\n".format(pose_path))
-            self.load_pose(pose_path)
-            print(self.load_pose(pose_path))
-
-            print("emotion: {}, min_time: {}\n".format(emotion_pos, min_time))
-            try:
-                cmds.setKeyframe(self.active_controls, time=[
-                    "0.00"+"sec", "0.01"+"sec"])
-            except:
-                print("Failed to set keyframe")
-
-            try:
-                cmds.keyTangent(self.active_controls,
-                                inTangentType="spline", outTangentType="spline")
-            except:
-                print("Failed to set keytangent")
-        except:
-            print("failed to keyframe emotion")
-
-        for i in range(iterations):
-            min_time = str(tg[1][i].minTime)
-            max_time = str(tg[1][i].maxTime)
-            phone = tg[1][i].mark
-            # print(phone, min_time)
-
-            # Get the phone pose paths from the dict and load the correlated pose
-            key_value = self.phone_dict.get(phone)
-
-            print("key_value: {}, min_time: {}\n".format(key_value, min_time))
-            for k in self.phone_path_dict:
-                if key_value in k:
-                    pose_path = self.phone_path_dict.get(k)
-                    print("pose_path: {}\n".format(pose_path))
-
-            self.load_pose(pose_path)
-            print(self.load_pose(pose_path))
-
-            try:
-                cmds.setKeyframe(self.active_controls, time=[
-                                 min_time+"sec", max_time+"sec"])
-            except:
-                print("Failed to set keyframe")
-
-            try:
-                cmds.keyTangent(self.active_controls,
-                                inTangentType="spline", outTangentType="spline")
-            except:
-                print("Failed to set keytangent")
+    def create_keyframes(self, workspace, textgrid_path, backend="commands", audio=None,
+                         tolerance=None, snap=False):
+        """
+        Keys the emotion poses and the phones of the clip's alignment
+        (textgrid_path). With audio (the prepare_audio
+        paths) the phone poses are weighted by the loudness of the clip,
+        with a tolerance the holds of the planned curves are thinned out
+        and with snap the keys are put on whole frames.
+        """
+        # only the phone tier is built, the words tier is skipped
+        phone_tier = generation.read_phone_tier(textgrid_path, self.PHONE_TIER_NAME)
+        print(phone_tier)
+
+        samples_path = None
+        if audio is not None:
+            samples_path = audio.get("ser")
+            if not samples_path:
+                print("No decoded audio, skipping the intensity pass.")
+
+        plan = generation.plan_lip_sync(
+            phone_tier, generation.read_emotion_track(workspace.ser_dir),
+            self.phone_path_dict, self.phone_table, scene_writer.scene_frame_rate(),
+            snap=snap, tolerance=tolerance, samples_path=samples_path,
+            intensity_floor=self.INTENSITY_FLOOR,
+            get_initial_values=scene_writer.get_initial_values)
+
+        if self.progress_dialog is not None:
+            self.progress_dialog.setLabelText("Keying {} curves...".format(len(plan)))
+            self.progress_dialog.setRange(0, plan.key_count)
+            self.progress_dialog.setValue(0)
+        if self.scene_session is None:
+            key_count = scene_writer.apply_plan(plan, backend)
+        else:
+            with self.scene_session as session:
+                key_count = scene_writer.apply_plan(plan, backend, session)
+        print("Keyed {} keys with the {} backend.".format(key_count, backend))
 
     def save_pose(self, pose_path):
         controllers = cmds.ls(sl=True)
@@ -535,9 +614,10 @@ class LipSyncDialog(QtWidgets.QDialog):
 
         with open(save_path, "w") as jsonFile:
             json.dump(controller_dict, jsonFile, indent=4)
+        pose_store.invalidate(save_path)
 
     def load_pose(self, file_path):
-        pose_data = json.load(open(file_path))
+        pose_data = pose_store.get(file_path)
         self.active_controls = []
 
         if self.PYTHON_VERSION < 3:
@@ -571,6 +651,17 @@ class LipSyncDialog(QtWidgets.QDialog):
     def update_phone_paths(self):
         for index, key in enumerate(self.phone_path_dict):
             self.phone_path_dict[key] = self.widget_list[index].get_text()
+        self.compile_phone_table()
+
+    def compile_phone_table(self):
+        """
+        Resolves every phone of the current language straight to its pose file.
+        """
+        self.phone_table = keyframe_planner.PhonePoseTable(
+            self.phone_dict, self.phone_path_dict)
+        report = self.phone_table.report()
+        if report:
+            print(report)
 
     def close_window(self):
         self.close()
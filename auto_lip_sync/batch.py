@@ -0,0 +1,475 @@
+# Headless batch driver. Generates the lip sync of every clip in a manifest
+# with mayapy, spread over a pool of worker processes. Run it from the Maya
+# scripts folder:
+#
+#   mayapy -m auto_lip_sync.batch episode.csv --workers 4 --log-dir logs
+#
+# Manifest rows (CSV with a header row, or a JSON list of objects) have the
+# columns wav, transcript, language, scene, poses and output, and optionally:
+#   name      job name, used for the log file (defaults to the wav's name)
+#   textgrid  an existing alignment, MFA is skipped
+#   emotion   a fixed emotion label, SER is skipped
+# Relative paths are resolved against the manifest's folder. poses is a JSON
+# file mapping the dialog's emotion and viseme names ("neutral", "AA", ...,
+# "rest") to pose files.
+#
+# Clips without a textgrid are aligned up front, with one MFA run per language
+# (see mfa.AlignmentQueue) logging to <log-dir>/align_<language>.log. Then
+# every job opens its rig scene, keys it with the same planning and keying code
+# as the dialog (generation.py, scene_writer.py) and saves it as output. Each
+# job logs to <log-dir>/<name>.log, failed jobs are retried and the run ends
+# with a summary, also written to <log-dir>/summary.json.
+#
+# --cmds installs another module as maya.cmds in every worker, e.g. a stand-in
+# that records the calls, so the driver can run on a machine without Maya.
+# tests/fake_cmds.py is one; tests/test_batch.py runs a manifest against it.
+
+import argparse
+import contextlib
+import csv
+import importlib
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+import traceback
+import types
+
+from collections import OrderedDict
+
+from . import (alignment_cache, audio_cache, generation, keyframe_planner, languages, launcher,
+               mfa, ser_client)
+from .workspace import RunWorkspace
+
+REQUIRED_COLUMNS = ("wav", "transcript", "language", "scene", "poses", "output")
+PATH_COLUMNS = ("wav", "transcript", "scene", "poses", "output", "textgrid")
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))).replace("\\", "/") + "/"
+SER_WORKER_PATH = "emotion-classifier/ser_worker.py"
+SER_MODEL_PATH = "emotion-classifier/SER_model1.h5"
+SER_ENVIRONMENT = "ser"
+
+SCENE_TYPES = {".ma": "mayaAscii", ".mb": "mayaBinary"}
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchJob(object):
+
+    def __init__(self, name, wav, transcript, language, scene, poses, output,
+                 textgrid=None, emotion=None):
+        self.name = name
+        self.wav = wav
+        self.transcript = transcript
+        self.language = language
+        self.scene = scene
+        self.poses = poses
+        self.output = output
+        self.textgrid = textgrid
+        self.emotion = emotion
+
+    def __repr__(self):
+        return "BatchJob({0})".format(self.name)
+
+    @classmethod
+    def from_row(cls, row, base_dir):
+        missing = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+        if missing:
+            raise BatchError("Manifest row {} misses: {}".format(row, ", ".join(missing)))
+        values = dict((column, (row.get(column) or "").strip() or None)
+                      for column in REQUIRED_COLUMNS + ("name", "textgrid", "emotion"))
+        for column in PATH_COLUMNS:
+            if values[column]:
+                values[column] = os.path.normpath(os.path.join(base_dir, values[column]))
+        if values["language"] not in languages.LANGUAGES:
+            raise BatchError("Unknown language {} for {}".format(values["language"], values["wav"]))
+        if not values["name"]:
+            values["name"] = os.path.splitext(os.path.basename(values["wav"]))[0]
+        return cls(**values)
+
+
+class JobResult(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = False
+        self.attempts = 0
+        self.elapsed = 0.0
+        self.keys = 0
+        self.error = ""
+        self.log = None
+
+    def __repr__(self):
+        return "JobResult({0}, ok={1}, attempts={2})".format(self.name, self.ok, self.attempts)
+
+    def to_dict(self):
+        return {"name": self.name, "ok": self.ok, "attempts": self.attempts,
+                "elapsed": round(self.elapsed, 3), "keys": self.keys,
+                "error": self.error, "log": self.log}
+
+
+def read_manifest(path):
+    """
+    The BatchJobs of a CSV or JSON manifest, in file order. Job names must
+    be unique, as they name the log files.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="") as file:
+        if path.lower().endswith(".json"):
+            rows = json.load(file)
+        else:
+            rows = list(csv.DictReader(file))
+    jobs = [BatchJob.from_row(row, base_dir) for row in rows]
+    names = [job.name for job in jobs]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise BatchError("Duplicate job names: {}".format(", ".join(duplicates)))
+    return jobs
+
+
+def install_cmds(module_name):
+    """
+    Makes `from maya import cmds` return the module module_name.
+    """
+    module = importlib.import_module(module_name)
+    maya = sys.modules.get("maya")
+    if maya is None:
+        try:
+            import maya
+        except ImportError:
+            maya = types.ModuleType("maya")
+            maya.__path__ = []
+            sys.modules["maya"] = maya
+    maya.cmds = module
+    sys.modules["maya.cmds"] = module
+    return module
+
+
+_maya_ready = False
+
+
+def init_maya(cmds_module=None):
+    """
+    Starts Maya standalone in this process, or installs the stand-in
+    cmds_module. Runs once per process.
+    """
+    global _maya_ready
+    if _maya_ready:
+        return
+    if cmds_module:
+        install_cmds(cmds_module)
+    else:
+        import maya.standalone
+        maya.standalone.initialize(name="python")
+    _maya_ready = True
+
+
+def _stop_ser_worker():
+    if ser_client._worker is not None:
+        ser_client._worker.stop()
+
+
+def _init_worker(options):
+    # pool workers leave through os._exit, which skips atexit handlers
+    multiprocessing.util.Finalize(None, _stop_ser_worker, exitpriority=10)
+
+
+def predict_emotion(job, workspace, options, samples=None):
+    """
+    Emotion track of the clip, neutral if SER fails.
+    """
+    if job.emotion:
+        return [(0.0, 0.01, job.emotion, 1.0)]
+    script_dir = options["script_dir"]
+    try:
+        env_launcher = launcher.get_launcher(script_dir, options["conda"])
+        worker = ser_client.get_ser_worker(
+            env_launcher.command(SER_ENVIRONMENT, 'python'), script_dir + SER_WORKER_PATH,
+            script_dir + SER_MODEL_PATH, script_dir + "temp/",
+            env=env_launcher.environ(SER_ENVIRONMENT))
+        print("SER worker OK: ", worker.predict(job.wav, output=workspace.ser_dir, samples=samples))
+    except Exception:
+        traceback.print_exc()
+        print("SER failed, keying the neutral pose.")
+    return generation.read_emotion_track(workspace.ser_dir)
+
+
+def generate(job, options):
+    """
+    Opens the job's rig scene, keys the lip sync and saves it as the
+    job's output. Returns the number of keys written.
+    """
+    from maya import cmds
+    from . import scene_writer
+
+    if not job.textgrid:
+        raise BatchError("No alignment for {}".format(job.wav))
+    language = languages.LANGUAGES[job.language]
+    script_dir = options["script_dir"]
+    with open(job.poses) as file:
+        pose_paths = json.load(file)
+    base_dir = os.path.dirname(job.poses)
+    pose_paths = dict((key, os.path.normpath(os.path.join(base_dir, path)) if path else "")
+                      for key, path in pose_paths.items())
+    phone_table = keyframe_planner.PhonePoseTable(language["phones"], pose_paths)
+    report = phone_table.report()
+    if report:
+        print(report)
+
+    cmds.file(job.scene, open=True, force=True)
+
+    workspace = RunWorkspace(script_dir + "runs")
+    try:
+        try:
+            cache = audio_cache.AudioCache(script_dir + "cache/audio")
+            audio = {"ser": cache.samples_path(job.wav, audio_cache.SER_SAMPLE_RATE)}
+        except Exception:
+            traceback.print_exc()
+            audio = {}
+
+        emotion_track = predict_emotion(job, workspace, options, audio.get("ser"))
+        phone_tier = generation.read_phone_tier(job.textgrid)
+        print(phone_tier)
+
+        plan = generation.plan_lip_sync(
+            phone_tier, emotion_track, pose_paths, phone_table, scene_writer.scene_frame_rate(),
+            snap=options["snap"], tolerance=options["tolerance"],
+            samples_path=audio.get("ser") if options["intensity"] else None,
+            get_initial_values=scene_writer.get_initial_values)
+        backend = "api" if scene_writer.HAS_API else "commands"
+        key_count = scene_writer.apply_plan(plan, backend)
+        print("Keyed {} keys with the {} backend.".format(key_count, backend))
+    finally:
+        workspace.cleanup()
+
+    output_dir = os.path.dirname(job.output)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    cmds.file(rename=job.output)
+    scene_type = SCENE_TYPES.get(os.path.splitext(job.output)[1].lower(), "mayaAscii")
+    cmds.file(save=True, force=True, type=scene_type)
+    print("Saved {}".format(job.output))
+    return key_count
+
+
+def align_jobs(jobs, options, workspaces):
+    """
+    Aligns the clips of every job without a textgrid, one MFA run per
+    language, and sets their textgrid. The RunWorkspaces holding the
+    TextGrids are appended to workspaces, for the caller to clean up once
+    the jobs are done. Returns {job name: error} for clips MFA didn't align.
+    """
+    script_dir = options["script_dir"]
+    try:
+        alignments = alignment_cache.AlignmentCache(script_dir + "cache/alignment")
+    except Exception:
+        traceback.print_exc()
+        alignments = None
+    try:
+        sounds = audio_cache.AudioCache(script_dir + "cache/audio")
+    except Exception:
+        traceback.print_exc()
+        sounds = None
+
+    # the queue runs MFA on its whole corpus folder, so each language gets
+    # its own workspace
+    queues = OrderedDict()
+    for job in jobs:
+        if job.textgrid:
+            continue
+        queue = queues.get(job.language)
+        if queue is None:
+            language = languages.LANGUAGES[job.language]
+            workspace = RunWorkspace(script_dir + "runs")
+            workspaces.append(workspace)
+            queue = queues[job.language] = mfa.AlignmentQueue(
+                workspace, launcher.get_launcher(script_dir, options["conda"]),
+                script_dir + language["lexicon"],
+                script_dir + language["model"], options["align_jobs"], alignments)
+        corpus_sound = None
+        if sounds is not None:
+            try:
+                corpus_sound = sounds.wav_path(job.wav, audio_cache.MFA_SAMPLE_RATE)
+            except Exception:
+                traceback.print_exc()
+        queue.add(job.name, job.wav, job.transcript, corpus_sound)
+
+    jobs_by_name = dict((job.name, job) for job in jobs)
+    errors = OrderedDict()
+    for language, queue in queues.items():
+        log_path = os.path.join(options["log_dir"], "align_{}.log".format(language))
+        print("Aligning {} {} clips, log in {}".format(len(queue), language, log_path))
+        start = time.time()
+        with open(log_path, "w") as log:
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                try:
+                    textgrids = queue.run(options["force_align"])
+                except Exception as e:
+                    traceback.print_exc()
+                    textgrids = dict((name, None) for name in queue.clips)
+                    for name in queue.clips:
+                        queue.errors[name] = "{}: {}".format(type(e).__name__, e)
+        for name, textgrid_path in textgrids.items():
+            jobs_by_name[name].textgrid = textgrid_path
+        errors.update(queue.errors)
+        print("Aligned {} of {} {} clips in {:.1f} sec".format(
+            len(queue) - len(queue.errors), len(queue), language, time.time() - start))
+    return errors
+
+
+def run_job(job, options):
+    """
+    Runs a job with up to options["retries"] retries, logging to
+    <log_dir>/<name>.log. Never raises, failures are reported in the
+    returned JobResult.
+    """
+    result = JobResult(job.name)
+    result.log = os.path.join(options["log_dir"], job.name + ".log")
+    start = time.time()
+    with open(result.log, "w") as log:
+        for attempt in range(1 + options["retries"]):
+            result.attempts = attempt + 1
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                print("=== {} attempt {} ===".format(job.name, result.attempts))
+                try:
+                    init_maya(options["cmds"])
+                    result.keys = generate(job, options)
+                    result.ok = True
+                    result.error = ""
+                except Exception as e:
+                    traceback.print_exc()
+                    result.error = "{}: {}".format(type(e).__name__, e)
+            log.flush()
+            if result.ok:
+                break
+    result.elapsed = time.time() - start
+    return result
+
+
+def _run_job(args):
+    return run_job(*args)
+
+
+def run_batch(jobs, options, workers=1):
+    """
+    Runs the jobs on a pool of worker processes and returns their
+    JobResults in job order, printing one line per finished job.
+    """
+    if not os.path.isdir(options["log_dir"]):
+        os.makedirs(options["log_dir"])
+    results = {}
+
+    def report(result):
+        results[result.name] = result
+        print("[{}/{}] {} {} in {:.1f} sec ({} attempts){}".format(
+            len(results), len(jobs), result.name, "ok" if result.ok else "FAILED",
+            result.elapsed, result.attempts, "" if result.ok else ": " + result.error))
+        sys.stdout.flush()
+
+    tasks = [(job, options) for job in jobs]
+    if workers <= 1:
+        _init_worker(options)
+        for task in tasks:
+            report(_run_job(task))
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker, (options,))
+        try:
+            for result in pool.imap_unordered(_run_job, tasks):
+                report(result)
+        finally:
+            pool.close()
+            pool.join()
+    return [results[job.name] for job in jobs]
+
+
+def write_summary(results, path, elapsed):
+    failed = [result for result in results if not result.ok]
+    summary = {
+        "jobs": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "keys": sum(result.keys for result in results),
+        "elapsed": round(elapsed, 3),
+        "results": [result.to_dict() for result in results],
+    }
+    with open(path, "w") as file:
+        json.dump(summary, file, indent=4)
+
+    print("{} of {} jobs succeeded, {} keys in {:.1f} sec".format(
+        summary["succeeded"], summary["jobs"], summary["keys"], elapsed))
+    for result in failed:
+        print("  failed: {} ({}), see {}".format(result.name, result.error, result.log))
+    print("Summary: {}".format(path))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="auto_lip_sync.batch", description="Generate lip sync for every clip of a manifest.")
+    parser.add_argument("manifest", help="CSV or JSON manifest of clips")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--retries", type=int, default=1, help="retries of a failed job")
+    parser.add_argument("--log-dir", help="per-job logs and summary.json "
+                                          "(default: batch_logs next to the manifest)")
+    parser.add_argument("--script-dir", default=SCRIPT_DIR,
+                        help="folder with the MFA models, lexicons and emotion-classifier")
+    parser.add_argument("--conda", help="conda executable to find the aligner and ser "
+                                        "environments with (see launcher.py)")
+    parser.add_argument("--cmds", help="module to use as maya.cmds instead of Maya standalone")
+    parser.add_argument("--tolerance", type=float,
+                        help="drop the keys inside holds, values within tolerance counting "
+                             "as one hold (0 for exact holds); every key is kept by default")
+    parser.add_argument("--no-snap", action="store_true", help="keep keys off the frame grid")
+    parser.add_argument("--intensity", action="store_true", help="weight poses by loudness")
+    parser.add_argument("--align-jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="parallel jobs of each MFA run")
+    parser.add_argument("--force-align", action="store_true", help="ignore cached alignments")
+    args = parser.parse_args(argv)
+
+    jobs = read_manifest(args.manifest)
+    jobs_by_name = dict((job.name, job) for job in jobs)
+    script_dir = args.script_dir.replace("\\", "/")
+    options = {
+        "script_dir": script_dir if script_dir.endswith("/") else script_dir + "/",
+        "conda": args.conda,
+        "cmds": args.cmds,
+        "log_dir": os.path.abspath(args.log_dir or os.path.join(
+            os.path.dirname(os.path.abspath(args.manifest)), "batch_logs")),
+        "retries": max(args.retries, 0),
+        "tolerance": None if args.tolerance is None or args.tolerance < 0 else args.tolerance,
+        "snap": not args.no_snap,
+        "intensity": args.intensity,
+        "force_align": args.force_align,
+        "align_jobs": args.align_jobs,
+    }
+    print("{} jobs, {} workers, logs in {}".format(len(jobs), args.workers, options["log_dir"]))
+
+    if not os.path.isdir(options["log_dir"]):
+        os.makedirs(options["log_dir"])
+    start = time.time()
+    workspaces = []
+    try:
+        align_errors = align_jobs(jobs, options, workspaces)
+        results = run_batch([job for job in jobs if job.name not in align_errors],
+                            options, args.workers)
+    finally:
+        for workspace in workspaces:
+            workspace.cleanup()
+    results = dict((result.name, result) for result in results)
+    for name, error in align_errors.items():
+        results[name] = JobResult(name)
+        results[name].error = error
+        results[name].log = os.path.join(
+            options["log_dir"], "align_{}.log".format(jobs_by_name[name].language))
+    results = [results[job.name] for job in jobs]
+    summary = write_summary(results, os.path.join(options["log_dir"], "summary.json"),
+                            time.time() - start)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# Headless lip sync planning. Reads a run's alignment and emotion results and
+# turns them into a KeyframePlan, without Qt and without touching the scene
+# apart from an optional callback reading the current attribute values. The
+# dialog and the batch driver (batch.py) both generate their keys through
+# plan_lip_sync, so a clip comes out the same either way.
+
+import json
+import traceback
+
+from collections import OrderedDict
+
+import numpy as np
+
+from . import audio_cache, intensity, keyframe_planner
+from .pose_store import pose_store
+
+# Import Textgrid module (kylebgorman/textgrid).
+try:
+    import textgrid
+except ImportError:
+    print("error in importing textgrid module")
+
+PHONE_TIER_NAME = "phones"
+INTENSITY_FLOOR = 0.3
+
+
+def read_phone_tier(textgrid_path, tier_name=PHONE_TIER_NAME):
+    """
+    The phone tier of an MFA TextGrid as a columnar tier. Only that tier
+    is built, falling back to the second tier if none has tier_name.
+    """
+    tg = textgrid.TextGrid.fromFile(textgrid_path, columnar=True, tiers=tier_name)
+    phone_tier = tg.getFirst(tier_name)
+    if phone_tier is None:
+        print("No {} tier in {}, using the second tier".format(tier_name, textgrid_path))
+        phone_tier = textgrid.TextGrid.fromFile(textgrid_path, columnar=True, tiers=1)[0]
+    return phone_tier
+
+
+def read_emotion_shape(ser_dir):
+    emotion_shape = "neutral"
+    try:
+        with open(ser_dir+"/class.txt", 'r') as file:
+            emotion_shape = file.read().strip()
+            print(
+                f'class.txt content: {emotion_shape}')
+    except FileNotFoundError:
+        print('class.txt not found.')
+    except Exception as e:
+        print(
+            f'Error when tried to read class.txt: {e}')
+    return emotion_shape
+
+
+def read_emotion_track(ser_dir):
+    """
+    Returns the emotion track as a list of (start, end, label, confidence)
+    tuples. Without a timeline the single class.txt label is keyed at the
+    start of the clip.
+    """
+    try:
+        with open(ser_dir+"/emotion_timeline.json", 'r') as file:
+            return [(s["start"], s["end"], s["label"], s["confidence"])
+                    for s in json.load(file)]
+    except (IOError, OSError, ValueError, KeyError):
+        return [(0.0, 0.01, read_emotion_shape(ser_dir), 1.0)]
+
+
+def phone_intensity(segments, samples_path, frame_rate, time_unit="sec", floor=INTENSITY_FLOOR):
+    """
+    Loudness weight of every phone segment, from the cached SER samples
+    at frame_rate. None if the samples can't be read.
+    """
+    try:
+        samples = np.load(samples_path, mmap_mode="r")
+        envelope = intensity.rms_envelope(samples, audio_cache.SER_SAMPLE_RATE, frame_rate)
+        weights = intensity.normalize_envelope(envelope, floor=floor)
+        # frame times index the envelope directly
+        segment_rate = 1.0 if time_unit == "frame" else frame_rate
+        return intensity.segment_intensity(segments, weights, segment_rate)
+    except (IOError, OSError, ValueError):
+        traceback.print_exc()
+        print("Could not compute the audio intensity, keying full poses.")
+        return None
+
+
+def plan_lip_sync(phone_tier, emotion_track, pose_paths, phone_table, frame_rate=24.0,
+                  snap=False, tolerance=None, samples_path=None, intensity_floor=INTENSITY_FLOOR,
+                  get_initial_values=None):
+    """
+    Plans the emotion and phone keys of a clip, the emotion poses layered
+    under the phone poses. pose_paths maps emotion and viseme names to pose
+    files (the dialog's phone_path_dict), phone_table is the PhonePoseTable
+    compiled from it. With samples_path (the cached
+    SER samples) the phone poses are weighted by the loudness of the clip,
+    with a tolerance the curves are simplified and with snap the keys are
+    put on whole frames of frame_rate. get_initial_values(plugs) returns
+    the scene values of the posed attributes.
+    """
+    segments = []
+    for start, end, emotion_pos, confidence in emotion_track:
+        print("Predicted emotion: ", emotion_pos)
+        pose_path = pose_paths.get(emotion_pos)
+        if not pose_path:
+            print("No pose assigned to emotion: {}".format(emotion_pos))
+            continue
+        print("emotion: {}, min_time: {}, confidence: {}\n".format(
+            emotion_pos, start, confidence))
+        segments.append((start, end, pose_path))
+
+    phones = keyframe_planner.phone_segments(phone_tier, phone_table)
+    print("Phone segments: {}".format(len(phones)))
+    phones = keyframe_planner.merge_segments(phones)
+    time_unit = "sec"
+    if snap:
+        # the class.txt fallback lasts 0.01 sec, keep it from collapsing
+        # into a zero length segment
+        segments = keyframe_planner.quantize_segments(segments, frame_rate, min_frames=1)
+        phones = keyframe_planner.quantize_segments(phones, frame_rate)
+        time_unit = "frame"
+    print("Phone segments after merging{}: {}".format(
+        " and snapping to {:g} fps".format(frame_rate) if snap else "", len(phones)))
+
+    # emotions only pose the plugs the phones leave alone
+    background = [True] * len(segments) + [False] * len(phones)
+    weights = None
+    if samples_path:
+        phone_weights = phone_intensity(phones, samples_path, frame_rate, time_unit,
+                                        intensity_floor)
+        if phone_weights is not None:
+            # emotion poses are keyed at full strength
+            weights = np.concatenate([np.ones(len(segments)), phone_weights])
+    segments += phones
+
+    pose_store.reset_counters()
+    rest_path = pose_paths.get("rest") or None
+    poses = OrderedDict()
+    for start, end, pose_path in segments:
+        if pose_path and pose_path not in poses:
+            poses[pose_path] = pose_store.get(pose_path)
+    if weights is not None and rest_path and rest_path not in poses:
+        poses[rest_path] = pose_store.get(rest_path)
+    pose_table = keyframe_planner.PoseTable(poses)
+    initial_values = get_initial_values(pose_table.plugs) if get_initial_values else {}
+    plan = keyframe_planner.plan_keyframes(segments, pose_table, initial_values,
+                                           weights=weights, rest=rest_path,
+                                           time_unit=time_unit, background=background)
+    print(plan)
+    print(pose_store)
+
+    if tolerance is not None:
+        keys_before = plan.key_count
+        plan = keyframe_planner.simplify_plan(plan, tolerance)
+        print("Simplified curves: {} keys before, {} after ({:.0%} removed)".format(
+            keys_before, plan.key_count, 1 - plan.key_count / float(keys_before or 1)))
+    return plan
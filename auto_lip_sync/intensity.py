@@ -0,0 +1,77 @@
+# Loudness-driven viseme intensity. The RMS envelope of the input audio is
+# computed per animation frame and every phone segment gets the mean envelope
+# over its span as a weight; the planner then scales the segment's pose
+# offset from the rest pose by that weight, so quiet lines move the mouth
+# less than loud ones.
+#
+# The audio is read in blocks, so memory mapped arrays from audio_cache.py
+# are never loaded whole.
+
+import numpy as np
+
+BLOCK_FRAMES = 4096
+
+
+def rms_envelope(samples, sample_rate, frame_rate=24.0):
+    """
+    RMS of the samples over each frame of 1/frame_rate seconds, as a
+    float32 array with one value per (possibly partial) frame.
+    """
+    n_samples = len(samples)
+    n_frames = int(np.ceil(n_samples * float(frame_rate) / sample_rate))
+    if not n_frames:
+        return np.zeros(0, dtype=np.float32)
+    # sample index where every frame starts, frames needn't be whole samples
+    bounds = np.minimum(np.round(np.arange(n_frames + 1) * (float(sample_rate) / frame_rate)),
+                        n_samples).astype(np.int64)
+    # the last start can round onto the end of the samples, drop such frames
+    n_frames = int(np.count_nonzero(bounds[:-1] < n_samples))
+    bounds = bounds[:n_frames + 1]
+    envelope = np.empty(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, BLOCK_FRAMES):
+        last = min(first + BLOCK_FRAMES, n_frames)
+        block = np.asarray(samples[bounds[first]:bounds[last]], dtype=np.float64)
+        energy = np.add.reduceat(block * block, bounds[first:last] - bounds[first])
+        counts = np.diff(bounds[first:last + 1])
+        # reduceat returns the next sample for an empty frame (frame rates
+        # above the sample rate), those frames are silent
+        energy[counts == 0] = 0.0
+        envelope[first:last] = np.sqrt(energy / np.maximum(counts, 1))
+    return envelope
+
+
+def normalize_envelope(envelope, floor=0.3, reference_percentile=95.0, smoothing=3):
+    """
+    Maps an RMS envelope to weights in [floor, 1]. Loudness is taken
+    relative to the clip's reference_percentile frame, so a normally
+    spoken line stays close to full strength, and a moving average over
+    smoothing frames keeps the weights from flickering.
+    """
+    if not len(envelope):
+        return envelope
+    if smoothing > 1:
+        kernel = np.ones(smoothing) / smoothing
+        envelope = np.convolve(envelope, kernel, mode="same")
+    reference = np.percentile(envelope, reference_percentile)
+    if reference <= 0:
+        return np.ones(len(envelope), dtype=np.float32)
+    level = np.clip(envelope / reference, 0.0, 1.0)
+    return (floor + (1.0 - floor) * level).astype(np.float32)
+
+
+def segment_intensity(segments, weights, frame_rate=24.0):
+    """
+    Mean weight over the frames each (start, end, ...) segment touches, as
+    an array aligned with segments. Segments shorter than a frame take
+    the weight of the frame they start in.
+    """
+    if not len(segments):
+        return np.zeros(0, dtype=np.float32)
+    if not len(weights):
+        return np.ones(len(segments), dtype=np.float32)
+    times = np.array([(segment[0], segment[1]) for segment in segments], dtype=np.float64)
+    n_frames = len(weights)
+    first = np.clip(np.floor(times[:, 0] * frame_rate).astype(np.int64), 0, n_frames - 1)
+    last = np.clip(np.ceil(times[:, 1] * frame_rate).astype(np.int64), first + 1, n_frames)
+    cumulative = np.concatenate([[0.0], np.cumsum(weights, dtype=np.float64)])
+    return ((cumulative[last] - cumulative[first]) / (last - first)).astype(np.float32)
@@ -0,0 +1,311 @@
+# Headless keyframe planning. Turns timed pose segments (phones, emotions)
+# into per-attribute key arrays without touching the Maya scene, so a plan can
+# be built, timed, cached or diffed anywhere NumPy is available. Writing a
+# plan into the scene is a separate step (see scene_writer.py).
+#
+# The plan reproduces what the interactive tool did with load_pose() followed
+# by setKeyframe() on the pose's controls: every segment sets the attributes
+# stored in its pose, then keys all known attributes of the pose's controls
+# at the segment start and end. Later keys on the same time win.
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AttributeCurve(object):
+    """
+    Keys of a single ctrl.attr plug, as sorted time and value arrays.
+    """
+
+    def __init__(self, plug, times, values, in_tangent="spline", out_tangent="spline"):
+        self.plug = plug
+        self.times = times
+        self.values = values
+        self.in_tangent = in_tangent
+        self.out_tangent = out_tangent
+
+    def __repr__(self):
+        return 'AttributeCurve({0}, {1} keys)'.format(self.plug, len(self))
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def control(self):
+        return self.plug.split(".", 1)[0]
+
+    @property
+    def attribute(self):
+        return self.plug.split(".", 1)[1]
+
+
+class KeyframePlan(object):
+    """
+    Ordered mapping of plug name to AttributeCurve. Times are in seconds.
+    """
+
+    def __init__(self, curves=None, time_unit="sec"):
+        self.curves = OrderedDict()
+        self.time_unit = time_unit
+        for curve in curves or []:
+            self.curves[curve.plug] = curve
+
+    def __repr__(self):
+        return 'KeyframePlan({0} curves, {1} keys)'.format(len(self.curves), self.key_count)
+
+    def __iter__(self):
+        return iter(self.curves.values())
+
+    def __len__(self):
+        return len(self.curves)
+
+    def __getitem__(self, plug):
+        return self.curves[plug]
+
+    @property
+    def key_count(self):
+        return sum(len(curve) for curve in self.curves.values())
+
+    @property
+    def controls(self):
+        return list(OrderedDict((curve.control, None) for curve in self))
+
+
+class PoseTable(object):
+    """
+    Dense view of a set of poses. poses maps a pose id (usually the pose file
+    path) to pose data as stored by save_pose: {ctrl: {attr: value}}.
+    values[i, j] is the value pose i stores for plug j (NaN if it doesn't),
+    and keyed[i, j] is True when plug j belongs to one of pose i's controls,
+    i.e. when keying pose i keys plug j.
+    """
+
+    def __init__(self, poses):
+        self.pose_ids = list(poses)
+        self.index = dict((pose_id, i) for i, pose_id in enumerate(self.pose_ids))
+
+        plugs = OrderedDict()
+        for pose in poses.values():
+            for ctrl, attrs in pose.items():
+                for attr in attrs:
+                    plugs[ctrl + "." + attr] = ctrl
+        self.plugs = list(plugs)
+        plug_index = dict((plug, j) for j, plug in enumerate(self.plugs))
+        plug_controls = np.array(list(plugs.values()), dtype=object)
+
+        self.values = np.full((len(self.pose_ids), len(self.plugs)), np.nan)
+        self.keyed = np.zeros((len(self.pose_ids), len(self.plugs)), dtype=bool)
+        for i, pose in enumerate(poses.values()):
+            for ctrl, attrs in pose.items():
+                for attr, value in attrs.items():
+                    self.values[i, plug_index[ctrl + "." + attr]] = value
+                self.keyed[i] |= plug_controls == ctrl
+
+
+def plan_keyframes(segments, poses, initial_values=None, tangent="spline",
+                   weights=None, rest=None, time_unit="sec", background=None):
+    """
+    Builds a KeyframePlan from (start, end, pose_id) segments, applied in
+    order of their start times. Segments whose pose_id is None or missing
+    from poses are skipped.
+    initial_values maps plugs to their scene value before the first pose;
+    plugs without a known value are not keyed until a pose sets them.
+    weights, one per segment, scale each segment's offset from the rest
+    pose (a pose_id in poses): rest + weight * (pose - rest). Plugs the
+    rest pose doesn't store keep the pose's value.
+    time_unit is the unit of the segment times, "sec" or "frame".
+    background, one flag per segment, marks segments (e.g. emotions)
+    layered under the others: they neither set nor key the plugs any other
+    segment's pose sets.
+    """
+    if not isinstance(poses, PoseTable):
+        poses = PoseTable(poses)
+
+    rows = [(start, end, poses.index[pose_id], i) for i, (start, end, pose_id)
+            in enumerate(segments) if pose_id in poses.index]
+    if not rows or not poses.plugs:
+        return KeyframePlan(time_unit=time_unit)
+    # fill values in time order, segments starting together keep their order
+    rows.sort(key=lambda row: row[0])
+    starts, ends, pose_index, kept = [np.array(column) for column in zip(*rows)]
+    starts = starts.astype(np.float64)
+    ends = ends.astype(np.float64)
+
+    values = poses.values[pose_index]
+    if weights is not None and rest in poses.index:
+        rest_values = poses.values[poses.index[rest]]
+        scale = np.asarray(weights, dtype=np.float64)[kept][:, np.newaxis]
+        values = np.where(np.isnan(rest_values), values,
+                          rest_values + scale * (values - rest_values))
+
+    keyed = poses.keyed[pose_index]
+    if background is not None:
+        under = np.asarray(background, dtype=bool)[kept][:, np.newaxis]
+        set_above = (~np.isnan(values) & ~under).any(axis=0)
+        values = np.where(under & set_above, np.nan, values)
+        keyed = keyed & ~(under & set_above)
+
+    # Forward-fill each plug's value over the segments: a plug keeps the value
+    # of the latest pose that set it, or its initial value before that.
+    n_segments = len(rows)
+    last_set = np.where(np.isnan(values), -1, np.arange(n_segments)[:, np.newaxis])
+    np.maximum.accumulate(last_set, axis=0, out=last_set)
+    columns = np.arange(len(poses.plugs))
+    filled = values[np.maximum(last_set, 0), columns]
+    initial = np.array([(initial_values or {}).get(plug, np.nan) for plug in poses.plugs])
+    filled = np.where(last_set < 0, initial, filled)
+    keyed = keyed & ~np.isnan(filled)
+
+    curves = []
+    for j, plug in enumerate(poses.plugs):
+        rows_keyed = np.flatnonzero(keyed[:, j])
+        if not len(rows_keyed):
+            continue
+        times = np.column_stack([starts[rows_keyed], ends[rows_keyed]]).ravel()
+        plug_values = np.repeat(filled[rows_keyed, j], 2)
+
+        # sort by time, the last key written on a given time wins
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        plug_values = plug_values[order]
+        last = np.append(times[1:] != times[:-1], True)
+        curves.append(AttributeCurve(plug, times[last], plug_values[last], tangent, tangent))
+    return KeyframePlan(curves, time_unit)
+
+
+def merge_segments(segments):
+    """
+    Joins adjacent (start, end, pose_id) segments of one track that resolve
+    to the same pose and touch, e.g. "sil", "sp" and "" all mapped to rest.
+    A run keys the same values as its merged segment, minus the inner keys.
+    """
+    merged = []
+    for start, end, pose_id in segments:
+        if merged and merged[-1][2] == pose_id and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]), pose_id)
+        else:
+            merged.append((start, end, pose_id))
+    return merged
+
+
+def quantize_segments(segments, frame_rate, min_frames=0):
+    """
+    Snaps the (start, end, pose_id) segments of one track, in time order,
+    to whole frames and returns them with integer frame times. Segments
+    shorter than a frame would key the same frame as their neighbours, so
+    of all segments starting on one frame only the longest is kept (the
+    earliest on ties). Kept segments last at least min_frames. Neighbours
+    left with the same pose are merged.
+    """
+    if not segments:
+        return []
+    times = np.array([(start, end) for start, end, pose_id in segments], dtype=np.float64)
+    # round half up in integer frames, so both ends of a boundary agree
+    frames = np.floor(times * frame_rate + 0.5).astype(np.int64)
+    durations = times[:, 1] - times[:, 0]
+
+    # first segment of every run of segments starting on the same frame
+    first = np.flatnonzero(np.append(True, frames[1:, 0] != frames[:-1, 0]))
+    longest = [run + int(np.argmax(durations[run:next_run])) for run, next_run
+               in zip(first, np.append(first[1:], len(segments)))]
+    kept = []
+    for i in longest:
+        start, end = int(frames[i, 0]), int(max(frames[i, 1], frames[i, 0] + min_frames))
+        kept.append((start, end, segments[i][2]))
+    return merge_segments(kept)
+
+
+def simplify_curve(times, values, tolerance=0.0):
+    """
+    Indices of the keys to keep. Only keys inside holds are dropped: in a
+    run of keys whose values are within tolerance of the run's first key,
+    the first two and last two keys are kept and the ones between removed.
+    Spline, linear and flat tangents are computed from a key's neighbours,
+    so with exact holds (tolerance 0) the kept keys get the same tangents
+    and the evaluated curve doesn't change; a tolerance lets a hold drift
+    by about that much.
+    """
+    n_keys = len(times)
+    keep = np.ones(n_keys, dtype=bool)
+    first = 0
+    while first < n_keys:
+        last = first + 1
+        while last < n_keys and abs(values[last] - values[first]) <= tolerance:
+            last += 1
+        # the run is first..last-1, its second key and the one before its
+        # last keep the tangents of its end keys flat
+        if last - first > 4:
+            keep[first + 2:last - 2] = False
+        first = last
+    return np.flatnonzero(keep)
+
+
+def simplify_plan(plan, tolerance=0.0):
+    """
+    New KeyframePlan with the inner keys of holds removed from every curve
+    (see simplify_curve).
+    """
+    curves = []
+    for curve in plan:
+        kept = simplify_curve(curve.times, curve.values, tolerance)
+        curves.append(AttributeCurve(curve.plug, curve.times[kept], curve.values[kept],
+                                     curve.in_tangent, curve.out_tangent))
+    return KeyframePlan(curves, plan.time_unit)
+
+
+class PhonePoseTable(object):
+    """
+    Direct phone -> pose file lookup compiled from a language's phone ->
+    viseme table and the viseme -> pose file mapping of the dialog. Viseme
+    names are matched exactly. Phones whose viseme is unknown or has no
+    pose assigned, as well as phones missing from the table, resolve to the
+    fallback viseme's pose.
+    """
+
+    def __init__(self, phone_dict, viseme_poses, fallback="rest"):
+        self.fallback_pose = viseme_poses.get(fallback) or None
+        self.poses = {}
+        self.unknown_visemes = OrderedDict()  # phone -> viseme name not in viseme_poses
+        self.unassigned = OrderedDict()       # phone -> viseme without a pose file
+        for phone, viseme in phone_dict.items():
+            if viseme not in viseme_poses:
+                self.unknown_visemes[phone] = viseme
+            elif not viseme_poses[viseme]:
+                self.unassigned[phone] = viseme
+            else:
+                self.poses[phone] = viseme_poses[viseme]
+
+    def __len__(self):
+        return len(self.poses)
+
+    def get(self, phone):
+        return self.poses.get(phone, self.fallback_pose)
+
+    def report(self):
+        """
+        Human readable summary of unmapped phones, empty if all phones map.
+        """
+        lines = []
+        if self.unknown_visemes:
+            lines.append("Phones mapped to unknown visemes: " + ", ".join(
+                "{} -> {}".format(p, v) for p, v in self.unknown_visemes.items()))
+        if self.unassigned:
+            visemes = sorted(set(self.unassigned.values()))
+            lines.append("Visemes without a pose: {} ({} phones)".format(
+                ", ".join(visemes), len(self.unassigned)))
+        return "\n".join(lines)
+
+
+def phone_segments(intervals, phone_table):
+    """
+    (start, end, pose_path) segments for a phone tier. Columnar tiers are
+    resolved once per distinct phone instead of once per interval.
+    """
+    if hasattr(intervals, "markTable"):
+        poses = [phone_table.get(mark) for mark in intervals.markTable.marks]
+        return [(start, end, poses[code]) for start, end, code
+                in zip(intervals.starts, intervals.ends, intervals.codes)]
+    get = phone_table.get
+    return [(interval.minTime, interval.maxTime, get(interval.mark))
+            for interval in intervals]
@@ -0,0 +1,44 @@
+# Per-language MFA resources and phone -> viseme tables. Paths are relative to
+# the Maya user script folder.
+
+from collections import OrderedDict
+
+ENGLISH_PHONES = {
+    "AA0": "AA", "AA1": "AA", "AA2": "AA", "AE0": "AA", "AE1": "AA", "AE2": "AA",
+    "AH0": "AA", "AH1": "AA", "AH2": "AA", "AO0": "AA", "AO1": "AA", "AO2": "AA",
+    "AW0": "WQ", "AW1": "WQ", "AW2": "WQ", "AY0": "AA", "AY1": "AA", "AY2": "AA",
+    "EH0": "EE", "EH1": "EE", "EH2": "EE", "ER0": "O", "ER1": "O", "ER2": "O", "EY0": "EE",
+    "EY1": "EE", "EY2": "EE", "IH0": "AA", "IH1": "AA", "IH2": "AA", "IY0": "EE", "IY1": "EE",
+    "IY2": "EE", "OW0": "O", "OW1": "O", "OW2": "O", "OY0": "O", "OY1": "O", "OY2": "O",
+    "UH0": "U", "UH1": "U", "UH2": "U", "UW0": "U", "UW1": "U", "UW2": "U", "B": "BMP",
+    "CH": "TSCH", "D": "KSTN", "DH": "KSTN", "F": "FV", "G": "KSTN", "HH": "EE", "JH": "EE",
+    "K": "KSTN", "L": "KSTN", "M": "BMP", "N": "KSTN", "NG": "KSTN", "P": "BMP", "R": "KSTN",
+    "S": "KSTN", "SH": "TSCH", "T": "TSCH", "TH": "KSTN", "V": "FV", "W": "WQ", "Y": "EE",
+    "Z": "EE", "ZH": "KSTN", "sil": "rest", "None": "rest", "sp": "rest", "spn": "rest", "": "rest"
+}
+
+JAPANESE_PHONES = {
+    "a": "AA", "i": "EE", "u": "U", "e": "Er", "o": "O",
+    "k": "KSTN", "g": "KSTN", "s": "KSTN", "t": "KSTN", "d": "KSTN", "n": "KSTN", "z": "KSTN",
+    "sh": "TSCH", "ch": "TSCH", "ts": "TSCH", "j": "TSCH", "ji": "TSCH", "f": "FV", "v": "FV",
+    "m": "BMP", "b": "BMP", "p": "BMP", "w": "WQ", "nn": "BMP",
+    "ni": "EE", "nu": "U", "ha": "AA", "hi": "EE", "he": "Er", "ho": "O",
+    "ra": "AA", "ri": "EE", "ru": "U", "re": "Er", "ro": "O",
+    "an": "AA", "in": "EE", "un": "U", "en": "Er", "on": "O",
+    "nin": "EE", "nun": "U", "han": "AA", "hin": "EE", "hen": "Er", "hon": "O",
+    "ran": "AA", "rin": "EE", "run": "U", "ren": "Er", "ron": "O",
+    "sil": "rest", "None": "rest", "sp": "rest", "spn": "rest", "": "rest"
+}
+
+LANGUAGES = OrderedDict([
+    ("English", {
+        "model": "montreal-forced-aligner/pretrained_models/english_us_arpa.zip",
+        "lexicon": "librispeech-lexicon.txt",
+        "phones": ENGLISH_PHONES,
+    }),
+    ("Japanese", {
+        "model": "montreal-forced-aligner/pretrained_models/jp_model2.zip",
+        "lexicon": "jp_dict_simple.txt",
+        "phones": JAPANESE_PHONES,
+    }),
+])
@@ -0,0 +1,254 @@
+# Direct launcher for the conda environments of the external tools ("aligner"
+# for MFA, "ser" for the emotion classifier). Instead of going through
+# `conda run -n <env>`, which spawns conda itself and a shell and buffers the
+# output, every environment is resolved once to its prefix and the programs
+# in it are started directly, with argument lists and the environment's
+# folders on PATH.
+#
+# An environment's prefix is taken from, in order:
+#   1. the AUTO_LIP_SYNC_<NAME>_PREFIX environment variable
+#      (e.g. AUTO_LIP_SYNC_ALIGNER_PREFIX)
+#   2. "environments" in the settings file (auto_lip_sync_settings.json in the
+#      Maya scripts folder): {"conda": "...", "environments": {"ser": "..."}}
+#   3. the resolution cache (cache/launcher.json), if the interpreter in it
+#      is unchanged
+#   4. <conda root>/envs/<name>, then `conda env list --json`, conda being
+#      AUTO_LIP_SYNC_CONDA, "conda" in the settings, CONDA_EXE or conda on PATH
+# Activation scripts (etc/conda/activate.d) are not run; environments that
+# need them can still be launched through `conda run` with use_conda_run.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SETTINGS_FILE = "auto_lip_sync_settings.json"
+CACHE_FILE = "cache/launcher.json"
+PREFIX_VARIABLE = "AUTO_LIP_SYNC_{}_PREFIX"
+CONDA_VARIABLE = "AUTO_LIP_SYNC_CONDA"
+
+WINDOWS = sys.platform.startswith("win")
+
+
+class LauncherError(Exception):
+    pass
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class CondaEnvironment(object):
+
+    def __init__(self, name, prefix):
+        self.name = name
+        self.prefix = os.path.normpath(prefix)
+
+    def __repr__(self):
+        return "CondaEnvironment({0}, {1})".format(self.name, self.prefix)
+
+    @property
+    def bin_dirs(self):
+        """
+        Folders conda's activation puts on PATH.
+        """
+        if WINDOWS:
+            return [self.prefix] + [os.path.join(self.prefix, *parts) for parts in (
+                ("Library", "mingw-w64", "bin"), ("Library", "usr", "bin"),
+                ("Library", "bin"), ("Scripts",), ("bin",))]
+        return [os.path.join(self.prefix, "bin")]
+
+    @property
+    def python(self):
+        if WINDOWS:
+            return os.path.join(self.prefix, "python.exe")
+        return os.path.join(self.prefix, "bin", "python")
+
+    def executable(self, program):
+        """
+        Full path of program (e.g. "python", "mfa") in the environment.
+        """
+        if program == "python":
+            return self.python
+        names = [program + ext for ext in (".exe", ".bat", ".cmd")] if WINDOWS else [program]
+        for folder in self.bin_dirs:
+            for name in names:
+                path = os.path.join(folder, name)
+                if os.path.isfile(path):
+                    return path
+        raise LauncherError("No {} in the {} environment ({})".format(
+            program, self.name, self.prefix))
+
+    def environ(self, base=None):
+        """
+        Copy of base (os.environ by default) as activation would set it up.
+        """
+        environ = dict(os.environ if base is None else base)
+        environ["PATH"] = os.pathsep.join(self.bin_dirs + [environ.get("PATH", "")])
+        environ["CONDA_PREFIX"] = self.prefix
+        environ["CONDA_DEFAULT_ENV"] = self.name
+        return environ
+
+
+class Launcher(object):
+    """
+    Resolves conda environments by name and starts their programs. A
+    resolved environment is kept for the session and in the cache file;
+    timings has the duration and source of every resolution. Environments
+    may be requested from several threads (the alignment and emotion
+    stages run side by side), each is resolved once.
+    """
+
+    def __init__(self, settings_path=None, cache_path=None, conda_exe=None):
+        self.settings = {}
+        if settings_path and os.path.exists(settings_path):
+            with open(settings_path) as file:
+                self.settings = json.load(file)
+        self.settings_path = settings_path
+        self.cache_path = cache_path
+        self.conda_exe = (conda_exe or os.environ.get(CONDA_VARIABLE) or self.settings.get("conda")
+                          or os.environ.get("CONDA_EXE") or shutil.which("conda"))
+        self.use_conda_run = bool(self.settings.get("use_conda_run"))
+        self.environments = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "Launcher({0})".format(", ".join(
+            "{}={}".format(name, env.prefix) for name, env in self.environments.items()))
+
+    @classmethod
+    def for_script_dir(cls, script_dir, conda_exe=None):
+        return cls(os.path.join(script_dir, SETTINGS_FILE), os.path.join(script_dir, CACHE_FILE),
+                   conda_exe)
+
+    def environment(self, name):
+        """
+        The CondaEnvironment called name, resolving it on first use.
+        """
+        with self._lock:
+            if name in self.environments:
+                return self.environments[name]
+            start = time.time()
+            prefix, source = self._resolve(name)
+            environment = CondaEnvironment(name, prefix)
+            if not os.path.isfile(environment.python):
+                raise LauncherError("No python in the {} environment ({}, from {})".format(
+                    name, prefix, source))
+            if source != "cache":
+                self._store(environment)
+            self.environments[name] = environment
+            self.timings[name] = (time.time() - start, source)
+        print("Resolved the {} environment from {} in {:.3f} sec: {}".format(
+            name, source, self.timings[name][0], prefix))
+        return environment
+
+    def command(self, name, program, args=()):
+        """
+        Argument list running program of environment name with args.
+        """
+        if self.use_conda_run:
+            return [self._conda(), "run", "-n", name, program] + list(args)
+        return [self.environment(name).executable(program)] + list(args)
+
+    def environ(self, name):
+        if self.use_conda_run:
+            return None
+        return self.environment(name).environ()
+
+    def popen(self, name, program, args=(), **kwargs):
+        """
+        subprocess.Popen of command(name, program, args), without a shell.
+        """
+        command = self.command(name, program, args)
+        start = time.time()
+        process = subprocess.Popen(command, env=self.environ(name), **kwargs)
+        print("Started {} in {:.3f} sec".format(" ".join(command), time.time() - start))
+        return process
+
+    def _conda(self):
+        if not self.conda_exe:
+            raise LauncherError("No conda found, set {} or \"conda\" in {}".format(
+                CONDA_VARIABLE, SETTINGS_FILE))
+        return self.conda_exe
+
+    def _resolve(self, name):
+        """
+        Returns (prefix, source) of environment name.
+        """
+        prefix = os.environ.get(PREFIX_VARIABLE.format(name.upper()))
+        if prefix:
+            return prefix, "environment variable"
+        prefix = self.settings.get("environments", {}).get(name)
+        if prefix:
+            return prefix, "settings"
+
+        entry = self._load_cache().get(name)
+        if entry:
+            try:
+                if _signature(entry["python"]) == entry["signature"]:
+                    return entry["prefix"], "cache"
+            except (OSError, KeyError, TypeError):
+                pass
+
+        conda_exe = self._conda()
+        # <root>/Scripts/conda.exe, <root>/bin/conda or <root>/condabin/conda
+        prefix = os.path.join(os.path.dirname(os.path.dirname(conda_exe)), "envs", name)
+        if os.path.isdir(prefix):
+            return prefix, "conda root"
+        try:
+            output = subprocess.check_output([conda_exe, "env", "list", "--json"])
+            for prefix in json.loads(output.decode("utf-8"))["envs"]:
+                if os.path.basename(os.path.normpath(prefix)) == name:
+                    return prefix, "conda env list"
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+            raise LauncherError("Could not list the conda environments: {}".format(e))
+        raise LauncherError("No conda environment named {}".format(name))
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as file:
+                return json.load(file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _store(self, environment):
+        if not self.cache_path:
+            return
+        try:
+            cache = self._load_cache()
+            cache[environment.name] = {"prefix": environment.prefix, "python": environment.python,
+                                       "signature": _signature(environment.python)}
+            folder = os.path.dirname(self.cache_path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+            with os.fdopen(fd, "w") as file:
+                json.dump(cache, file, indent=4)
+            os.replace(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            pass
+
+
+_launcher = None
+_launcher_lock = threading.Lock()
+
+
+def get_launcher(script_dir, conda_exe=None):
+    """
+    Returns the session-wide launcher of script_dir, creating it on first use.
+    """
+    global _launcher
+    settings_path = os.path.join(script_dir, SETTINGS_FILE)
+    with _launcher_lock:
+        if (_launcher is None or _launcher.settings_path != settings_path
+                or (conda_exe and _launcher.conda_exe != conda_exe)):
+            _launcher = Launcher.for_script_dir(script_dir, conda_exe)
+        return _launcher
@@ -0,0 +1,221 @@
+# Montreal Forced Aligner runs. MFA lives in its own conda environment
+# ("aligner", started through launcher.py) and aligns a run workspace's corpus folder into its output
+# folder; finished alignments are shared through alignment_cache.py. The
+# AlignmentQueue batches many clips into one corpus, and one MFA run.
+
+import json
+import re
+import subprocess
+import time
+import traceback
+
+from collections import OrderedDict
+
+from . import process_stream
+
+MFA_ENVIRONMENT = "aligner"
+
+
+# MFA's stage messages (2.x and 3.x) in the order they are logged, with the
+# fraction of an alignment run done when they appear
+MFA_STAGES = [
+    ("setting up corpus", 0.02),
+    ("loading corpus", 0.05),
+    ("generating base features", 0.1),
+    ("generating mfcc", 0.1),
+    ("calculating cmvn", 0.2),
+    ("generating final features", 0.25),
+    ("creating corpus split", 0.3),
+    ("compiling training graphs", 0.35),
+    ("performing first-pass alignment", 0.45),
+    ("generating alignments", 0.45),
+    ("calculating fmllr", 0.65),
+    ("performing second-pass alignment", 0.75),
+    ("collecting phone and word alignments", 0.85),
+    ("exporting", 0.92),
+    ("done!", 1.0),
+]
+_PERCENT = re.compile(r"(\d{1,3})%\|")
+
+
+class MfaProgress(object):
+    """
+    Follows MFA's output: feed() takes one line and returns True when the
+    fraction of the run done, or the current stage message, changed.
+    Progress bars within a stage move the fraction towards the next stage;
+    it never goes back.
+    """
+
+    def __init__(self, stages=MFA_STAGES):
+        self.stages = stages
+        self.stage = -1
+        self.fraction = 0.0
+        self.message = "Starting MFA..."
+
+    def __repr__(self):
+        return "MfaProgress({0:.0%}, {1})".format(self.fraction, self.message)
+
+    def feed(self, line):
+        lowered = line.lower()
+        for index, (text, fraction) in enumerate(self.stages):
+            if index > self.stage and text in lowered:
+                self.stage = index
+                self.fraction = max(self.fraction, fraction)
+                self.message = line.strip()
+                # drop log prefixes like "INFO     "
+                self.message = re.sub(r"^[A-Z]+\s{2,}", "", self.message)
+                return True
+        match = _PERCENT.search(line)
+        if match and 0 <= self.stage < len(self.stages) - 1:
+            low = self.stages[self.stage][1]
+            high = next((f for t, f in self.stages[self.stage + 1:] if f > low), low)
+            fraction = low + (high - low) * min(int(match.group(1)), 100) / 100.0
+            if fraction > self.fraction:
+                self.fraction = fraction
+                return True
+        return False
+
+
+def run_mfa(launcher, input_dir, lexicon_path, model_path, output_dir,
+            environment=MFA_ENVIRONMENT, num_jobs=None, progress=None, is_cancelled=None):
+    """
+    Runs `mfa align` on a corpus folder and returns its exit code. num_jobs
+    sets MFA's number of parallel jobs. progress(fraction, message) is
+    called from this thread as MFA moves through its stages; if
+    is_cancelled() turns true MFA is terminated and ProcessCancelled raised.
+    Only the stage messages are printed, and the last lines of MFA's output
+    if it fails.
+    """
+    args = ["align", input_dir, lexicon_path, model_path, output_dir]
+    if num_jobs:
+        args += ["-j", str(num_jobs)]
+
+    start = time.time()
+    # in its own process group, so a cancel stops MFA's workers too
+    process = process_stream.StreamingProcess(launcher.popen(
+        environment, "mfa", args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        **process_stream.GROUP_OPTIONS), group=True)
+    tracker = MfaProgress()
+    started = []
+
+    def on_line(stream, line):
+        if not started:
+            started.append(True)
+            print("MFA started in {:.2f} sec".format(time.time() - start))
+        message = tracker.message
+        if tracker.feed(line):
+            if tracker.message != message:
+                print("MFA: {} ({:.1f} sec)".format(tracker.message, time.time() - start))
+            if progress is not None:
+                progress(tracker.fraction, tracker.message)
+
+    exit_code = process.run(on_line, is_cancelled)
+    if exit_code != 0:
+        print("MFA exited with code {}, last output:".format(exit_code))
+        print(process.format_tail(50))
+    return exit_code
+
+
+class AlignmentQueue(object):
+    """
+    Aligns any number of clips with a single `mfa align` run, so MFA's
+    startup, model unpacking and feature setup are paid once. Clips are
+    linked into the corpus folder of a RunWorkspace under unique utterance
+    names, each in its own speaker folder unless a speaker is given, and
+    queue.json in the workspace maps the utterances back to the clips.
+    Clips whose alignment is in the AlignmentCache skip the run.
+    """
+
+    def __init__(self, workspace, launcher, lexicon_path, model_path, num_jobs=None,
+                 cache=None):
+        self.workspace = workspace
+        self.launcher = launcher
+        self.lexicon_path = lexicon_path
+        self.model_path = model_path
+        self.num_jobs = num_jobs
+        self.cache = cache
+        self.clips = OrderedDict()
+        self.errors = OrderedDict()
+
+    def __repr__(self):
+        return "AlignmentQueue({0} clips)".format(len(self.clips))
+
+    def __len__(self):
+        return len(self.clips)
+
+    def add(self, name, sound_path, text_path, corpus_sound=None, speaker=None):
+        """
+        Queues a clip under name. corpus_sound is the file MFA reads if it
+        isn't sound_path itself (e.g. the 16 kHz copy from the audio
+        cache); the cache is keyed on sound_path either way.
+        """
+        if name in self.clips:
+            raise ValueError("Clip queued twice: {}".format(name))
+        utterance = "{:04d}_{}".format(len(self.clips), re.sub(r"[^\w-]", "_", name))
+        key = None
+        if self.cache is not None:
+            try:
+                key = self.cache.key(sound_path, text_path, self.lexicon_path, self.model_path)
+            except Exception:
+                traceback.print_exc()
+        self.clips[name] = {
+            "utterance": utterance,
+            "sound": sound_path,
+            "corpus_sound": corpus_sound or sound_path,
+            "text": text_path,
+            "speaker": speaker or utterance,
+            "key": key,
+        }
+        return utterance
+
+    def run(self, force=False, progress=None, is_cancelled=None):
+        """
+        Aligns the queued clips and returns an OrderedDict of clip name to
+        TextGrid path, None for clips MFA didn't align; the reason is in
+        errors. force ignores cached alignments. progress and is_cancelled
+        are passed on to run_mfa.
+        """
+        results = OrderedDict()
+        pending = []
+        for name, clip in self.clips.items():
+            key = clip["key"]
+            target = self.workspace.textgrid_path(clip["utterance"])
+            if key is not None:
+                if force:
+                    self.cache.invalidate(key)
+                elif self.cache.fetch(key, target):
+                    print("Using cached alignment for {}: {}".format(name, key))
+                    results[name] = target
+                    continue
+            self.workspace.add_corpus_files(
+                clip["corpus_sound"], clip["text"], clip["utterance"], clip["speaker"])
+            pending.append(name)
+
+        with open(self.workspace.path + "/queue.json", "w") as file:
+            json.dump(self.clips, file, indent=4)
+        if not pending:
+            return results
+
+        start = time.time()
+        exit_code = run_mfa(self.launcher, self.workspace.input_dir, self.lexicon_path,
+                            self.model_path, self.workspace.output_dir, num_jobs=self.num_jobs,
+                            progress=progress, is_cancelled=is_cancelled)
+        produced = self.workspace.find_textgrids()
+        for name in pending:
+            clip = self.clips[name]
+            textgrid_file = produced.get(clip["utterance"])
+            results[name] = textgrid_file
+            if textgrid_file is None:
+                self.errors[name] = "MFA produced no TextGrid for {} (exit code {})".format(
+                    clip["sound"], exit_code)
+                print(self.errors[name])
+            elif clip["key"] is not None:
+                try:
+                    self.cache.store(clip["key"], textgrid_file)
+                except Exception:
+                    traceback.print_exc()
+        aligned = sum(1 for name in pending if results[name])
+        print("Aligned {} of {} clips in one MFA run in {:.2f} sec".format(
+            aligned, len(pending), time.time() - start))
+        # keep the results in queue order
+        return OrderedDict((name, results[name]) for name in self.clips)
@@ -0,0 +1,162 @@
+# Small dependency-graph executor for the generation steps. Independent stages
+# run concurrently on worker threads; stages flagged main_thread (anything that
+# touches maya.cmds or Qt widgets) run on the calling thread as soon as their
+# inputs are ready.
+
+import time
+import traceback
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class PipelineError(Exception):
+    pass
+
+
+class PipelineCancelled(PipelineError):
+    pass
+
+
+class Stage(object):
+    def __init__(self, name, func, requires=(), main_thread=False):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.main_thread = main_thread
+
+
+class StageResult(object):
+    def __init__(self, name):
+        self.name = name
+        self.value = None
+        self.error = None
+        self.traceback = ""
+        self.started = None
+        self.finished = None
+
+    def __repr__(self):
+        return "StageResult({0}, ok={1}, elapsed={2:.3f})".format(
+            self.name, self.ok, self.elapsed)
+
+    @property
+    def ok(self):
+        return self.finished is not None and self.error is None
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+def _run_stage(stage, result, inputs):
+    result.started = time.time()
+    try:
+        result.value = stage.func(inputs)
+    except Exception as e:
+        result.error = e
+        result.traceback = traceback.format_exc()
+    result.finished = time.time()
+    return result
+
+
+def _skip_stage(result, error):
+    result.error = error
+    result.started = result.finished = time.time()
+    return result
+
+
+class Pipeline(object):
+    """
+    Stages are added with the names of the stages they depend on. Each stage
+    function receives a dict mapping those names to their return values. A
+    stage whose dependency failed is not run and reports a PipelineError.
+    After cancel() no further stage is started; stages already running on a
+    worker thread are waited for.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self.stages = OrderedDict()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def add(self, name, func, requires=(), main_thread=False):
+        if name in self.stages:
+            raise PipelineError("Duplicate stage: {}".format(name))
+        self.stages[name] = Stage(name, func, requires, main_thread)
+
+    def run(self, poll=None, poll_interval=0.05):
+        """
+        Runs every stage and returns a dict of StageResults by name. poll is
+        called with (name, result) whenever a stage finishes, and with
+        (None, None) while waiting, so a UI can keep processing events.
+        """
+        for stage in self.stages.values():
+            for name in stage.requires:
+                if name not in self.stages:
+                    raise PipelineError(
+                        "Stage {} requires unknown stage {}".format(stage.name, name))
+
+        results = dict((name, StageResult(name)) for name in self.stages)
+        pending = list(self.stages)
+        running = {}
+
+        def notify(name):
+            if poll is not None:
+                poll(name, results[name])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                main_ready = []
+                for name in list(pending):
+                    stage = self.stages[name]
+                    deps = [results[d] for d in stage.requires]
+                    if any(d.finished is None for d in deps):
+                        continue
+                    pending.remove(name)
+                    failed = [d.name for d in deps if not d.ok]
+                    if self.cancelled:
+                        _skip_stage(results[name], PipelineCancelled("Cancelled before starting"))
+                        notify(name)
+                        continue
+                    if failed:
+                        _skip_stage(results[name], PipelineError(
+                            "Skipped, failed dependencies: {}".format(", ".join(failed))))
+                        notify(name)
+                        continue
+                    inputs = dict((d.name, d.value) for d in deps)
+                    if stage.main_thread:
+                        main_ready.append((stage, inputs))
+                    else:
+                        running[executor.submit(
+                            _run_stage, stage, results[name], inputs)] = name
+
+                if main_ready:
+                    for stage, inputs in main_ready:
+                        if self.cancelled:
+                            _skip_stage(results[stage.name],
+                                        PipelineCancelled("Cancelled before starting"))
+                        else:
+                            _run_stage(stage, results[stage.name], inputs)
+                        notify(stage.name)
+                    continue
+
+                if not running:
+                    if pending:
+                        raise PipelineError(
+                            "Dependency cycle between stages: {}".format(", ".join(pending)))
+                    break
+
+                done, _ = wait(list(running), timeout=poll_interval,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    notify(running.pop(future))
+                if not done and poll is not None:
+                    poll(None, None)
+
+        return results
+
@@ -0,0 +1,57 @@
+# Parsed pose cache. Every pose file is parsed once into a read-only mapping
+# {ctrl: {attr: value}} and re-read only when its mtime or size changes.
+# load_pose, the keyframe planner and the UI all share the module-level store.
+
+import json
+import os
+
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+def freeze_pose(pose_data):
+    return MappingProxyType(OrderedDict(
+        (ctrl, MappingProxyType(OrderedDict(attrs))) for ctrl, attrs in pose_data.items()))
+
+
+class PoseStore(object):
+
+    def __init__(self):
+        self._poses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return 'PoseStore({0} poses, {1} hits, {2} misses)'.format(
+            len(self._poses), self.hits, self.misses)
+
+    def get(self, file_path):
+        """
+        Returns the parsed pose stored in file_path.
+        """
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.normcase(os.path.abspath(file_path))
+        entry = self._poses.get(key)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        with open(file_path) as file:
+            pose = freeze_pose(json.load(file, object_pairs_hook=OrderedDict))
+        self._poses[key] = (signature, pose)
+        return pose
+
+    def invalidate(self, file_path=None):
+        if file_path is None:
+            self._poses.clear()
+        else:
+            self._poses.pop(os.path.normcase(os.path.abspath(file_path)), None)
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+
+pose_store = PoseStore()
@@ -0,0 +1,156 @@
+# Output streaming for external tool runs (MFA). A child process writing to
+# both stdout and stderr can block on whichever pipe fills up while the parent
+# is reading the other one, so both pipes are drained by reader threads into
+# one queue, and the calling thread consumes lines as they arrive. Lines are
+# split on "\r" as well as "\n", so progress bars redrawing one line come in
+# as they update. Only a bounded tail of the output is kept.
+#
+# Tools like MFA fan out into worker processes (kaldi binaries,
+# multiprocessing), so processes are started in their own process group
+# (GROUP_OPTIONS) and terminate() stops the whole group.
+
+import collections
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+
+LOG_TAIL_LINES = 200
+
+WINDOWS = sys.platform.startswith("win")
+# Popen keyword arguments starting a process in a new process group
+if WINDOWS:
+    GROUP_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    GROUP_OPTIONS = {"start_new_session": True}
+
+_LINE_BREAK = re.compile(br"\r\n|\r|\n")
+
+
+def _decode_line(line):
+    try:
+        return line.decode('utf-8')
+    except UnicodeDecodeError:
+        return line.decode('utf-8', errors='ignore')
+
+
+def _read_stream(stream, name, lines):
+    buffer = b""
+    try:
+        while True:
+            chunk = stream.read1(4096) if hasattr(stream, "read1") else stream.read(4096)
+            if not chunk:
+                break
+            data, hold = buffer + chunk, b""
+            # a trailing "\r" may be the first half of "\r\n"
+            if data.endswith(b"\r"):
+                data, hold = data[:-1], b"\r"
+            parts = _LINE_BREAK.split(data)
+            buffer = parts.pop() + hold
+            for part in parts:
+                lines.put((name, _decode_line(part)))
+        if buffer.rstrip(b"\r"):
+            lines.put((name, _decode_line(buffer.rstrip(b"\r"))))
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        lines.put((name, None))
+
+
+class ProcessCancelled(Exception):
+    pass
+
+
+class StreamingProcess(object):
+    """
+    Wraps a subprocess.Popen started with stdout and stderr set to
+    subprocess.PIPE. run() drains both pipes at once, calling on_line(stream,
+    line) for every non-empty line on the calling thread, and returns the exit
+    code. tail holds the last tail_lines lines as (stream, line) pairs.
+    group tells that the process was started with GROUP_OPTIONS, and that
+    terminate() should stop its whole process group.
+    """
+
+    def __init__(self, process, tail_lines=LOG_TAIL_LINES, group=False):
+        self.process = process
+        self.group = group
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.lines = queue.Queue()
+        self.readers = []
+        for name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+            if stream is None:
+                continue
+            reader = threading.Thread(target=_read_stream, args=(stream, name, self.lines))
+            reader.daemon = True
+            reader.start()
+            self.readers.append(reader)
+
+    def __repr__(self):
+        return "StreamingProcess({0}, {1} lines kept)".format(self.process.pid, len(self.tail))
+
+    def run(self, on_line=None, is_cancelled=None, poll_interval=0.1):
+        """
+        Waits for the process and returns its exit code. If is_cancelled()
+        turns true the process is terminated and ProcessCancelled raised.
+        """
+        open_streams = len(self.readers)
+        while open_streams:
+            if is_cancelled is not None and is_cancelled():
+                self.terminate()
+                raise ProcessCancelled("Cancelled, process {} terminated".format(self.process.pid))
+            try:
+                name, line = self.lines.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            if line is None:
+                open_streams -= 1
+                continue
+            if not line.strip():
+                continue
+            self.tail.append((name, line))
+            if on_line is not None:
+                on_line(name, line)
+        while True:
+            try:
+                return self.process.wait(timeout=poll_interval)
+            except subprocess.TimeoutExpired:
+                if is_cancelled is not None and is_cancelled():
+                    self.terminate()
+                    raise ProcessCancelled(
+                        "Cancelled, process {} terminated".format(self.process.pid))
+
+    def terminate(self, timeout=5.0):
+        """
+        Stops the process, and with group its children as well.
+        """
+        if self.group and WINDOWS:
+            # taskkill walks the process tree, which outlives a dead parent
+            subprocess.call(["taskkill", "/F", "/T", "/PID", str(self.process.pid)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.process.wait()
+            return
+        if self.group:
+            # children keep the group alive after the parent exits
+            self._signal_group(signal.SIGTERM)
+        elif self.process.poll() is None:
+            self.process.terminate()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        if self.group:
+            self._signal_group(signal.SIGKILL)
+
+    def _signal_group(self, signum):
+        try:
+            os.killpg(self.process.pid, signum)
+        except (OSError, AttributeError):
+            pass
+
+    def format_tail(self, count=None):
+        lines = list(self.tail)[-count:] if count else list(self.tail)
+        return "\n".join("{}: {}".format(name.upper(), line) for name, line in lines)
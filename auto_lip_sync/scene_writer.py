@@ -0,0 +1,264 @@
+# Writes a KeyframePlan (see keyframe_planner.py) into the Maya scene.
+#
+# Two backends produce the same curves:
+#   "api":      one MFnAnimCurve.addKeys call per curve (OpenMayaAnim, API 2.0)
+#   "commands": setKeyframe/keyTangent per key, the original path
+#
+# Only the "commands" backend is undoable: API edits bypass Maya's undo queue
+# and can only be reverted by their SceneEditSession, so the dialog keys with
+# commands unless "Fast keying" is checked. The batch driver, where nothing is
+# undone, uses the API.
+#
+# Writes should run inside a SceneEditSession, which groups them into one undo
+# chunk, suspends viewport refresh and rolls everything back when cancelled.
+# Enter it around the writes only: refresh stays suspended while it is open.
+# DG evaluation isn't suspended separately; it is pulled by the viewport and
+# by reads, and with refresh suspended keying only dirties the curves.
+
+from maya import cmds
+
+try:
+    import maya.api.OpenMaya as om
+    import maya.api.OpenMayaAnim as oma
+except ImportError:
+    # stand-in maya.cmds modules (see batch.py) come without the API,
+    # only the "commands" backend works with them
+    om = oma = None
+
+BACKENDS = ("api", "commands")
+HAS_API = om is not None
+
+TANGENT_TYPES = {}
+if HAS_API:
+    TANGENT_TYPES = {
+        "spline": oma.MFnAnimCurve.kTangentSmooth,
+        "linear": oma.MFnAnimCurve.kTangentLinear,
+        "flat": oma.MFnAnimCurve.kTangentFlat,
+        "step": oma.MFnAnimCurve.kTangentStep,
+        "stepnext": oma.MFnAnimCurve.kTangentStepNext,
+        "clamped": oma.MFnAnimCurve.kTangentClamped,
+        "plateau": oma.MFnAnimCurve.kTangentPlateau,
+        "auto": oma.MFnAnimCurve.kTangentAuto,
+        "fixed": oma.MFnAnimCurve.kTangentFixed,
+    }
+
+# frames per second of currentUnit's named time units
+TIME_UNIT_FPS = {
+    "game": 15.0, "film": 24.0, "pal": 25.0, "ntsc": 30.0,
+    "show": 48.0, "palf": 50.0, "ntscf": 60.0,
+}
+
+
+def get_initial_values(plugs):
+    """
+    Current scene values for the given ctrl.attr plugs, skipping plugs that
+    don't exist in the scene.
+    """
+    values = {}
+    for plug in plugs:
+        try:
+            values[plug] = cmds.getAttr(plug)
+        except (RuntimeError, ValueError):
+            pass
+    return values
+
+
+class KeyingCancelled(Exception):
+    pass
+
+
+class SceneEditSession(object):
+    """
+    Context manager around a batch of scene edits. Opens one named undo
+    chunk and suspends viewport refresh; API edits are recorded in its
+    modifier and curve_change. step() is called between batches with the
+    amount of work done: it reports progress and raises KeyingCancelled
+    once is_cancelled() returns True. A cancelled session, or one left
+    through an exception, is rolled back on exit.
+    """
+
+    def __init__(self, name="autoLipSync", is_cancelled=None, progress=None):
+        self.name = name
+        self.is_cancelled = is_cancelled
+        self.progress = progress
+        self.modifier = om.MDGModifier() if HAS_API else None
+        self.curve_change = oma.MAnimCurveChange() if HAS_API else None
+        self.done = 0
+        self.cancelled = False
+
+    def __repr__(self):
+        return "SceneEditSession({0}, {1} done)".format(self.name, self.done)
+
+    def __enter__(self):
+        cmds.undoInfo(openChunk=True, chunkName=self.name)
+        cmds.refresh(suspend=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(closeChunk=True)
+        if exc_type is not None or self.cancelled:
+            self.rollback()
+        cmds.refresh(force=True)
+        return False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def step(self, count=1):
+        self.done += count
+        if self.progress is not None:
+            self.progress(self.done)
+        if self.cancelled or (self.is_cancelled is not None and self.is_cancelled()):
+            self.cancelled = True
+            raise KeyingCancelled("Cancelled after {} keys".format(self.done))
+
+    def rollback(self):
+        """
+        Reverts the API edits, then the commands recorded in the undo chunk.
+        """
+        if HAS_API:
+            self.curve_change.undoIt()
+            self.modifier.undoIt()
+        # an empty chunk isn't recorded, don't undo whatever came before it
+        if cmds.undoInfo(query=True, undoName=True) == self.name:
+            cmds.undo()
+        print("Rolled back {}.".format(self.name))
+
+
+def scene_frame_rate():
+    """
+    Frames per second of the scene's current time unit.
+    """
+    if HAS_API:
+        return om.MTime(1.0, om.MTime.kSeconds).asUnits(om.MTime.uiUnit())
+    unit = cmds.currentUnit(query=True, time=True)
+    if unit in TIME_UNIT_FPS:
+        return TIME_UNIT_FPS[unit]
+    return float(unit[:-len("fps")])  # e.g. "23.976fps"
+
+
+def apply_plan(plan, backend="commands", session=None):
+    """
+    Keys every curve of the plan and returns the number of keys written.
+    With a SceneEditSession the edits are recorded in it and session.step()
+    is called after each curve with its key count.
+    """
+    if backend == "api":
+        if not HAS_API:
+            raise ValueError("The api keying backend needs maya.api")
+        if session is None:
+            return apply_plan_api(plan)
+        return apply_plan_api(plan, session.modifier, session.curve_change, session.step)
+    elif backend == "commands":
+        return apply_plan_commands(plan, session.step if session is not None else None)
+    raise ValueError("Unknown keying backend: {}".format(backend))
+
+
+def _command_time(time, unit):
+    if unit == "frame":
+        return float(time)
+    return str(time)+unit
+
+
+def apply_plan_commands(plan, step=None):
+    unit = plan.time_unit
+    count = 0
+    for curve in plan:
+        keyed = 0
+        try:
+            for time, value in zip(curve.times, curve.values):
+                cmds.setKeyframe(curve.control, attribute=curve.attribute,
+                                 time=_command_time(time, unit), value=float(value))
+                keyed += 1
+        except RuntimeError:
+            print("Failed to set keyframe: {}".format(curve.plug))
+        else:
+            try:
+                cmds.keyTangent(curve.control, attribute=curve.attribute,
+                                inTangentType=curve.in_tangent, outTangentType=curve.out_tangent)
+            except RuntimeError:
+                print("Failed to set keytangent: {}".format(curve.plug))
+        count += keyed
+        if step is not None:
+            step(keyed)
+    return count
+
+
+def _api_time_unit(unit):
+    if unit == "frame":
+        return om.MTime.uiUnit()
+    return om.MTime.kSeconds
+
+
+def _anim_curve_fn(plug, modifier):
+    """
+    MFnAnimCurve driving plug, creating and connecting a curve if the plug
+    isn't animated yet.
+    """
+    fn = oma.MFnAnimCurve()
+    sources = plug.connectedTo(True, False)
+    if sources and sources[0].node().hasFn(om.MFn.kAnimCurve):
+        fn.setObject(sources[0].node())
+    else:
+        fn.create(plug, modifier)
+        modifier.doIt()
+    return fn
+
+
+def _to_internal_units(fn, values):
+    """
+    setKeyframe takes UI units (degrees, scene linear unit); anim curves
+    store internal units (radians, centimeters).
+    """
+    curve_type = fn.animCurveType
+    if curve_type in (oma.MFnAnimCurve.kAnimCurveTA, oma.MFnAnimCurve.kAnimCurveUA):
+        unit = om.MAngle.uiUnit()
+        return [om.MAngle(v, unit).asRadians() for v in values]
+    if curve_type in (oma.MFnAnimCurve.kAnimCurveTL, oma.MFnAnimCurve.kAnimCurveUL):
+        unit = om.MDistance.uiUnit()
+        return [om.MDistance(v, unit).asCentimeters() for v in values]
+    return [float(v) for v in values]
+
+
+def apply_plan_api(plan, modifier=None, curve_change=None, step=None):
+    """
+    Writes each curve with a single addKeys call. Existing keys on the
+    planned times are replaced, other existing keys are kept, as with
+    setKeyframe. modifier (MDGModifier) and curve_change (MAnimCurveChange)
+    record the edits so the caller can undo them. step is called with the
+    key count after each curve.
+    """
+    if modifier is None:
+        modifier = om.MDGModifier()
+    if curve_change is None:
+        curve_change = oma.MAnimCurveChange()
+    time_unit = _api_time_unit(plan.time_unit)
+    count = 0
+    for curve in plan:
+        try:
+            selection = om.MSelectionList()
+            selection.add(curve.plug)
+            plug = selection.getPlug(0)
+            fn = _anim_curve_fn(plug, modifier)
+        except RuntimeError:
+            print("Failed to set keyframe: {}".format(curve.plug))
+            if step is not None:
+                step(0)
+            continue
+
+        times = [om.MTime(float(t), time_unit) for t in curve.times]
+        if fn.numKeys:
+            for time in reversed(times):
+                index = fn.find(time)
+                if index is not None:
+                    fn.remove(index, curve_change)
+
+        fn.addKeys(om.MTimeArray(times),
+                   om.MDoubleArray(_to_internal_units(fn, curve.values)),
+                   TANGENT_TYPES[curve.in_tangent], TANGENT_TYPES[curve.out_tangent],
+                   True, curve_change)
+        count += len(times)
+        if step is not None:
+            step(len(times))
+    return count
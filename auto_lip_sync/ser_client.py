@@ -0,0 +1,175 @@
+# Client for the persistent SER worker (emotion-classifier/ser_worker.py).
+# The worker is started lazily on the first prediction and reused for the rest
+# of the Maya session; it exits by itself after idle_timeout seconds.
+
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+import uuid
+
+
+class SerWorkerError(Exception):
+    pass
+
+
+class SerWorkerClient(object):
+
+    STARTUP_TIMEOUT = 120.0
+    REQUEST_TIMEOUT = 60.0
+
+    def __init__(self, python_command, worker_script, model_path, temp_dir, idle_timeout=900,
+                 env=None):
+        self.python_command = list(python_command)
+        self.env = env
+        self.worker_script = worker_script
+        self.model_path = model_path
+        self.temp_dir = temp_dir
+        # one port file per client: Maya sessions and batch workers share
+        # temp_dir, and must not pick up (or shut down) each other's worker
+        self.port_file = os.path.join(temp_dir, "ser_worker_{}_{}.port".format(
+            os.getpid(), uuid.uuid4().hex[:8]))
+        self.idle_timeout = idle_timeout
+        self.process = None
+        self.port = None
+
+    def start(self):
+        if not os.path.isdir(os.path.dirname(self.port_file)):
+            os.makedirs(os.path.dirname(self.port_file))
+        try:
+            os.remove(self.port_file)
+        except OSError:
+            pass
+
+        command = self.python_command + [
+            self.worker_script,
+            '--model', self.model_path,
+            '--port-file', self.port_file,
+            '--idle-timeout', str(self.idle_timeout)
+        ]
+        print("Starting SER worker:", command)
+        start = time.time()
+        self.process = subprocess.Popen(command, env=self.env)
+
+        deadline = time.time() + self.STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise SerWorkerError(
+                    "SER worker exited with code {}".format(self.process.returncode))
+            try:
+                with open(self.port_file, 'r') as file:
+                    self.port = int(file.read().strip())
+                print("SER worker started in {:.2f} sec".format(time.time() - start))
+                return
+            except (IOError, OSError, ValueError):
+                time.sleep(0.1)
+        self.stop()
+        raise SerWorkerError("SER worker did not start in time.")
+
+    def request(self, message, timeout=None):
+        if self.port is None:
+            raise SerWorkerError("SER worker is not running.")
+        conn = socket.create_connection(
+            ("127.0.0.1", self.port), timeout=timeout or self.REQUEST_TIMEOUT)
+        try:
+            stream = conn.makefile("rwb")
+            stream.write((json.dumps(message) + "\n").encode("utf-8"))
+            stream.flush()
+            line = stream.readline()
+            stream.close()
+        finally:
+            conn.close()
+        if not line:
+            raise SerWorkerError("SER worker closed the connection.")
+        response = json.loads(line.decode("utf-8"))
+        if response.get("status") != "ok":
+            raise SerWorkerError(response.get("error", "unknown error"))
+        return response
+
+    def is_alive(self):
+        """
+        Health check: the process is running and answers a ping.
+        """
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.request({"command": "ping"}, timeout=2.0)
+            return True
+        except (SerWorkerError, socket.error, ValueError):
+            return False
+
+    def ensure_started(self):
+        if not self.is_alive():
+            self.stop()
+            self.start()
+
+    def predict(self, audio_path, output=None, samples=None):
+        """
+        Returns the emotion class label, the same value predict_script.py
+        writes to class.txt. If output is given the worker writes class.txt
+        there as well. samples is an optional pre-decoded .npy of the clip
+        at 22050 Hz (see audio_cache.py).
+        """
+        self.ensure_started()
+        message = {"command": "predict", "audio": audio_path}
+        if output:
+            message["output"] = output
+        if samples:
+            message["samples"] = samples
+        return self.request(message)["label"]
+
+    def timeline(self, audio_path, output=None, window=3.0, hop=1.0, samples=None):
+        """
+        Returns the emotion track of the clip as a list of
+        (start, end, label, confidence) tuples.
+        """
+        self.ensure_started()
+        message = {"command": "timeline", "audio": audio_path,
+                   "window": window, "hop": hop}
+        if output:
+            message["output"] = output
+        if samples:
+            message["samples"] = samples
+        return [tuple(segment) for segment in self.request(message)["timeline"]]
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.request({"command": "shutdown"}, timeout=2.0)
+                self.process.wait(5)
+            except Exception:
+                self.process.kill()
+        self.process = None
+        self.port = None
+        try:
+            os.remove(self.port_file)
+        except OSError:
+            pass
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_ser_worker(python_command, worker_script, model_path, temp_dir, idle_timeout=900,
+                   env=None):
+    """
+    Returns the session-wide SER worker client, creating it on first use.
+    env is the environment the worker process starts with. A worker
+    started with different arguments is stopped and replaced.
+    """
+    global _worker
+    with _worker_lock:
+        if (_worker is None or _worker.model_path != model_path
+                or _worker.python_command != list(python_command)
+                or _worker.worker_script != worker_script
+                or _worker.temp_dir != temp_dir
+                or _worker.idle_timeout != idle_timeout
+                or _worker.env != env):
+            if _worker is not None:
+                _worker.stop()
+            _worker = SerWorkerClient(
+                python_command, worker_script, model_path, temp_dir, idle_timeout, env)
+        return _worker
@@ -0,0 +1,105 @@
+# Per-run work directories. Every generation gets its own folder with the MFA
+# corpus (input), the alignment (output) and the SER results (ser), so runs
+# never share files and can safely execute at the same time. Inputs are
+# hardlinked or symlinked into the corpus and only copied as a last resort.
+
+import os
+import shutil
+import tempfile
+import time
+
+
+def link_or_copy(source, destination):
+    """
+    Makes destination refer to source without copying when possible.
+    Returns "hardlink", "symlink" or "copy".
+    """
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except (OSError, AttributeError, NotImplementedError):
+        pass
+    try:
+        os.symlink(os.path.abspath(source), destination)
+        return "symlink"
+    except (OSError, AttributeError, NotImplementedError):
+        pass
+    shutil.copy(source, destination)
+    return "copy"
+
+
+class RunWorkspace(object):
+
+    def __init__(self, root):
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self.path = tempfile.mkdtemp(prefix="run_", dir=root).replace("\\", "/")
+        self.input_dir = self.path + "/input"
+        self.output_dir = self.path + "/output"
+        self.ser_dir = self.path + "/ser"
+        self.corpus_name = None
+        for folder in (self.input_dir, self.output_dir, self.ser_dir):
+            os.mkdir(folder)
+
+    def __repr__(self):
+        return "RunWorkspace({0})".format(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+    def add_corpus_files(self, sound_path, text_path, name=None, speaker=None):
+        """
+        Links a wav and its transcript into the input folder under a shared
+        base name, as MFA pairs them by name. MFA takes subfolders for
+        speakers, so with a speaker the files go into a folder of that
+        name. Returns the base name.
+        """
+        if name is None:
+            name = os.path.splitext(os.path.basename(sound_path))[0]
+        folder = self.input_dir
+        if speaker is not None:
+            folder += "/" + speaker
+            if not os.path.isdir(folder):
+                os.mkdir(folder)
+        link_or_copy(sound_path, folder + "/" + name + ".wav")
+        link_or_copy(text_path, folder + "/" + name + ".txt")
+        self.corpus_name = name
+        return name
+
+    def textgrid_path(self, name):
+        return self.output_dir + "/" + name + ".TextGrid"
+
+    def find_textgrids(self):
+        """
+        Maps the base name of every TextGrid in the output folder, which MFA
+        names after the corpus files, to its path. MFA mirrors the speaker
+        folders of the corpus, so subfolders are searched as well.
+        """
+        textgrids = {}
+        for root, dirs, files in os.walk(self.output_dir):
+            for file in files:
+                if file.endswith(".TextGrid"):
+                    textgrids[file[:-len(".TextGrid")]] = root.replace("\\", "/") + "/" + file
+        return textgrids
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def purge_stale(root, max_age=24 * 60 * 60):
+        """
+        Removes run folders left behind by crashed sessions.
+        """
+        if not os.path.isdir(root):
+            return
+        now = time.time()
+        for folder in os.listdir(root):
+            path = os.path.join(root, folder)
+            try:
+                if folder.startswith("run_") and now - os.path.getmtime(path) > max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
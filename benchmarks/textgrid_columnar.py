@@ -0,0 +1,77 @@
+# Compares memory use and time lookups of IntervalTier with the array-backed
+# ColumnarIntervalTier on a synthetic MFA-style phone tier.
+#
+#   python benchmarks/textgrid_columnar.py [number of phone intervals]
+
+from __future__ import print_function
+
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from textgrid import ColumnarIntervalTier, IntervalTier  # noqa: E402
+
+PHONES = ['a', 'i', 'u', 'e', 'o', 'k', 's', 't', 'n', 'sh', 'ch', 'sil', '']
+
+
+def make_rows(n_intervals):
+    random.seed(0)
+    rows = []
+    t = 0.
+    for i in range(n_intervals):
+        end = round(t + random.uniform(0.02, 0.2), 5)
+        # marks as a reader produces them: a new string per interval
+        rows.append((t, end, ''.join(list(random.choice(PHONES)))))
+        t = end
+    return rows
+
+
+def build(cls, rows):
+    tier = cls('phones', 0.)
+    for start, end, mark in rows:
+        tier.add(start, end, mark)
+    return tier
+
+
+def measure(cls, rows):
+    tracemalloc.start()
+    tier = build(cls, rows)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tier, size
+
+
+def main(n_intervals):
+    rows = make_rows(n_intervals)
+    end = rows[-1][1]
+    random.seed(1)
+    probes = [random.uniform(0., end) for _ in range(10000)]
+
+    plain, plain_size = measure(IntervalTier, rows)
+    columnar, columnar_size = measure(ColumnarIntervalTier, rows)
+    assert [(i.minTime, i.maxTime, i.mark) for i in plain] == \
+        [(i.minTime, i.maxTime, i.mark) for i in columnar]
+    assert [plain.indexContaining(t) for t in probes] == \
+        [columnar.indexContaining(t) for t in probes]
+
+    print('{0} intervals: {1:.1f} bytes/interval list-backed, {2:.1f} bytes/interval columnar ({3:.1f}x)'.format(
+        n_intervals, plain_size / float(n_intervals), columnar_size / float(n_intervals),
+        plain_size / float(columnar_size)))
+
+    def lookups(tier):
+        index = tier.indexContaining
+        return lambda: [index(t) for t in probes]
+
+    t_plain = min(timeit.repeat(lookups(plain), number=1, repeat=3))
+    t_columnar = min(timeit.repeat(lookups(columnar), number=1, repeat=3))
+    print('{0} lookups: {1:.2f}us list-backed, {2:.2f}us columnar ({3:.1f}x)'.format(
+        len(probes), t_plain / len(probes) * 1e6, t_columnar / len(probes) * 1e6,
+        t_plain / t_columnar))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
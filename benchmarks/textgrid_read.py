@@ -0,0 +1,202 @@
+# Compares TextGrid.read with the previous line-by-line reader (read_lines
+# below, no longer part of the library) on a synthetic MFA-style TextGrid, in
+# both the long and the short text format, and times reading and writing
+# Praat's binary format.
+#
+#   python benchmarks/textgrid_read.py [number of phone intervals]
+
+from __future__ import print_function
+
+import codecs
+import os
+import random
+import re
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from textgrid import TextGrid, IntervalTier, PointTier, Interval, Point  # noqa: E402
+from textgrid.exceptions import TextGridError  # noqa: E402
+from textgrid.textgrid import DEFAULT_TEXTGRID_PRECISION, detectEncoding  # noqa: E402
+
+PHONES = ['a', 'i', 'u', 'e', 'o', 'k', 's', 't', 'n', 'sh', 'ch', 'sil', '']
+
+
+def _getMark(text, short):
+    """
+    Return the mark or text entry on a line. Praat escapes double-quotes
+    by doubling them, so doubled double-quotes are read as single
+    double-quotes. Newlines within an entry are allowed.
+    """
+
+    line = text.readline()
+
+    # check that the line begins with a valid entry type
+    if not short and not re.match(r'^\s*(text|mark) = "', line):
+        raise ValueError('Bad entry: ' + line)
+
+    # read until the number of double-quotes is even
+    while line.count('"') % 2:
+        next_line = text.readline()
+
+        if not next_line:
+            raise EOFError('Bad entry: ' + line[:20] + '...')
+
+        line += next_line
+    if short:
+        pattern = r'^"(.*?)"\s*$'
+    else:
+        pattern = r'^\s*(text|mark) = "(.*?)"\s*$'
+    entry = re.match(pattern, line, re.DOTALL)
+
+    return entry.groups()[-1].replace('""', '"')
+
+
+def parse_line(line, short, to_round):
+    line = line.strip()
+    if short:
+        if '"' in line:
+            return line[1:-1]
+        return round(float(line), to_round)
+    if '"' in line:
+        m = re.match(r'.+? = "(.*)"', line)
+        return m.groups()[0]
+    m = re.match(r'.+? = (.*)', line)
+    return round(float(m.groups()[0]), to_round)
+
+
+def parse_header(source):
+    header = source.readline()  # header junk
+    m = re.match(r'File type = "([\w ]+)"', header)
+    if m is None or not m.groups()[0].startswith('ooTextFile'):
+        raise TextGridError('The file could not be parsed as a Praat text file as it is lacking a proper header.')
+
+    short = 'short' in m.groups()[0]
+    file_type = parse_line(source.readline(), short, '')  # header junk
+    t = source.readline()  # header junk
+    return (file_type, short)
+
+
+def read_lines(f, round_digits=DEFAULT_TEXTGRID_PRECISION, encoding=None):
+    """
+    The line-by-line reader TextGrid.read replaced, kept here as the
+    reference it is checked and timed against.
+    """
+    grid = TextGrid()
+    if encoding is None:
+        encoding = detectEncoding(f)
+    with codecs.open(f, 'r', encoding=encoding) as source:
+        file_type, short = parse_header(source)
+        if file_type != 'TextGrid':
+            raise TextGridError('The file could not be parsed as a TextGrid as it is lacking a proper header.')
+
+        first_line_beside_header = source.readline()
+        try:
+            parse_line(first_line_beside_header, short, round_digits)
+        except Exception:
+            short = True
+
+        grid.minTime = parse_line(first_line_beside_header, short, round_digits)
+        grid.maxTime = parse_line(source.readline(), short, round_digits)
+        source.readline()  # more header junk
+        if short:
+            m = int(source.readline().strip())  # will be grid.n
+        else:
+            m = int(source.readline().strip().split()[2])  # will be grid.n
+        if not short:
+            source.readline()
+        for i in range(m):  # loop over grids
+            if not short:
+                source.readline()
+            if parse_line(source.readline(), short, round_digits) == 'IntervalTier':
+                inam = parse_line(source.readline(), short, round_digits)
+                imin = parse_line(source.readline(), short, round_digits)
+                imax = parse_line(source.readline(), short, round_digits)
+                itie = IntervalTier(inam, imin, imax)
+                itie.strict = grid.strict
+                n = int(parse_line(source.readline(), short, round_digits))
+                for j in range(n):
+                    if not short:
+                        source.readline().rstrip().split()  # header junk
+                    jmin = parse_line(source.readline(), short, round_digits)
+                    jmax = parse_line(source.readline(), short, round_digits)
+                    jmrk = _getMark(source, short)
+                    if jmin < jmax:  # non-null
+                        itie.addInterval(Interval(jmin, jmax, jmrk))
+                grid.append(itie)
+            else:  # pointTier
+                inam = parse_line(source.readline(), short, round_digits)
+                imin = parse_line(source.readline(), short, round_digits)
+                imax = parse_line(source.readline(), short, round_digits)
+                itie = PointTier(inam)
+                n = int(parse_line(source.readline(), short, round_digits))
+                for j in range(n):
+                    source.readline().rstrip()  # header junk
+                    jtim = parse_line(source.readline(), short, round_digits)
+                    jmrk = _getMark(source, short)
+                    itie.addPoint(Point(jtim, jmrk))
+                grid.append(itie)
+    return grid
+
+
+def make_textgrid(n_intervals):
+    random.seed(0)
+    phones = IntervalTier('phones', 0.)
+    words = IntervalTier('words', 0.)
+    t = 0.
+    word_start = 0.
+    for i in range(n_intervals):
+        end = round(t + random.uniform(0.02, 0.2), 5)
+        phones.add(t, end, random.choice(PHONES))
+        if i % 4 == 3:
+            words.add(word_start, end, 'w{0}'.format(i))
+            word_start = end
+        t = end
+    grid = TextGrid(maxTime=t)
+    grid.append(words)
+    grid.append(phones)
+    return grid
+
+
+def tier_tuples(grid):
+    return [(tier.name, [(i.minTime, i.maxTime, i.mark) for i in tier]) for tier in grid]
+
+
+def main(n_intervals):
+    grid = make_textgrid(n_intervals)
+    folder = tempfile.mkdtemp()
+    long_path = os.path.join(folder, 'long.TextGrid')
+    short_path = os.path.join(folder, 'short.TextGrid')
+    grid.write(long_path)
+    grid.write(short_path, format='short')
+    binary_path = os.path.join(folder, 'binary.TextGrid')
+
+    for label, path in (('long', long_path), ('short', short_path)):
+        fast = TextGrid()
+        fast.read(path)
+        legacy = read_lines(path)
+        assert tier_tuples(fast) == tier_tuples(legacy), label
+
+        t_fast = min(timeit.repeat(lambda: TextGrid().read(path), number=1, repeat=3))
+        t_legacy = min(timeit.repeat(lambda: read_lines(path), number=1, repeat=3))
+        print('{0:>5} format, {1} intervals: read {2:.3f}s, line reader {3:.3f}s ({4:.1f}x)'.format(
+            label, n_intervals, t_fast, t_legacy, t_legacy / t_fast))
+
+    reference = tier_tuples(TextGrid.fromFile(long_path))
+    for label, path in (('long', long_path), ('short', short_path), ('binary', binary_path)):
+        t_write = min(timeit.repeat(lambda: grid.write(path, format=label), number=1, repeat=3))
+        assert tier_tuples(TextGrid.fromFile(path)) == reference, label
+        t_read = min(timeit.repeat(lambda: TextGrid.fromFile(path), number=1, repeat=3))
+        print('{0:>6} format, {1} intervals: write {2:.3f}s, read {3:.3f}s, {4:.1f} MB'.format(
+            label, n_intervals, t_write, t_read, os.path.getsize(path) / 1e6))
+
+    os.remove(long_path)
+    os.remove(short_path)
+    os.remove(binary_path)
+    os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
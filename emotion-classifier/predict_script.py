@@ -1,38 +1,179 @@
 # Conteúdo do arquivo predict_script.py
 import argparse
+import csv
+import json
 import librosa
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tensorflow.keras.models import load_model
 import os
 
+AUDIO_EXTENSIONS = ('.wav',)
+MFCC_HOP_LENGTH = 512
+SAMPLE_RATE = 22050  # librosa.load's default, the rate the model was trained on
 
-def main(args):
-    new_model = load_model(args.model)
 
-    data, sampling_rate = librosa.load(args.audio, duration=3, offset=0.5)
+def load_ser_model(model_path):
+    return load_model(model_path)
+
+
+def load_audio(audio_path, samples=None, offset=0.0, duration=None):
+    """
+    Mono float32 samples at SAMPLE_RATE. samples is the path of the clip
+    already decoded to a .npy array at that rate (see the Maya tool's
+    audio_cache.py); it is memory mapped instead of decoding audio_path.
+    """
+    if samples:
+        data = np.load(samples, mmap_mode='r')
+        first = int(round(offset * SAMPLE_RATE))
+        last = None if duration is None else first + int(round(duration * SAMPLE_RATE))
+        return np.array(data[first:last], dtype=np.float32), SAMPLE_RATE
+    return librosa.load(audio_path, sr=SAMPLE_RATE, offset=offset, duration=duration)
+
 
-    mfcc = np.mean(librosa.feature.mfcc(
+def extract_mfcc(audio_path, samples=None):
+    data, sampling_rate = load_audio(audio_path, samples, offset=0.5, duration=3)
+
+    return np.mean(librosa.feature.mfcc(
         y=data, sr=sampling_rate, n_mfcc=40).T, axis=0)
 
+
+def extract_features(audio_path, samples=None):
+    mfcc = extract_mfcc(audio_path, samples)
     mfcc = np.expand_dims(mfcc, axis=0)
     mfcc = np.expand_dims(mfcc, axis=-1)
+    return mfcc
 
-    predictions = new_model.predict(mfcc)
 
-    predicted_class = np.argmax(predictions)
+def class_label(predicted_class):
     if predicted_class == 1:
-        predicted_class = 'neutral'
+        return 'neutral'
     elif predicted_class == 3:
-        predicted_class = 'happy'
+        return 'happy'
     elif predicted_class == 5:
-        predicted_class = 'angry'
+        return 'angry'
+    return 'neutral'
+
+
+def predict_emotion(model, audio_path, samples=None):
+    predictions = model.predict(extract_features(audio_path, samples))
+    return class_label(np.argmax(predictions))
+
+
+def extract_window_features(audio_path, window=3.0, hop=1.0, samples=None):
+    """
+    Frames the whole clip into windows of `window` seconds every `hop`
+    seconds and returns (starts, ends, mfcc_means) with one 40-coefficient
+    MFCC mean per window. The MFCCs are computed once for the clip and the
+    window means come from a cumulative sum, so every window costs O(1).
+    """
+    data, sampling_rate = load_audio(audio_path, samples)
+    mfcc = librosa.feature.mfcc(
+        y=data, sr=sampling_rate, n_mfcc=40, hop_length=MFCC_HOP_LENGTH).T
+    n_frames = mfcc.shape[0]
+    frames_per_second = float(sampling_rate) / MFCC_HOP_LENGTH
+
+    window_frames = max(1, int(round(window * frames_per_second)))
+    hop_frames = max(1, int(round(hop * frames_per_second)))
+    first = np.arange(0, max(n_frames - window_frames, 0) + 1, hop_frames)
+    if first[-1] + window_frames < n_frames:
+        # one more window aligned to the end so the tail is covered too
+        first = np.append(first, n_frames - window_frames)
+    last = np.minimum(first + window_frames, n_frames)
+
+    cumulative = np.vstack([np.zeros((1, mfcc.shape[1])),
+                            np.cumsum(mfcc, axis=0, dtype=np.float64)])
+    means = (cumulative[last] - cumulative[first]) / (last - first)[:, np.newaxis]
+
+    duration = len(data) / float(sampling_rate)
+    starts = first / frames_per_second
+    ends = np.minimum(last / frames_per_second, duration)
+    return starts, ends, means.astype(np.float32)
+
+
+def smooth_probabilities(probabilities, smoothing):
+    """
+    Centered moving average over `smoothing` windows.
+    """
+    if smoothing <= 1 or len(probabilities) < 2:
+        return probabilities
+    half = smoothing // 2
+    padded = np.pad(probabilities, ((half, smoothing - 1 - half), (0, 0)), mode='edge')
+    cumulative = np.vstack([np.zeros((1, padded.shape[1])), np.cumsum(padded, axis=0)])
+    return (cumulative[smoothing:] - cumulative[:-smoothing]) / smoothing
+
+
+def emotion_timeline(starts, ends, probabilities, smoothing=3, margin=0.15):
+    """
+    Turns per-window class probabilities into a list of
+    (start, end, label, confidence) segments. Probabilities are smoothed
+    over neighbouring windows, and the label only switches when the new
+    class beats the current one by `margin` (hysteresis), so it doesn't
+    flicker between windows.
+    """
+    if len(probabilities) == 0:
+        return []
+    smoothed = smooth_probabilities(np.asarray(probabilities, dtype=np.float64), smoothing)
+
+    current = int(np.argmax(smoothed[0]))
+    classes = np.empty(len(smoothed), dtype=int)
+    for i, row in enumerate(smoothed):
+        candidate = int(np.argmax(row))
+        if class_label(candidate) != class_label(current) and \
+                row[candidate] - row[current] >= margin:
+            current = candidate
+        classes[i] = current
+    confidence = smoothed[np.arange(len(smoothed)), classes]
+
+    # Window centres split the clip, so segments tile it without overlaps.
+    centres = (np.asarray(starts) + np.asarray(ends)) / 2.0
+    bounds = np.concatenate([[starts[0]], (centres[1:] + centres[:-1]) / 2.0, [ends[-1]]])
+
+    timeline = []
+    first = 0
+    for i in range(1, len(classes) + 1):
+        if i == len(classes) or class_label(classes[i]) != class_label(classes[first]):
+            timeline.append((float(bounds[first]), float(bounds[i]),
+                             class_label(classes[first]),
+                             float(np.mean(confidence[first:i]))))
+            first = i
+    return timeline
+
+
+def predict_timeline(model, audio_path, window=3.0, hop=1.0, smoothing=3, margin=0.15,
+                     samples=None):
+    starts, ends, means = extract_window_features(audio_path, window, hop, samples)
+    probabilities = model.predict(means[..., np.newaxis], verbose=0)
+    return emotion_timeline(starts, ends, probabilities, smoothing, margin)
+
+
+def dominant_label(timeline):
+    """
+    The label covering the most time, used for class.txt in timeline mode.
+    """
+    totals = {}
+    for start, end, label, confidence in timeline:
+        totals[label] = totals.get(label, 0.0) + end - start
+    return max(totals, key=totals.get) if totals else 'neutral'
+
+
+def write_timeline_file(timeline, output):
+    if os.path.isdir(output):
+        output_path = os.path.join(output, 'emotion_timeline.json')
     else:
-        predicted_class = 'neutral'
+        output_path = os.path.splitext(output)[0] + '_timeline.json'
 
-    if os.path.isdir(args.output):
-        output_path = os.path.join(args.output, 'class.txt')
+    with open(output_path, 'w') as file:
+        json.dump([{'start': start, 'end': end, 'label': label, 'confidence': confidence}
+                   for start, end, label, confidence in timeline], file, indent=4)
+    print("wrote emotion timeline OK")
+
+
+def write_class_file(predicted_class, output):
+    if os.path.isdir(output):
+        output_path = os.path.join(output, 'class.txt')
     else:
-        output_path = args.output
+        output_path = output
 
     try:
         with open(output_path, 'w') as file:
@@ -42,6 +183,118 @@ def main(args):
         print("error in creating file class.txt")
 
 
+def collect_audio_paths(audio_dir=None, manifest=None):
+    """
+    Wav paths from a directory (searched recursively) or a manifest with one
+    path per line, relative paths being resolved against the manifest folder.
+    """
+    paths = []
+    if audio_dir:
+        for root, dirs, files in os.walk(audio_dir):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(AUDIO_EXTENSIONS):
+                    paths.append(os.path.join(root, file))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    paths.append(os.path.join(base, line))
+    return paths
+
+
+def _safe_extract_mfcc(audio_path):
+    try:
+        return extract_mfcc(audio_path), None
+    except Exception as e:
+        return None, repr(e)
+
+
+def predict_batch(model, audio_paths, batch_size=64, jobs=4, processes=False):
+    """
+    Yields one result dict per audio path. MFCCs are extracted in a worker
+    pool while the model predicts fixed-size batches in the main process.
+    """
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=jobs) as executor:
+        # map() queues every file up front, so extraction of the next batch
+        # keeps running while the current one is being predicted.
+        features = executor.map(_safe_extract_mfcc, audio_paths)
+        for start in range(0, len(audio_paths), batch_size):
+            chunk = audio_paths[start:start + batch_size]
+            chunk_features = [next(features) for _ in chunk]
+
+            valid = [i for i, (mfcc, error) in enumerate(chunk_features) if error is None]
+            probabilities = []
+            if valid:
+                stacked = np.stack([chunk_features[i][0] for i in valid])
+                probabilities = model.predict(
+                    stacked[..., np.newaxis], batch_size=len(valid), verbose=0)
+
+            rows = dict(zip(valid, probabilities))
+            for i, audio_path in enumerate(chunk):
+                if i in rows:
+                    predicted_class = int(np.argmax(rows[i]))
+                    yield {'audio': audio_path,
+                           'label': class_label(predicted_class),
+                           'class': predicted_class,
+                           'probabilities': [float(p) for p in rows[i]],
+                           'error': None}
+                else:
+                    yield {'audio': audio_path, 'label': None, 'class': None,
+                           'probabilities': None, 'error': chunk_features[i][1]}
+
+
+def write_batch_results(results, output_path):
+    """
+    Writes batch results as JSONL, or as CSV when output_path ends in .csv.
+    Returns the number of rows written.
+    """
+    count = 0
+    with open(output_path, 'w', newline='') as file:
+        if output_path.lower().endswith('.csv'):
+            writer = csv.writer(file)
+            writer.writerow(['audio', 'label', 'class', 'probabilities', 'error'])
+            for result in results:
+                probabilities = ' '.join(
+                    '{:.6f}'.format(p) for p in result['probabilities'] or [])
+                writer.writerow([result['audio'], result['label'], result['class'],
+                                 probabilities, result['error'] or ''])
+                count += 1
+        else:
+            for result in results:
+                file.write(json.dumps(result) + '\n')
+                count += 1
+    return count
+
+
+def batch_main(args):
+    audio_paths = collect_audio_paths(args.audio_dir, args.manifest)
+    print("classifying {} files".format(len(audio_paths)))
+    new_model = load_ser_model(args.model)
+    results = predict_batch(new_model, audio_paths, args.batch_size,
+                            args.jobs, args.processes)
+    output_path = args.output
+    if os.path.isdir(output_path):
+        output_path = os.path.join(output_path, 'classes.jsonl')
+    count = write_batch_results(results, output_path)
+    print("wrote {} results to {}".format(count, output_path))
+
+
+def main(args):
+    new_model = load_ser_model(args.model)
+    if args.timeline:
+        timeline = predict_timeline(new_model, args.audio, args.window, args.hop,
+                                    args.smoothing, args.margin, args.samples)
+        write_timeline_file(timeline, args.output)
+        predicted_class = dominant_label(timeline)
+    else:
+        predicted_class = predict_emotion(new_model, args.audio, args.samples)
+    write_class_file(predicted_class, args.output)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='SER predictions.')
@@ -55,5 +308,43 @@ if __name__ == "__main__":
     parser.add_argument(
         '--output', type=str, help='output path.')
 
+    parser.add_argument('--samples', type=str,
+                        help='the audio already decoded to a float32 .npy array at 22050 Hz.')
+
+    parser.add_argument('--audio-dir', type=str,
+                        help='batch mode: classify every wav in this folder.')
+
+    parser.add_argument('--manifest', type=str,
+                        help='batch mode: text file with one wav path per line.')
+
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help='batch mode: clips per model.predict call.')
+
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='batch mode: feature extraction workers.')
+
+    parser.add_argument('--processes', action='store_true',
+                        help='batch mode: extract features in processes instead of threads.')
+
+    parser.add_argument('--timeline', action='store_true',
+                        help='predict sliding windows over the whole clip and write emotion_timeline.json.')
+
+    parser.add_argument('--window', type=float, default=3.0,
+                        help='timeline mode: window length in seconds.')
+
+    parser.add_argument('--hop', type=float, default=1.0,
+                        help='timeline mode: seconds between window starts.')
+
+    parser.add_argument('--smoothing', type=int, default=3,
+                        help='timeline mode: windows averaged before labelling.')
+
+    parser.add_argument('--margin', type=float, default=0.15,
+                        help='timeline mode: probability lead needed to switch label.')
+
     args = parser.parse_args()
-    main(args)
+    if args.audio_dir or args.manifest:
+        if not args.output:
+            parser.error('batch mode needs --output, a jsonl file or a folder for classes.jsonl')
+        batch_main(args)
+    else:
+        main(args)
@@ -0,0 +1,126 @@
+# Long-lived SER worker: loads the model once and answers prediction requests
+# over a local socket, one JSON object per line.
+#
+# Requests:
+#   {"command": "ping"}
+#   {"command": "predict", "audio": "<wav path>", "output": "<class.txt dir or path>"}
+#   {"command": "timeline", "audio": "<wav path>", "output": "<dir>", "window": 3.0, "hop": 1.0}
+# predict and timeline also take "samples": the path of the audio already
+# decoded to a float32 .npy array at 22050 Hz, used instead of decoding the wav.
+#   {"command": "shutdown"}
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import predict_script  # noqa: E402
+
+
+class SerWorker(object):
+    def __init__(self, model_path, idle_timeout):
+        self.model_path = model_path
+        self.idle_timeout = idle_timeout
+        self.model = predict_script.load_ser_model(model_path)
+        self.started = time.time()
+        self.requests = 0
+        self.running = True
+
+    def handle(self, request):
+        command = request.get("command")
+        if command == "ping":
+            return {"status": "ok", "model": self.model_path,
+                    "uptime": time.time() - self.started,
+                    "requests": self.requests}
+        if command == "predict":
+            self.requests += 1
+            label = predict_script.predict_emotion(
+                self.model, request["audio"], request.get("samples"))
+            if request.get("output"):
+                predict_script.write_class_file(label, request["output"])
+            return {"status": "ok", "label": label}
+        if command == "timeline":
+            self.requests += 1
+            timeline = predict_script.predict_timeline(
+                self.model, request["audio"],
+                request.get("window", 3.0), request.get("hop", 1.0),
+                request.get("smoothing", 3), request.get("margin", 0.15),
+                request.get("samples"))
+            label = predict_script.dominant_label(timeline)
+            if request.get("output"):
+                predict_script.write_timeline_file(timeline, request["output"])
+                predict_script.write_class_file(label, request["output"])
+            return {"status": "ok", "label": label, "timeline": timeline}
+        if command == "shutdown":
+            self.running = False
+            return {"status": "ok"}
+        return {"status": "error", "error": "unknown command: {}".format(command)}
+
+    def serve_connection(self, conn):
+        stream = conn.makefile("rwb")
+        try:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    response = self.handle(json.loads(line.decode("utf-8")))
+                except Exception as e:
+                    response = {"status": "error", "error": repr(e)}
+                stream.write((json.dumps(response) + "\n").encode("utf-8"))
+                stream.flush()
+                if not self.running:
+                    break
+        finally:
+            stream.close()
+            conn.close()
+
+    def serve(self, port_file):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        server.settimeout(self.idle_timeout)
+
+        # The port file doubles as the "model loaded" signal for the client.
+        tmp_path = port_file + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(str(server.getsockname()[1]))
+        os.replace(tmp_path, port_file)
+
+        try:
+            while self.running:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    print("SER worker idle for {} sec, exiting.".format(
+                        self.idle_timeout))
+                    break
+                conn.settimeout(self.idle_timeout)
+                try:
+                    self.serve_connection(conn)
+                except socket.timeout:
+                    pass
+        finally:
+            server.close()
+            try:
+                os.remove(port_file)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Persistent SER prediction worker.')
+
+    parser.add_argument('--model', type=str,
+                        help='SER model path.')
+
+    parser.add_argument('--port-file', type=str,
+                        help='file the listening port is written to once the model is loaded.')
+
+    parser.add_argument('--idle-timeout', type=float, default=900,
+                        help='seconds without a connection before the worker exits.')
+
+    args = parser.parse_args()
+    SerWorker(args.model, args.idle_timeout).serve(args.port_file)
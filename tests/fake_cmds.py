@@ -0,0 +1,51 @@
+# Stand-in for maya.cmds, for running the batch driver without Maya:
+#
+#   python -m auto_lip_sync.batch manifest.csv --cmds fake_cmds
+#
+# It records the keys set on the open scene and "saves" a scene as a JSON file
+# {"scene": <opened scene>, "keys": {"ctrl.attr": [[time, value], ...]}}.
+# Attributes read as 0.0 and the time unit is film (24 fps).
+
+import json
+
+keys = {}
+state = {"scene": None, "name": None}
+
+
+def file(*args, **kwargs):
+    if kwargs.get("open"):
+        state["scene"] = state["name"] = args[0]
+        keys.clear()
+    elif kwargs.get("rename"):
+        state["name"] = kwargs["rename"]
+    elif kwargs.get("save"):
+        with open(state["name"], "w") as output:
+            json.dump({"scene": state["scene"], "keys": keys}, output)
+    return state["name"]
+
+
+def setKeyframe(control, attribute, time, value):
+    keys.setdefault(control + "." + attribute, []).append([time, value])
+    return 1
+
+
+def keyTangent(*args, **kwargs):
+    return 1
+
+
+def getAttr(plug):
+    return 0.0
+
+
+def currentUnit(query=True, time=True):
+    return "film"
+
+
+def undoInfo(*args, **kwargs):
+    if kwargs.get("query"):
+        return ""
+    return None
+
+
+def refresh(*args, **kwargs):
+    return None
@@ -0,0 +1,104 @@
+# Runs the batch driver on a two-clip manifest against the stand-in
+# maya.cmds in fake_cmds.py. The clips come with an alignment and an emotion,
+# so neither MFA nor SER is needed.
+
+import json
+import os
+import sys
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_lip_sync import batch
+
+TEXTGRID = """File type = "ooTextFile"
+Object class = "TextGrid"
+
+xmin = 0
+xmax = 1.5
+tiers? <exists>
+size = 1
+item []:
+    item [1]:
+        class = "IntervalTier"
+        name = "phones"
+        xmin = 0
+        xmax = 1.5
+        intervals: size = 3
+        intervals [1]:
+            xmin = 0
+            xmax = 0.5
+            text = "a"
+        intervals [2]:
+            xmin = 0.5
+            xmax = 1.0
+            text = "sil"
+        intervals [3]:
+            xmin = 1.0
+            xmax = 1.5
+            text = "a"
+"""
+
+POSES = {
+    "neutral": {"brow": {"ty": 0.5}},
+    "AA": {"jaw": {"rx": 10.0}},
+    "rest": {"jaw": {"rx": 0.0}},
+}
+
+
+def write_clip(folder):
+    with wave.open(os.path.join(folder, "clip.wav"), "wb") as sound:
+        sound.setnchannels(1)
+        sound.setsampwidth(2)
+        sound.setframerate(16000)
+        sound.writeframes(b"\0\0" * 24000)
+    with open(os.path.join(folder, "clip.txt"), "w") as file:
+        file.write("a a\n")
+    with open(os.path.join(folder, "clip.TextGrid"), "w") as file:
+        file.write(TEXTGRID)
+    with open(os.path.join(folder, "rig.ma"), "w") as file:
+        file.write("//Maya ASCII scene\n")
+    os.makedirs(os.path.join(folder, "poses"))
+    mapping = {}
+    for name, pose in POSES.items():
+        mapping[name] = "poses/{}.json".format(name)
+        with open(os.path.join(folder, mapping[name]), "w") as file:
+            json.dump(pose, file)
+    with open(os.path.join(folder, "mapping.json"), "w") as file:
+        json.dump(mapping, file)
+
+
+def test_batch_with_stand_in_cmds(tmp_path):
+    folder = str(tmp_path)
+    write_clip(folder)
+    manifest = os.path.join(folder, "manifest.csv")
+    with open(manifest, "w") as file:
+        file.write("name,wav,transcript,language,scene,poses,output,textgrid,emotion\n")
+        file.write("ok,clip.wav,clip.txt,Japanese,rig.ma,mapping.json,out/ok.ma,"
+                   "clip.TextGrid,neutral\n")
+        file.write("broken,clip.wav,clip.txt,Japanese,rig.ma,missing.json,out/broken.ma,"
+                   "clip.TextGrid,neutral\n")
+    log_dir = os.path.join(folder, "logs")
+
+    exit_code = batch.main([manifest, "--cmds", "fake_cmds", "--retries", "0",
+                            "--log-dir", log_dir, "--script-dir", folder])
+
+    assert exit_code == 1
+    with open(os.path.join(log_dir, "summary.json")) as file:
+        summary = json.load(file)
+    assert (summary["jobs"], summary["succeeded"], summary["failed"]) == (2, 1, 1)
+    ok, broken = summary["results"]
+    assert ok["name"] == "ok" and ok["ok"]
+    assert broken["name"] == "broken" and not broken["ok"]
+    assert "missing.json" in broken["error"]
+
+    # snapped to 24 fps: jaw.rx on frames 0, 12, 24 and 36, the neutral
+    # emotion on brow.ty over frames 0 and 1
+    with open(os.path.join(folder, "out", "ok.ma")) as file:
+        scene = json.load(file)
+    assert scene["scene"] == os.path.join(folder, "rig.ma")
+    assert sorted(scene["keys"]) == ["brow.ty", "jaw.rx"]
+    assert [time for time, value in scene["keys"]["jaw.rx"]] == [0.0, 12.0, 24.0, 36.0]
+    assert scene["keys"]["brow.ty"] == [[0.0, 0.5], [1.0, 0.5]]
+    assert ok["keys"] == summary["keys"] == 6
+    assert not os.path.exists(os.path.join(folder, "out", "broken.ma"))
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_lip_sync import intensity
+
+
+def test_rms_envelope_lengths_on_frame_boundaries():
+    # 22050 / 24 = 918.75 samples per frame, frame 1 starts on sample 919
+    for n_samples, n_frames in ((919, 1), (1838, 2), (0, 0), (918, 1), (920, 2)):
+        envelope = intensity.rms_envelope(np.ones(n_samples, "f4"), 22050, 24.0)
+        assert len(envelope) == n_frames, n_samples
+        assert np.allclose(envelope, 1.0)
+
+
+def test_rms_envelope_values():
+    samples = np.concatenate([np.zeros(1000), np.full(1000, 0.5)]).astype("f4")
+    envelope = intensity.rms_envelope(samples, 1000, 2.0)
+    assert np.allclose(envelope, [0.0, 0.0, 0.5, 0.5])
+
+
+def test_rms_envelope_frames_shorter_than_a_sample():
+    # 10 Hz audio keyed at 24 fps leaves frames without a sample of their own
+    envelope = intensity.rms_envelope(np.ones(3, "f4"), 10, 24.0)
+    assert len(envelope) == 7
+    assert set(envelope.tolist()) == {0.0, 1.0}
+    assert envelope.sum() == 3.0
+
+
+def test_segment_intensity_means_the_weights_of_a_segment():
+    weights = np.array([0.2, 0.4, 0.6, 0.8], "f4")
+    segments = [(0.0, 0.5, "a"), (0.5, 1.0, "b"), (0.9, 0.95, "c")]
+    assert np.allclose(intensity.segment_intensity(segments, weights, 4.0),
+                       [0.3, 0.7, 0.8])
@@ -0,0 +1,131 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auto_lip_sync.keyframe_planner import (AttributeCurve, KeyframePlan, plan_keyframes,
+                                           quantize_segments, simplify_curve, simplify_plan)
+
+POSES = {
+    "A": {"jaw": {"ty": 1.0, "tx": 0.4}},
+    "B": {"jaw": {"ty": 2.0}},
+    "E": {"jaw": {"ty": 9.0}, "brow": {"ty": 5.0}},
+    "rest": {"jaw": {"ty": 0.0}},
+}
+
+
+def keys(plan, plug):
+    curve = plan[plug]
+    return list(zip(curve.times.tolist(), curve.values.tolist()))
+
+
+def test_last_key_wins_on_equal_times():
+    plan = plan_keyframes([(0., 1., "A"), (1., 2., "B")], POSES)
+    # A's end key and B's start key share t=1, B is written last
+    assert keys(plan, "jaw.ty") == [(0., 1.), (1., 2.), (2., 2.)]
+    # B keys the whole jaw control, holding the value A set
+    assert keys(plan, "jaw.tx") == [(0., 0.4), (1., 0.4), (2., 0.4)]
+
+    plan = plan_keyframes([(0., 1., "A"), (0., 1., "B")], POSES)
+    assert keys(plan, "jaw.ty") == [(0., 2.), (1., 2.)]
+
+
+def test_segments_apply_in_start_order():
+    plan = plan_keyframes([(1., 2., "B"), (0., 1., "A")], POSES)
+    assert keys(plan, "jaw.ty") == [(0., 1.), (1., 2.), (2., 2.)]
+
+
+def test_unknown_plugs_wait_for_a_pose_or_initial_value():
+    segments = [(0., 1., "B"), (1., 2., "A"), (2., 3., None), (3., 4., "missing")]
+    plan = plan_keyframes(segments, POSES)
+    assert keys(plan, "jaw.tx") == [(1., 0.4), (2., 0.4)]
+
+    plan = plan_keyframes(segments, POSES, initial_values={"jaw.tx": 0.5})
+    assert keys(plan, "jaw.tx") == [(0., 0.5), (1., 0.4), (2., 0.4)]
+
+
+def test_background_segments_skip_plugs_set_above():
+    segments = [(0., 3., "E"), (0., 1., "A"), (1., 2., "B")]
+    plan = plan_keyframes(segments, POSES)
+    assert keys(plan, "jaw.ty")[-1] == (3., 9.)
+
+    plan = plan_keyframes(segments, POSES, background=[True, False, False])
+    assert keys(plan, "jaw.ty") == [(0., 1.), (1., 2.), (2., 2.)]
+    # E keys the jaw control, but A sets jaw.tx
+    assert keys(plan, "jaw.tx") == [(0., 0.4), (1., 0.4), (2., 0.4)]
+    # nothing above sets the brow
+    assert keys(plan, "brow.ty") == [(0., 5.), (3., 5.)]
+
+
+def test_weights_scale_from_the_rest_pose():
+    plan = plan_keyframes([(0., 1., "A")], POSES, weights=[0.5], rest="rest")
+    assert np.allclose(plan["jaw.ty"].values, 0.5)
+    # the rest pose doesn't store jaw.tx
+    assert np.allclose(plan["jaw.tx"].values, 0.4)
+
+    plan = plan_keyframes([(0., 1., "A")], POSES, weights=[0.5], rest="missing")
+    assert np.allclose(plan["jaw.ty"].values, 1.0)
+
+
+def test_empty_plan():
+    assert len(plan_keyframes([], POSES)) == 0
+    assert len(plan_keyframes([(0., 1., None)], POSES)) == 0
+
+
+def test_quantize_rounds_half_frames_up():
+    # 0.125 s and 0.375 s are frames 0.5 and 1.5 at 4 fps
+    segments = [(0., 0.125, "A"), (0.125, 0.375, "B"), (0.375, 1., "A")]
+    assert quantize_segments(segments, 4) == [(0, 1, "A"), (1, 2, "B"), (2, 4, "A")]
+
+
+def test_quantize_keeps_the_longest_segment_starting_on_a_frame():
+    segments = [(0., 0.02, "A"), (0.02, 0.06, "B"), (0.06, 0.2, "C")]
+    assert quantize_segments(segments, 10) == [(0, 1, "B"), (1, 2, "C")]
+
+
+def test_quantize_keeps_the_earliest_on_ties_and_applies_min_frames():
+    segments = [(0., 0.0625, "A"), (0.0625, 0.125, "B"), (0.125, 1., "C")]
+    assert quantize_segments(segments, 4) == [(0, 0, "A"), (1, 4, "C")]
+    assert quantize_segments(segments, 4, min_frames=1) == [(0, 1, "A"), (1, 4, "C")]
+
+
+def test_quantize_merges_neighbours_with_the_same_pose():
+    segments = [(0., 0.5, "A"), (0.5, 0.52, "B"), (0.52, 1., "A")]
+    assert quantize_segments(segments, 8) == [(0, 8, "A")]
+    assert quantize_segments([], 8) == []
+
+
+def simplified(values, tolerance=0.0):
+    return simplify_curve(np.arange(len(values), dtype=np.float64),
+                          np.array(values, dtype=np.float64), tolerance).tolist()
+
+
+def test_simplify_keeps_holds_of_four_keys():
+    assert simplified([1., 1., 1., 1.]) == [0, 1, 2, 3]
+
+
+def test_simplify_drops_the_middle_of_a_hold_of_five_keys():
+    assert simplified([1., 1., 1., 1., 1.]) == [0, 1, 3, 4]
+
+
+def test_simplify_keeps_two_keys_at_each_end_of_a_hold():
+    values = [0., 1., 1., 1., 1., 1., 1., 1., 2.]
+    assert simplified(values) == [0, 1, 2, 6, 7, 8]
+    assert simplified([0., 1., 2., 3., 4., 5.]) == [0, 1, 2, 3, 4, 5]
+
+
+def test_simplify_tolerance():
+    values = [1., 1.01, 0.99, 1., 1.005]
+    assert simplified(values) == [0, 1, 2, 3, 4]
+    assert simplified(values, tolerance=0.02) == [0, 1, 3, 4]
+
+
+def test_simplify_plan_keeps_curve_settings():
+    curve = AttributeCurve("jaw.ty", np.arange(6.), np.ones(6), "linear", "step")
+    plan = simplify_plan(KeyframePlan([curve], "frame"))
+    assert plan.time_unit == "frame"
+    simple = plan["jaw.ty"]
+    assert simple.times.tolist() == [0., 1., 4., 5.]
+    assert (simple.in_tangent, simple.out_tangent) == ("linear", "step")
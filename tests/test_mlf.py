@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textgrid import TextGrid, MLF, MLFIndex
+
+MLF_TEXT = """#!MLF!#
+"*/utt1.lab"
+0 1000000 k kon
+1000000 2000000 o
+2000000 3000000 sp
+3000000 4000000 n ni
+4000000 5000000 i
+.
+"*/utt2.lab"
+0 5000000 a a
+.
+"*/utt3.lab"
+0 2000000 sil
+2000000 4000000 e e
+.
+"""
+
+
+@pytest.fixture
+def mlf_path(tmp_path):
+    path = str(tmp_path / 'labels.mlf')
+    with open(path, 'w') as file:
+        file.write(MLF_TEXT)
+    return path
+
+
+def contents(grid, gaps=True):
+    """
+    (name, rows) of every tier; without gaps, the empty intervals that
+    writing fills the gaps with are left out.
+    """
+    return [(tier.name, [(i.minTime, i.maxTime, i.mark) for i in tier if gaps or i.mark])
+            for tier in grid]
+
+
+def test_index(mlf_path):
+    index = MLFIndex(mlf_path)
+    assert len(index) == 3
+    assert list(index) == ['*/utt1.lab', '*/utt2.lab', '*/utt3.lab']
+    assert '*/utt2.lab' in index and '*/utt4.lab' not in index
+    with pytest.raises(KeyError):
+        index.load('*/utt4.lab')
+
+
+def test_load_matches_mlf(mlf_path):
+    index = MLFIndex(mlf_path)
+    grids = list(MLF(mlf_path))
+    for grid in grids:
+        assert contents(index.load(grid.name)) == contents(grid)
+    assert contents(index.load('*/utt1.lab')) == [
+        ('phones', [(0.0, 0.1, 'k'), (0.1, 0.2, 'o'), (0.3, 0.4, 'n'), (0.4, 0.5, 'i')]),
+        ('words', [(0.0, 0.2, 'kon'), (0.2, 0.3, 'sp'), (0.3, 0.5, 'ni')]),
+    ]
+    # loaded in file order, whatever order they are asked for
+    names = [grid.name for grid in index.iterGrids(['*/utt3.lab', '*/utt1.lab'])]
+    assert names == ['*/utt1.lab', '*/utt3.lab']
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_convert(tmp_path, mlf_path, processes):
+    prefix = str(tmp_path / 'out{0}'.format(processes))
+    os.makedirs(prefix)
+    index = MLFIndex(mlf_path)
+    assert index.convert(prefix, processes=processes, chunk_size=1) == 3
+    assert sorted(os.listdir(prefix)) == ['utt1.TextGrid', 'utt2.TextGrid', 'utt3.TextGrid']
+    for grid in MLF(mlf_path):
+        name = os.path.splitext(os.path.basename(grid.name))[0]
+        written = TextGrid.fromFile(os.path.join(prefix, name + '.TextGrid'))
+        assert contents(written, gaps=False) == contents(grid)
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / 'empty.mlf')
+    open(path, 'w').close()
+    assert len(MLFIndex(path)) == 0
@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textgrid import TextGrid, IntervalTier, PointTier
+from textgrid.exceptions import TextGridError
+
+FORMATS = ('long', 'short', 'binary')
+
+
+def make_grid():
+    grid = TextGrid(maxTime=1.5)
+    words = IntervalTier('words', 0., 1.5)
+    words.add(0., 0.75, 'kon')
+    words.add(0.75, 1.5, 'ni "chi" wa')
+    phones = IntervalTier('phones', 0., 1.5)
+    for i, mark in enumerate(['k', 'o', 'N', 'n', 'i', '']):
+        phones.add(i * 0.25, (i + 1) * 0.25, mark)
+    events = PointTier('events', 0., 1.5)
+    events.add(0.5, 'peak')
+    events.add(1.25, 'ああ')
+    grid.extend([words, phones, events])
+    return grid
+
+
+def contents(grid):
+    rows = []
+    for tier in grid:
+        if isinstance(tier, IntervalTier):
+            rows.append((tier.name, [(i.minTime, i.maxTime, i.mark) for i in tier]))
+        else:
+            rows.append((tier.name, [(p.time, p.mark) for p in tier]))
+    return rows
+
+
+def write(tmp_path, grid, format):
+    path = str(tmp_path / '{0}.TextGrid'.format(format))
+    grid.write(path, format=format)
+    return path
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_round_trip(tmp_path, format):
+    grid = make_grid()
+    path = write(tmp_path, grid, format)
+    read = TextGrid.fromFile(path)
+    assert (read.minTime, read.maxTime) == (0., 1.5)
+    # the gaps of the tiers are written as empty intervals
+    expected = contents(grid)
+    assert contents(read) == expected
+    assert contents(TextGrid.fromFile(path, columnar=True)) == expected
+    assert contents(list(TextGrid().iterTiers(path))) == expected
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_tier_selection(tmp_path, format):
+    path = write(tmp_path, make_grid(), format)
+    assert TextGrid.fromFile(path, tiers='phones').getNames() == ['phones']
+    assert TextGrid.fromFile(path, tiers=2).getNames() == ['events']
+    assert TextGrid.fromFile(path, tiers=['events', 0]).getNames() == ['words', 'events']
+    assert TextGrid.fromFile(path, tiers='missing').getNames() == []
+    selected = TextGrid.fromFile(path, tiers='phones')
+    assert contents(selected) == contents(make_grid())[1:2]
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_truncated_file_raises(tmp_path, format):
+    path = write(tmp_path, make_grid(), format)
+    with open(path, 'rb') as file:
+        data = file.read()
+    # cut inside the phones tier, which is also read when it is skipped
+    for tiers in (None, 'words', 'phones', 'events'):
+        with open(path, 'wb') as file:
+            file.write(data[:len(data) * 2 // 3])
+        with pytest.raises(TextGridError):
+            TextGrid.fromFile(path, tiers=tiers)
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'not a TextGrid at all\n',
+    b'File type = "ooTextFile"\nObject class = "Sound"\n\nxmin = 0\nxmax = 1\n',
+    b'File type = "ooTextFile"\nObject class = "TextGrid"\n\nxmin = 0\nxmax = abc\n',
+    b'File type = "ooTextFile"\nObject class = "TextGrid"\n\nxmin = 0\nxmax = 1\n'
+    b'tiers? <exists>\nsize = 1\nitem []:\n    item [1]:\n        class = IntervalTier\n',
+    b'ooBinaryFile\x08TextGrid\x00\x01',
+    b'ooBinaryFile\x05Sound',
+])
+def test_garbage_raises(tmp_path, data):
+    path = str(tmp_path / 'garbage.TextGrid')
+    with open(path, 'wb') as file:
+        file.write(data)
+    with pytest.raises(TextGridError):
+        TextGrid.fromFile(path)
+
+
+@pytest.mark.parametrize('format', ('long', 'short'))
+def test_bad_value_raises(tmp_path, format):
+    path = write(tmp_path, make_grid(), format)
+    with open(path) as file:
+        text = file.read()
+    with open(path, 'w') as file:
+        file.write(text.replace('0.75', '"x"', 1))
+    with pytest.raises(TextGridError):
+        TextGrid.fromFile(path)
@@ -0,0 +1,120 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textgrid import (IntervalTier, PointTier, ColumnarIntervalTier,
+                      ColumnarPointTier, Interval, Point)
+
+ROWS = [(0., 0.2, 'k'), (0.2, 0.5, 'o'), (0.5, 0.6, ''), (0.6, 1.0, 'k')]
+
+
+def interval_tier():
+    tier = IntervalTier('phones', 0., 1.0)
+    for row in ROWS:
+        tier.add(*row)
+    return tier
+
+
+def point_tier():
+    tier = PointTier('events', 0., 1.0)
+    for time, mark in [(0.1, 'a'), (0.4, 'b'), (0.9, 'a')]:
+        tier.add(time, mark)
+    return tier
+
+
+def rows(tier):
+    return [(i.minTime, i.maxTime, i.mark) for i in tier]
+
+
+def test_columnar_interval_tier_matches_object_tier():
+    tier = interval_tier()
+    columnar = ColumnarIntervalTier.fromTier(tier)
+    assert (columnar.name, columnar.minTime, columnar.maxTime) == ('phones', 0., 1.0)
+    assert len(columnar) == len(tier)
+    assert rows(columnar) == rows(tier)
+    assert rows(columnar[1:3]) == rows(tier[1:3])
+    assert columnar[-1] == tier[-1]
+    for time in (0., 0.1, 0.2, 0.55, 1.0, 1.5):
+        assert columnar.indexContaining(time) == tier.indexContaining(time)
+        assert columnar.intervalContaining(time) == tier.intervalContaining(time)
+    assert columnar.indexContaining(Point(0.3, 'x')) == 1
+    assert list(columnar.indicesBetween(0.3, 0.65)) == [1, 2, 3]
+
+
+def test_columnar_interval_tier_edits_match_object_tier():
+    tier, columnar = interval_tier(), ColumnarIntervalTier.fromTier(interval_tier())
+    for target in (tier, columnar):
+        target.removeInterval(Interval(0.2, 0.5, 'o'))
+        target.add(0.2, 0.3, 'u')
+        target.add(0.3, 0.5, 'N')
+    assert rows(columnar) == rows(tier)
+    with pytest.raises(ValueError):
+        columnar.add(0.25, 0.4, 'x')
+    with pytest.raises(ValueError):
+        columnar.add(0.9, 1.2, 'x')
+    with pytest.raises(ValueError):
+        columnar.removeInterval(Interval(0.2, 0.5, 'o'))
+    # views are snapshots
+    columnar[0].mark = 'changed'
+    assert columnar[0].mark == 'k'
+
+
+def test_columnar_point_tier_matches_object_tier():
+    tier = point_tier()
+    columnar = ColumnarPointTier.fromTier(tier)
+    assert list(columnar) == list(tier)
+    assert [p.mark for p in columnar] == [p.mark for p in tier]
+    assert columnar.indexAt(0.4) == 1
+    assert columnar.indexAt(0.5) is None
+    for target in (tier, columnar):
+        target.add(0.5, 'c')
+        target.removePoint(Point(0.1, 'a'))
+    assert [(p.time, p.mark) for p in columnar] == [(p.time, p.mark) for p in tier]
+    with pytest.raises(ValueError):
+        columnar.add(0.4, 'again')
+    with pytest.raises(ValueError):
+        columnar.add(1.5, 'late')
+
+
+@pytest.mark.parametrize('cls', [IntervalTier, ColumnarIntervalTier])
+def test_from_sorted_builds_the_same_tier_as_add(cls):
+    tier = cls.fromSorted(ROWS, 'phones', 0., 1.0)
+    assert rows(tier) == ROWS
+    assert tier.indexContaining(0.55) == 2
+
+
+@pytest.mark.parametrize('cls', [IntervalTier, ColumnarIntervalTier])
+@pytest.mark.parametrize('bad', [
+    [(0.2, 0.5, 'o'), (0., 0.2, 'k')],     # unsorted
+    [(0., 0.3, 'k'), (0.2, 0.5, 'o')],     # overlapping
+    [(0., 0.5, 'k'), (0., 0.5, 'k')],      # duplicate
+    [(0., 0.2, 'k'), (0.3, 0.3, 'o')],     # empty
+    [(-0.1, 0.2, 'k')],                    # before minTime
+    [(0., 0.2, 'k'), (0.2, 1.5, 'o')],     # after maxTime
+])
+def test_from_sorted_rejects_bad_rows(cls, bad):
+    with pytest.raises(ValueError):
+        cls.fromSorted(bad, 'phones', 0., 1.0)
+
+
+@pytest.mark.parametrize('cls', [IntervalTier, ColumnarIntervalTier])
+def test_from_sorted_logs_overlaps_unless_strict(cls):
+    tier = cls.fromSorted([(0., 0.3, 'k'), (0.2, 0.5, 'o')], 'phones', 0., 1.0,
+                          strict=False)
+    assert len(tier) == 2
+
+
+@pytest.mark.parametrize('cls', [IntervalTier, ColumnarIntervalTier])
+def test_extend_sorted_checks_against_the_last_interval(cls):
+    tier = cls.fromSorted(ROWS[:2], 'phones', 0., 1.0)
+    with pytest.raises(ValueError):
+        tier.extendSorted([(0.1, 0.3, 'x')])
+    with pytest.raises(ValueError):
+        tier.extendSorted([(0.5, 0.6, ''), (0.4, 1.0, 'k')])
+    # a rejected batch leaves the tier as it was
+    assert rows(tier) == ROWS[:2]
+    tier.extendSorted(ROWS[2:])
+    assert rows(tier) == ROWS
@@ -1 +1,2 @@
-from .textgrid import TextGrid, MLF, IntervalTier, PointTier, Interval, Point
+from .textgrid import TextGrid, MLF, MLFIndex, IntervalTier, PointTier, Interval, Point
+from .textgrid import ColumnarIntervalTier, ColumnarPointTier
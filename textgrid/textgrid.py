@@ -30,47 +30,39 @@
 from __future__ import print_function
 
 import re
+import mmap
 import codecs
+import struct
 import os.path
 import logging
+import multiprocessing
 
 from sys import stderr
-from bisect import bisect_left
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+try:
+    from sys import intern
+except ImportError:  # Python 2
+    pass
 
 from .exceptions import TextGridError
 
 DEFAULT_TEXTGRID_PRECISION = 5
 DEFAULT_MLF_PRECISION = 5
 
+# the quoted label file name that starts each utterance of a MLF
+_MLF_NAME = re.compile(br'^"(.*)"[ \t\r]*$', re.MULTILINE)
 
-def _getMark(text, short):
-    """
-    Return the mark or text entry on a line. Praat escapes double-quotes
-    by doubling them, so doubled double-quotes are read as single
-    double-quotes. Newlines within an entry are allowed.
-    """
-
-    line = text.readline()
-
-    # check that the line begins with a valid entry type
-    if not short and not re.match(r'^\s*(text|mark) = "', line):
-        raise ValueError('Bad entry: ' + line)
-
-    # read until the number of double-quotes is even
-    while line.count('"') % 2:
-        next_line = text.readline()
-
-        if not next_line:
-            raise EOFError('Bad entry: ' + line[:20] + '...')
-
-        line += next_line
-    if short:
-        pattern = r'^"(.*?)"\s*$'
-    else:
-        pattern = r'^\s*(text|mark) = "(.*?)"\s*$'
-    entry = re.match(pattern, line, re.DOTALL)
-
-    return entry.groups()[-1].replace('""', '"')
+# One pass over a Praat text file yields its values in order: quoted strings
+# (kept with their quotes), <exists>/<absent> flags and numbers. In the long
+# format every value follows a "label = ", in the short format values stand
+# alone and anything else (runs of other text, [index] brackets) is skipped.
+_LONG_FORMAT = re.compile(r'^\s*xmin\s*=', re.MULTILINE)
+_LONG_VALUE = re.compile(r'= *("[^"]*(?:""[^"]*)*"|[^\s"]+)')
+_SHORT_TOKEN = re.compile(r'[^"<\[\d.+-]+|("[^"]*(?:""[^"]*)*")|\[[^\]\n]*\]|'
+                          r'<(exists|absent)>|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
 
 
 def _formatMark(text):
@@ -101,6 +93,153 @@ def detectEncoding(f):
     return encoding
 
 
+def _decodeBuffer(data, encoding=None):
+    """
+    Decode the raw bytes of a Praat text file, sniffing the encoding from
+    the byte order mark (or the NUL bytes of BOM-less UTF-16) if not given.
+    """
+    if encoding is not None:
+        return data.decode(encoding)
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        return data.decode('utf-16')
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode('utf-8')
+    head = data[:64]
+    if head[1::2].count(b'\x00') > len(head) // 4:
+        return data.decode('utf-16-le')
+    if head[0::2].count(b'\x00') > len(head) // 4:
+        return data.decode('utf-16-be')
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _readData(f):
+    """
+    Return the raw contents of f, a path or a file object.
+    """
+    if hasattr(f, 'read'):
+        return f.read()
+    with open(f, 'rb') as source:
+        return source.read()
+
+
+def _readText(f, encoding=None):
+    """
+    Return the decoded contents of f, a path or a file object.
+    """
+    data = _readData(f)
+    if isinstance(data, bytes):
+        data = _decodeBuffer(data, encoding)
+    return data
+
+
+# Praat's binary format: the "ooBinaryFile" magic, the object class as a
+# string with a one byte length, then big-endian doubles, int32 counts and
+# strings with a two byte length. Strings that aren't plain ASCII are
+# stored as UTF-16BE, flagged by a length of 0xFF/0xFFFF followed by the
+# real length in code units.
+BINARY_HEADER = b'ooBinaryFile'
+_BINARY_U8 = struct.Struct('>B')
+_BINARY_U16 = struct.Struct('>H')
+_BINARY_INT = struct.Struct('>i')
+_BINARY_TIME = struct.Struct('>d')
+_BINARY_RANGE = struct.Struct('>2d')
+_BINARY_TIER = struct.Struct('>2di')
+
+
+def _unpackString(data, pos, length_struct=_BINARY_U16):
+    """
+    Return the string stored at pos in a binary Praat file and the
+    position after it.
+    """
+    length, = length_struct.unpack_from(data, pos)
+    pos += length_struct.size
+    if length == (1 << 8 * length_struct.size) - 1:
+        length, = length_struct.unpack_from(data, pos)
+        pos += length_struct.size
+        end = pos + 2 * length
+        return data[pos:end].decode('utf-16-be'), end
+    end = pos + length
+    return data[pos:end].decode('latin-1'), end
+
+
+def _packString(text, length_struct=_BINARY_U16):
+    """
+    Return text encoded as a binary Praat string.
+    """
+    try:
+        encoded = text.encode('ascii')
+    except UnicodeEncodeError:
+        encoded = text.encode('utf-16-be')
+        escape = (1 << 8 * length_struct.size) - 1
+        return length_struct.pack(escape) + length_struct.pack(len(encoded) // 2) + encoded
+    return length_struct.pack(len(encoded)) + encoded
+
+
+def _tierFilter(tiers):
+    """
+    Return a predicate on (position, name) for the tiers argument of
+    TextGrid.read, and the last position it can select when it selects by
+    position only (otherwise None).
+    """
+    if tiers is None:
+        return (lambda i, name: True), None
+    if isinstance(tiers, (str, int)):
+        tiers = [tiers]
+    names = set(t for t in tiers if not isinstance(t, int))
+    positions = set(t for t in tiers if isinstance(t, int))
+    last = None if names else max(positions or [-1])
+    return (lambda i, name: i in positions or name in names), last
+
+
+def _tokenize(text):
+    """
+    Return the values of a Praat text file as a list of strings: quoted
+    strings keep their surrounding quotes, flags are 'exists'/'absent' and
+    numbers are left unconverted. The long format's "tiers? <exists>" flag
+    is not returned.
+    """
+    if _LONG_FORMAT.search(text, 0, 1024):
+        return _LONG_VALUE.findall(text)
+    return [string or flag or number
+            for string, flag, number in _SHORT_TOKEN.findall(text)
+            if string or flag or number]
+
+
+def _iterTokens(text):
+    """
+    Lazy version of _tokenize, for reading part of a file without holding
+    all of its values in memory at once.
+    """
+    if _LONG_FORMAT.search(text, 0, 1024):
+        return (m.group(1) for m in _LONG_VALUE.finditer(text))
+    return (m.group(m.lastindex) for m in _SHORT_TOKEN.finditer(text)
+            if m.lastindex)
+
+
+def _unquote(token):
+    if token[0] != '"':
+        raise TextGridError('Expected a string, found: ' + token)
+    token = token[1:-1]
+    return token.replace('""', '"') if '""' in token else token
+
+
+def _number(token):
+    try:
+        return float(token)
+    except ValueError:
+        raise TextGridError('Expected a number, found: ' + token)
+
+
+def _checkHeader(tokens, object_class):
+    if len(tokens) < 2 or not _unquote(tokens[0]).startswith('ooTextFile'):
+        raise TextGridError('The file could not be parsed as a Praat text file as it is lacking a proper header.')
+    if _unquote(tokens[1]) != object_class:
+        raise TextGridError('The file could not be parsed as a {0} as it is lacking a proper header.'.format(object_class))
+
+
 class Point(object):
     """
     Represents a point in time with an associated textual mark, as stored
@@ -108,6 +247,8 @@ class Point(object):
 
     """
 
+    __slots__ = ('time', 'mark')
+
     def __init__(self, time, mark):
         self.time = time
         self.mark = mark
@@ -183,6 +324,8 @@ class Interval(object):
 
     """
 
+    __slots__ = ('minTime', 'maxTime', 'mark', 'strict')
+
     def __init__(self, minTime, maxTime, mark):
         if minTime >= maxTime:
             # Praat does not support intervals with duration <= 0
@@ -300,6 +443,40 @@ class Interval(object):
         return (self.minTime, self.maxTime)
 
 
+def _checkSorted(rows, minTime, maxTime, last, strict):
+    """
+    Validates (minTime, maxTime, mark) rows to be appended to a tier in one
+    pass: every row must have a positive duration, start no earlier than
+    the previous one and lie within the tier's bounds. Overlaps raise a
+    ValueError if strict, and are logged otherwise. last is the (minTime,
+    maxTime) of the tier's current last interval, or None.
+    """
+    if not rows:
+        return
+    if rows[0][0] < minTime:  # too early
+        raise ValueError(minTime)
+    prevMin, prevMax = last if last else (minTime, minTime)
+    latest = prevMax
+    for rowMin, rowMax, mark in rows:
+        if rowMin >= rowMax:
+            # Praat does not support intervals with duration <= 0
+            raise ValueError(rowMin, rowMax)
+        if rowMin < prevMin:
+            raise ValueError('Intervals are not sorted', rowMin, prevMin)
+        if rowMin < latest:
+            if rowMin == prevMin and rowMax == prevMax:
+                raise ValueError(Interval(rowMin, rowMax, mark))
+            if strict:
+                raise ValueError(Interval(rowMin, rowMax, mark))
+            logging.warning("Overlap for interval %s: (%f, %f)",
+                            mark, rowMin, rowMax)
+        prevMin, prevMax = rowMin, rowMax
+        if rowMax > latest:
+            latest = rowMax
+    if maxTime and latest > maxTime:  # too late
+        raise ValueError(maxTime)
+
+
 class PointTier(object):
     """
     Represents Praat PointTiers (also called TextTiers) as list of Points
@@ -365,20 +542,14 @@ class PointTier(object):
         Read the Points contained in the Praat-formated PointTier/TextTier
         file indicated by string f
         """
-        encoding = detectEncoding(f)
-        with codecs.open(f, 'r', encoding=encoding) as source:
-            file_type, short = parse_header(source)
-            if file_type != 'TextTier':
-                raise TextGridError('The file could not be parsed as a PointTier as it is lacking a proper header.')
-
-            self.minTime = parse_line(source.readline(), short, round_digits)
-            self.maxTime = parse_line(source.readline(), short, round_digits)
-            n = int(parse_line(source.readline(), short, round_digits))
-            for i in range(n):
-                source.readline().rstrip()  # header
-                itim = parse_line(source.readline(), short, round_digits)
-                imrk = _getMark(source, short)
-                self.points.append(Point(itim, imrk))
+        tokens = _tokenize(_readText(f))
+        _checkHeader(tokens, 'TextTier')
+        self.minTime = round(float(tokens[2]), round_digits)
+        self.maxTime = round(float(tokens[3]), round_digits)
+        n = int(float(tokens[4]))
+        for pos in range(5, 5 + 2 * n, 2):
+            self.points.append(Point(round(float(tokens[pos]), round_digits),
+                                     _unquote(tokens[pos + 1])))
 
     def write(self, f):
         """
@@ -392,9 +563,9 @@ class PointTier(object):
 
         print('xmin = {0}'.format(self.minTime), file=sink)
         print('xmax = {0}'.format(self.maxTime if self.maxTime \
-                                      else self.points[-1].time), file=sink)
+                                      else self[-1].time), file=sink)
         print('points: size = {0}'.format(len(self)), file=sink)
-        for (i, point) in enumerate(self.points, 1):
+        for (i, point) in enumerate(self, 1):
             print('points [{0}]:'.format(i), file=sink)
             print('\ttime = {0}'.format(point.time), file=sink)
             mark = _formatMark(point.mark)
@@ -402,7 +573,7 @@ class PointTier(object):
         sink.close()
 
     def bounds(self):
-        return (self.minTime, self.maxTime or self.points[-1].time)
+        return (self.minTime, self.maxTime or self[-1].time)
 
     # alternative constructor
 
@@ -467,6 +638,35 @@ class IntervalTier(object):
         interval.strict = self.strict
         self.intervals.insert(i, interval)
 
+    def extendSorted(self, intervals):
+        """
+        Appends (minTime, maxTime, mark) triples that are already in time
+        order after the last interval of the tier. The whole batch is
+        checked in a single linear pass (raising ValueError as add does)
+        before the tier is changed, then added in one go.
+        """
+        rows = list(intervals)
+        last = self[-1].bounds() if len(self) else None
+        _checkSorted(rows, self.minTime, self.maxTime, last, self.strict)
+        strict = self.strict
+        new = []
+        for minTime, maxTime, mark in rows:
+            interval = Interval(minTime, maxTime, mark)
+            interval.strict = strict
+            new.append(interval)
+        self.intervals.extend(new)
+
+    @classmethod
+    def fromSorted(cls, intervals, name=None, minTime=0., maxTime=None, strict=True):
+        """
+        Builds a tier from (minTime, maxTime, mark) triples in time order,
+        see extendSorted.
+        """
+        tier = cls(name, minTime, maxTime)
+        tier.strict = strict
+        tier.extendSorted(intervals)
+        return tier
+
     def remove(self, minTime, maxTime, mark):
         self.removeInterval(Interval(minTime, maxTime, mark))
 
@@ -493,28 +693,22 @@ class IntervalTier(object):
         """
         i = self.indexContaining(time)
         if i is not None:
-            return self.intervals[i]
+            return self[i]
 
     def read(self, f, round_digits=DEFAULT_TEXTGRID_PRECISION):
         """
         Read the Intervals contained in the Praat-formated IntervalTier
         file indicated by string f
         """
-        encoding = detectEncoding(f)
-        with codecs.open(f, 'r', encoding=encoding) as source:
-            file_type, short = parse_header(source)
-            if file_type != 'IntervalTier':
-                raise TextGridError('The file could not be parsed as a IntervalTier as it is lacking a proper header.')
-
-            self.minTime = parse_line(source.readline(), short, round_digits)
-            self.maxTime = parse_line(source.readline(), short, round_digits)
-            n = int(parse_line(source.readline(), short, round_digits))
-            for i in range(n):
-                source.readline().rstrip()  # header
-                imin = parse_line(source.readline(), short, round_digits)
-                imax = parse_line(source.readline(), short, round_digits)
-                imrk = _getMark(source, short)
-                self.intervals.append(Interval(imin, imax, imrk))
+        tokens = _tokenize(_readText(f))
+        _checkHeader(tokens, 'IntervalTier')
+        self.minTime = round(float(tokens[2]), round_digits)
+        self.maxTime = round(float(tokens[3]), round_digits)
+        n = int(float(tokens[4]))
+        self.extendSorted([(round(float(tokens[pos]), round_digits),
+                            round(float(tokens[pos + 1]), round_digits),
+                            _unquote(tokens[pos + 2]))
+                           for pos in range(5, 5 + 3 * n, 3)])
 
     def _fillInTheGaps(self, null):
         """
@@ -522,7 +716,7 @@ class IntervalTier(object):
         """
         prev_t = self.minTime
         output = []
-        for interval in self.intervals:
+        for interval in self:
             if prev_t < interval.minTime:
                 output.append(Interval(prev_t, interval.minTime, null))
             output.append(interval)
@@ -543,7 +737,7 @@ class IntervalTier(object):
         print('Object class = "IntervalTier"\n', file=sink)
         print('xmin = {0}'.format(self.minTime), file=sink)
         print('xmax = {0}'.format(self.maxTime if self.maxTime \
-                                      else self.intervals[-1].maxTime), file=sink)
+                                      else self[-1].maxTime), file=sink)
         # compute the number of intervals and make the empty ones
         output = self._fillInTheGaps(null)
         # write it all out
@@ -557,7 +751,7 @@ class IntervalTier(object):
         sink.close()
 
     def bounds(self):
-        return (self.minTime, self.maxTime or self.intervals[-1].maxTime)
+        return (self.minTime, self.maxTime or self[-1].maxTime)
 
     # alternative constructor
 
@@ -569,29 +763,259 @@ class IntervalTier(object):
         return it
 
 
-def parse_line(line, short, to_round):
-    line = line.strip()
-    if short:
-        if '"' in line:
-            return line[1:-1]
-        return round(float(line), to_round)
-    if '"' in line:
-        m = re.match(r'.+? = "(.*)"', line)
-        return m.groups()[0]
-    m = re.match(r'.+? = (.*)', line)
-    return round(float(m.groups()[0]), to_round)
+class _MarkTable(object):
+    """
+    Interns the marks of a columnar tier: every distinct mark is stored
+    once and the tier keeps a small integer code per interval or point.
+    """
 
+    def __init__(self):
+        self.marks = []
+        self.codes = {}
 
-def parse_header(source):
-    header = source.readline()  # header junk
-    m = re.match(r'File type = "([\w ]+)"', header)
-    if m is None or not m.groups()[0].startswith('ooTextFile'):
-        raise TextGridError('The file could not be parsed as a Praat text file as it is lacking a proper header.')
+    def code(self, mark):
+        try:
+            return self.codes[mark]
+        except KeyError:
+            if isinstance(mark, str):
+                mark = intern(mark)
+            code = self.codes[mark] = len(self.marks)
+            self.marks.append(mark)
+            return code
+
+
+class ColumnarPointTier(PointTier):
+    """
+    A PointTier that keeps its times in a contiguous array of doubles and
+    its marks as codes into a table of distinct marks. Point objects are
+    only created when the tier is indexed or iterated; they are snapshots,
+    so changing one does not change the tier.
+
+    """
+
+    def __init__(self, name=None, minTime=0., maxTime=None):
+        self.name = name
+        self.minTime = minTime
+        self.maxTime = maxTime
+        self.times = array('d')
+        self.codes = array('i')
+        self.markTable = _MarkTable()
+
+    def _point(self, i):
+        point = Point.__new__(Point)
+        point.time = self.times[i]
+        point.mark = self.markTable.marks[self.codes[i]]
+        return point
+
+    @property
+    def points(self):
+        return [self._point(i) for i in range(len(self.times))]
+
+    @points.setter
+    def points(self, points):
+        self.times = array('d')
+        self.codes = array('i')
+        self.markTable = _MarkTable()
+        for point in points:
+            self.addPoint(point)
+
+    def __iter__(self):
+        return (self._point(i) for i in range(len(self.times)))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._point(j) for j in range(len(self.times))[i]]
+        return self._point(range(len(self.times))[i])
+
+    def addPoint(self, point):
+        self.add(point.time, point.mark)
+
+    def add(self, time, mark):
+        """
+        adds a Point at the given time, maintaining order
+        """
+        if time < self.minTime:
+            raise ValueError(self.minTime)  # too early
+        if self.maxTime and time > self.maxTime:
+            raise ValueError(self.maxTime)  # too late
+        i = bisect_left(self.times, time)
+        if i < len(self.times) and self.times[i] == time:
+            raise ValueError(Point(time, mark))  # we already got one right there
+        self.times.insert(i, time)
+        self.codes.insert(i, self.markTable.code(mark))
+
+    def removePoint(self, point):
+        i = bisect_left(self.times, point.time)
+        if i == len(self.times) or self.times[i] != point.time:
+            raise ValueError(point)
+        del self.times[i]
+        del self.codes[i]
 
-    short = 'short' in m.groups()[0]
-    file_type = parse_line(source.readline(), short, '')  # header junk
-    t = source.readline()  # header junk
-    return (file_type, short)
+    def indexAt(self, time):
+        """
+        Returns the index of the point at exactly the given time, or None.
+        """
+        i = bisect_left(self.times, time)
+        if i < len(self.times) and self.times[i] == time:
+            return i
+
+    def read(self, f, round_digits=DEFAULT_TEXTGRID_PRECISION):
+        """
+        Read the Points contained in the Praat-formated PointTier/TextTier
+        file indicated by string f
+        """
+        tokens = _tokenize(_readText(f))
+        _checkHeader(tokens, 'TextTier')
+        self.minTime = round(float(tokens[2]), round_digits)
+        self.maxTime = round(float(tokens[3]), round_digits)
+        n = int(float(tokens[4]))
+        code = self.markTable.code
+        for pos in range(5, 5 + 2 * n, 2):
+            self.times.append(round(float(tokens[pos]), round_digits))
+            self.codes.append(code(_unquote(tokens[pos + 1])))
+
+    @classmethod
+    def fromTier(cls, tier):
+        """
+        Columnar copy of a PointTier.
+        """
+        columnar = cls(tier.name, tier.minTime, tier.maxTime)
+        code = columnar.markTable.code
+        for point in tier:
+            columnar.times.append(point.time)
+            columnar.codes.append(code(point.mark))
+        return columnar
+
+
+class ColumnarIntervalTier(IntervalTier):
+    """
+    An IntervalTier that keeps interval start and end times in contiguous
+    arrays of doubles and marks as codes into a table of distinct marks.
+    Lookups by time bisect the time arrays directly. Interval objects are
+    only created when the tier is indexed or iterated; they are snapshots,
+    so changing one does not change the tier. The arrays support the
+    buffer protocol, e.g. numpy.frombuffer(tier.starts).
+
+    """
+
+    def __init__(self, name=None, minTime=0., maxTime=None):
+        self.name = name
+        self.minTime = minTime
+        self.maxTime = maxTime
+        self.strict = True
+        self.starts = array('d')
+        self.ends = array('d')
+        self.codes = array('i')
+        self.markTable = _MarkTable()
+
+    def _interval(self, i):
+        interval = Interval.__new__(Interval)
+        interval.minTime = self.starts[i]
+        interval.maxTime = self.ends[i]
+        interval.mark = self.markTable.marks[self.codes[i]]
+        interval.strict = self.strict
+        return interval
+
+    @property
+    def intervals(self):
+        return [self._interval(i) for i in range(len(self.starts))]
+
+    @intervals.setter
+    def intervals(self, intervals):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.codes = array('i')
+        self.markTable = _MarkTable()
+        for interval in intervals:
+            self.addInterval(interval)
+
+    def __iter__(self):
+        return (self._interval(i) for i in range(len(self.starts)))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._interval(j) for j in range(len(self.starts))[i]]
+        return self._interval(range(len(self.starts))[i])
+
+    def addInterval(self, interval):
+        self.add(interval.minTime, interval.maxTime, interval.mark)
+
+    def add(self, minTime, maxTime, mark):
+        if minTime >= maxTime:
+            # Praat does not support intervals with duration <= 0
+            raise ValueError(minTime, maxTime)
+        if minTime < self.minTime:  # too early
+            raise ValueError(self.minTime)
+        if self.maxTime and maxTime > self.maxTime:  # too late
+            raise ValueError(self.maxTime)
+        starts, ends = self.starts, self.ends
+        i = bisect_left(starts, minTime)
+        # the neighbours on either side are the only candidates for overlap
+        for j in (i - 1, i):
+            if 0 <= j < len(starts) and starts[j] < maxTime and minTime < ends[j]:
+                if starts[j] == minTime and ends[j] == maxTime:
+                    raise ValueError(self._interval(j))
+                if self.strict:
+                    raise ValueError(Interval(minTime, maxTime, mark), self._interval(j))
+                logging.warning("Overlap for interval %s: (%f, %f)",
+                                mark, minTime, maxTime)
+        starts.insert(i, minTime)
+        ends.insert(i, maxTime)
+        self.codes.insert(i, self.markTable.code(mark))
+
+    def removeInterval(self, interval):
+        i = bisect_left(self.starts, interval.minTime)
+        while i < len(self.starts) and self.starts[i] == interval.minTime:
+            if self.ends[i] == interval.maxTime:
+                del self.starts[i]
+                del self.ends[i]
+                del self.codes[i]
+                return
+            i += 1
+        raise ValueError(interval)
+
+    def indexContaining(self, time):
+        """
+        Returns the index of the interval containing the given time point,
+        or None if the time point is outside the bounds of this tier. The
+        argument can be a numeric type, or a Point object.
+        """
+        if hasattr(time, 'time'):
+            time = time.time
+        i = bisect_left(self.ends, time)
+        if i != len(self.ends) and self.starts[i] <= time:
+            return i
+
+    def indicesBetween(self, minTime, maxTime):
+        """
+        Returns the range of indices of the intervals overlapping the span
+        from minTime to maxTime.
+        """
+        return range(bisect_right(self.ends, minTime),
+                     bisect_left(self.starts, maxTime))
+
+    def extendSorted(self, intervals):
+        rows = list(intervals)
+        last = (self.starts[-1], self.ends[-1]) if len(self.starts) else None
+        _checkSorted(rows, self.minTime, self.maxTime, last, self.strict)
+        code = self.markTable.code
+        self.starts.extend([row[0] for row in rows])
+        self.ends.extend([row[1] for row in rows])
+        self.codes.extend([code(row[2]) for row in rows])
+
+    @classmethod
+    def fromTier(cls, tier):
+        """
+        Columnar copy of an IntervalTier.
+        """
+        return cls.fromSorted([(i.minTime, i.maxTime, i.mark) for i in tier],
+                              tier.name, tier.minTime, tier.maxTime, tier.strict)
 
 
 class TextGrid(object):
@@ -670,9 +1094,11 @@ class TextGrid(object):
     def append(self, tier):
         if self.maxTime is not None and tier.maxTime is not None and tier.maxTime > self.maxTime:
             raise ValueError(self.maxTime)  # too late
+        if type(tier) is IntervalTier and tier.strict != self.strict:
+            # intervals share the flag of the tier they were added through
+            for i in tier.intervals:
+                i.strict = self.strict
         tier.strict = self.strict
-        for i in tier:
-            i.strict = self.strict
         self.tiers.append(tier)
 
     def extend(self, tiers):
@@ -689,122 +1115,286 @@ class TextGrid(object):
         """
         return (self.tiers.pop(i) if i else self.tiers.pop())
 
-    def read(self, f, round_digits=DEFAULT_TEXTGRID_PRECISION, encoding=None):
+    def read(self, f, round_digits=DEFAULT_TEXTGRID_PRECISION, encoding=None,
+             columnar=False, tiers=None):
         """
         Read the tiers contained in the Praat-formatted TextGrid file
-        indicated by string f. Times are rounded to the specified precision.
+        indicated by string f (or a file object). Times are rounded to the
+        specified precision. Both the long and the short text format are
+        read in a single pass over the file contents. If columnar is True,
+        tiers are read into ColumnarIntervalTier/ColumnarPointTier. tiers
+        selects the tiers to read by name or position (see iterTiers);
+        the others are skipped without building their intervals. Files in
+        Praat's binary format are recognized by their header.
         """
-        if encoding is None:
-            encoding = detectEncoding(f)
-        with codecs.open(f, 'r', encoding=encoding) as source:
-            file_type, short = parse_header(source)
-            if file_type != 'TextGrid':
-                raise TextGridError('The file could not be parsed as a TextGrid as it is lacking a proper header.')
+        for tier in self._iterTiers(f, tiers, round_digits, encoding, columnar,
+                                    lazy=tiers is not None):
+            self.append(tier)
 
-            first_line_beside_header = source.readline()
-            try:
-                parse_line(first_line_beside_header, short, round_digits)
-            except Exception:
-                short = True
-
-            self.minTime = parse_line(first_line_beside_header, short, round_digits)
-            self.maxTime = parse_line(source.readline(), short, round_digits)
-            source.readline()  # more header junk
-            if short:
-                m = int(source.readline().strip())  # will be self.n
-            else:
-                m = int(source.readline().strip().split()[2])  # will be self.n
-            if not short:
-                source.readline()
-            for i in range(m):  # loop over grids
-                if not short:
-                    source.readline()
-                if parse_line(source.readline(), short, round_digits) == 'IntervalTier':
-                    inam = parse_line(source.readline(), short, round_digits)
-                    imin = parse_line(source.readline(), short, round_digits)
-                    imax = parse_line(source.readline(), short, round_digits)
-                    itie = IntervalTier(inam, imin, imax)
-                    itie.strict = self.strict
-                    n = int(parse_line(source.readline(), short, round_digits))
+    def iterTiers(self, f, tiers=None, round_digits=DEFAULT_TEXTGRID_PRECISION,
+                  encoding=None, columnar=False):
+        """
+        Generator over the tiers of the TextGrid file f, built one at a
+        time as the file is scanned, so only the current tier is held in
+        memory. The tiers are not appended to this TextGrid; its minTime
+        and maxTime are set from the file once iteration starts.
+
+        tiers may be a tier name, a position in the file (0-based, as in
+        tg[1]) or a list of those; tiers that don't match are skipped
+        without building their intervals.
+        """
+        return self._iterTiers(f, tiers, round_digits, encoding, columnar, lazy=True)
+
+    def _iterTiers(self, f, tiers, round_digits, encoding, columnar, lazy):
+        data = _readData(f)
+        if isinstance(data, bytes):
+            if data.startswith(BINARY_HEADER):
+                return self._walkBinary(data, tiers, round_digits, columnar)
+            data = _decodeBuffer(data, encoding)
+        tokens = _iterTokens(data) if lazy else iter(_tokenize(data))
+        return self._walkTiers(tokens, tiers, round_digits, columnar)
+
+    def _walkBinary(self, data, tiers, round_digits, columnar):
+        selected, last = _tierFilter(tiers)
+        try:
+            object_class, pos = _unpackString(data, len(BINARY_HEADER), _BINARY_U8)
+            if object_class != 'TextGrid':
+                raise TextGridError('The file could not be parsed as a TextGrid as it is lacking a proper header.')
+            xmin, xmax = _BINARY_RANGE.unpack_from(data, pos)
+            self.minTime = round(xmin, round_digits)
+            self.maxTime = round(xmax, round_digits)
+            exists, = _BINARY_U8.unpack_from(data, pos + 16)
+            if not exists:
+                return  # no tiers
+            m, = _BINARY_INT.unpack_from(data, pos + 17)
+            pos += 21
+            unpack_range = _BINARY_RANGE.unpack_from
+            unpack_time = _BINARY_TIME.unpack_from
+            for i in range(m):  # loop over tiers
+                if last is not None and i > last:
+                    return  # nothing left to select
+                tier_class, pos = _unpackString(data, pos, _BINARY_U8)
+                name, pos = _unpackString(data, pos, _BINARY_U16)
+                tmin, tmax, n = _BINARY_TIER.unpack_from(data, pos)
+                pos += _BINARY_TIER.size
+                tmin = round(tmin, round_digits)
+                tmax = round(tmax, round_digits)
+                keep = selected(i, name)
+                rows = []
+                if tier_class == 'IntervalTier':
                     for j in range(n):
-                        if not short:
-                            source.readline().rstrip().split()  # header junk
-                        jmin = parse_line(source.readline(), short, round_digits)
-                        jmax = parse_line(source.readline(), short, round_digits)
-                        jmrk = _getMark(source, short)
-                        if jmin < jmax:  # non-null
-                            itie.addInterval(Interval(jmin, jmax, jmrk))
-                    self.append(itie)
+                        jmin, jmax = unpack_range(data, pos)
+                        jmrk, pos = _unpackString(data, pos + 16)
+                        jmin = round(jmin, round_digits)
+                        jmax = round(jmax, round_digits)
+                        if keep and jmin < jmax:  # non-null
+                            rows.append((jmin, jmax, jmrk))
+                    if not keep:
+                        continue
+                    tier = (ColumnarIntervalTier if columnar else IntervalTier)(name, tmin, tmax)
+                    tier.strict = self.strict
+                    rows.sort()  # a no-op pass for files written by Praat
+                    tier.extendSorted(rows)
                 else:  # pointTier
-                    inam = parse_line(source.readline(), short, round_digits)
-                    imin = parse_line(source.readline(), short, round_digits)
-                    imax = parse_line(source.readline(), short, round_digits)
-                    itie = PointTier(inam)
-                    n = int(parse_line(source.readline(), short, round_digits))
                     for j in range(n):
-                        source.readline().rstrip()  # header junk
-                        jtim = parse_line(source.readline(), short, round_digits)
-                        jmrk = _getMark(source, short)
-                        itie.addPoint(Point(jtim, jmrk))
-                    self.append(itie)
-
-    def write(self, f, null=''):
+                        jtim, = unpack_time(data, pos)
+                        jmrk, pos = _unpackString(data, pos + 8)
+                        if keep:
+                            rows.append((round(jtim, round_digits), jmrk))
+                    if not keep:
+                        continue
+                    tier = (ColumnarPointTier if columnar else PointTier)(name)
+                    for jtim, jmrk in rows:
+                        tier.add(jtim, jmrk)
+                yield tier
+        except struct.error:
+            raise TextGridError('The TextGrid file ended unexpectedly.')
+
+    def _walkTiers(self, tokens, tiers, round_digits, columnar):
+        selected, last = _tierFilter(tiers)
+        _checkHeader(list(islice(tokens, 2)), 'TextGrid')
+        try:
+            self.minTime = round(_number(next(tokens)), round_digits)
+            self.maxTime = round(_number(next(tokens)), round_digits)
+            token = next(tokens, None)
+            if token in ('exists', 'absent'):
+                if token == 'absent':
+                    return  # no tiers
+                token = next(tokens, None)
+            if token is None:
+                return  # no tiers
+            m = int(_number(token))
+            for i in range(m):  # loop over tiers
+                if last is not None and i > last:
+                    return  # nothing left to select
+                tier_class = _unquote(next(tokens))
+                name = _unquote(next(tokens))
+                tmin = round(_number(next(tokens)), round_digits)
+                tmax = round(_number(next(tokens)), round_digits)
+                n = int(_number(next(tokens)))
+                width = 3 if tier_class == 'IntervalTier' else 2
+                if not selected(i, name):
+                    # skip the tier's values, advancing the iterator; the
+                    # last one is read, so a truncated tier raises as it
+                    # would if selected
+                    if n:
+                        next(islice(tokens, width * n - 1, width * n - 1), None)
+                        next(tokens)
+                    continue
+                values = list(islice(tokens, width * n))
+                if len(values) < width * n:
+                    raise StopIteration
+                values = iter(values)
+                if tier_class == 'IntervalTier':
+                    tier = (ColumnarIntervalTier if columnar else IntervalTier)(name, tmin, tmax)
+                    tier.strict = self.strict
+                    rows = []
+                    try:
+                        for jmin, jmax, jmrk in zip(values, values, values):
+                            jmin = round(float(jmin), round_digits)
+                            jmax = round(float(jmax), round_digits)
+                            if jmin < jmax:  # non-null
+                                rows.append((jmin, jmax, _unquote(jmrk)))
+                    except ValueError:
+                        raise TextGridError('Expected a number in tier {0}'.format(name))
+                    rows.sort()  # a no-op pass for files written by Praat or MFA
+                    tier.extendSorted(rows)
+                else:  # pointTier
+                    tier = (ColumnarPointTier if columnar else PointTier)(name)
+                    try:
+                        rows = [(round(float(jtim), round_digits), _unquote(jmrk))
+                                for jtim, jmrk in zip(values, values)]
+                    except ValueError:
+                        raise TextGridError('Expected a number in tier {0}'.format(name))
+                    for jtim, jmrk in rows:
+                        tier.add(jtim, jmrk)
+                yield tier
+        except StopIteration:
+            raise TextGridError('The TextGrid file ended unexpectedly.')
+
+    def write(self, f, null='', format='long'):
         """
         Write the current state into a Praat-format TextGrid file. f may
         be a file object to write to, or a string naming a path to open
-        for writing.
+        for writing. format is 'long' (Praat's default text format),
+        'short' (the short text format) or 'binary'. The file is
+        serialized in memory and written in one go.
         """
-        sink = f if hasattr(f, 'write') else codecs.open(f, 'w', 'UTF-8')
-        print('File type = "ooTextFile"', file=sink)
-        print('Object class = "TextGrid"\n', file=sink)
-        print('xmin = {0}'.format(self.minTime), file=sink)
-        # compute max time
+        if format == 'binary':
+            sink = f if hasattr(f, 'write') else open(f, 'wb')
+            sink.write(self._binaryData(null))
+        elif format in ('long', 'short'):
+            lines = self._textLines(null) if format == 'long' else self._shortTextLines(null)
+            sink = f if hasattr(f, 'write') else codecs.open(f, 'w', 'UTF-8')
+            lines.append('')
+            sink.write('\n'.join(lines))
+        else:
+            raise ValueError('Unknown TextGrid format: {0}'.format(format))
+        sink.close()
+
+    def _writeMaxTime(self):
         maxT = self.maxTime
         if not maxT:
             maxT = max([t.maxTime if t.maxTime else t[-1].maxTime \
                         for t in self.tiers])
-        print('xmax = {0}'.format(maxT), file=sink)
-        print('tiers? <exists>', file=sink)
-        print('size = {0}'.format(len(self)), file=sink)
-        print('item []:', file=sink)
+        return maxT
+
+    def _textLines(self, null):
+        maxT = self._writeMaxTime()
+        lines = ['File type = "ooTextFile"',
+                 'Object class = "TextGrid"',
+                 '',
+                 'xmin = {0}'.format(self.minTime),
+                 'xmax = {0}'.format(maxT),
+                 'tiers? <exists>',
+                 'size = {0}'.format(len(self)),
+                 'item []:']
         for (i, tier) in enumerate(self.tiers, 1):
-            print('\titem [{0}]:'.format(i), file=sink)
-            if tier.__class__ == IntervalTier:
-                print('\t\tclass = "IntervalTier"', file=sink)
-                print('\t\tname = "{0}"'.format(tier.name), file=sink)
-                print('\t\txmin = {0}'.format(tier.minTime), file=sink)
-                print('\t\txmax = {0}'.format(maxT), file=sink)
+            lines.append('\titem [{0}]:'.format(i))
+            if isinstance(tier, IntervalTier):
                 # compute the number of intervals and make the empty ones
                 output = tier._fillInTheGaps(null)
-                print('\t\tintervals: size = {0}'.format(
-                    len(output)), file=sink)
-                for (j, interval) in enumerate(output, 1):
-                    print('\t\t\tintervals [{0}]:'.format(j), file=sink)
-                    print('\t\t\t\txmin = {0}'.format(
-                        interval.minTime), file=sink)
-                    print('\t\t\t\txmax = {0}'.format(
-                        interval.maxTime), file=sink)
-                    mark = _formatMark(interval.mark)
-                    print('\t\t\t\ttext = "{0}"'.format(mark), file=sink)
-            elif tier.__class__ == PointTier:  # PointTier
-                print('\t\tclass = "TextTier"', file=sink)
-                print('\t\tname = "{0}"'.format(tier.name), file=sink)
-                print('\t\txmin = {0}'.format(tier.minTime), file=sink)
-                print('\t\txmax = {0}'.format(maxT), file=sink)
-                print('\t\tpoints: size = {0}'.format(len(tier)), file=sink)
-                for (k, point) in enumerate(tier, 1):
-                    print('\t\t\tpoints [{0}]:'.format(k), file=sink)
-                    print('\t\t\t\ttime = {0}'.format(point.time), file=sink)
-                    mark = _formatMark(point.mark)
-                    print('\t\t\t\tmark = "{0}"'.format(mark), file=sink)
-        sink.close()
+                lines += ['\t\tclass = "IntervalTier"',
+                          '\t\tname = "{0}"'.format(tier.name),
+                          '\t\txmin = {0}'.format(tier.minTime),
+                          '\t\txmax = {0}'.format(maxT),
+                          '\t\tintervals: size = {0}'.format(len(output))]
+                entry = ('\t\t\tintervals [{0}]:\n\t\t\t\txmin = {1}\n'
+                         '\t\t\t\txmax = {2}\n\t\t\t\ttext = "{3}"').format
+                lines += [entry(j, interval.minTime, interval.maxTime,
+                                _formatMark(interval.mark))
+                          for (j, interval) in enumerate(output, 1)]
+            elif isinstance(tier, PointTier):
+                lines += ['\t\tclass = "TextTier"',
+                          '\t\tname = "{0}"'.format(tier.name),
+                          '\t\txmin = {0}'.format(tier.minTime),
+                          '\t\txmax = {0}'.format(maxT),
+                          '\t\tpoints: size = {0}'.format(len(tier))]
+                entry = ('\t\t\tpoints [{0}]:\n\t\t\t\ttime = {1}\n'
+                         '\t\t\t\tmark = "{2}"').format
+                lines += [entry(k, point.time, _formatMark(point.mark))
+                          for (k, point) in enumerate(tier, 1)]
+        return lines
+
+    def _shortTextLines(self, null):
+        maxT = self._writeMaxTime()
+        lines = ['File type = "ooTextFile"',
+                 'Object class = "TextGrid"',
+                 '',
+                 '{0}'.format(self.minTime),
+                 '{0}'.format(maxT),
+                 '<exists>',
+                 '{0}'.format(len(self))]
+        for tier in self.tiers:
+            if isinstance(tier, IntervalTier):
+                output = tier._fillInTheGaps(null)
+                lines += ['"IntervalTier"', '"{0}"'.format(tier.name),
+                          '{0}'.format(tier.minTime), '{0}'.format(maxT),
+                          '{0}'.format(len(output))]
+                entry = '{0}\n{1}\n"{2}"'.format
+                lines += [entry(interval.minTime, interval.maxTime,
+                                _formatMark(interval.mark))
+                          for interval in output]
+            elif isinstance(tier, PointTier):
+                lines += ['"TextTier"', '"{0}"'.format(tier.name),
+                          '{0}'.format(tier.minTime), '{0}'.format(maxT),
+                          '{0}'.format(len(tier))]
+                entry = '{0}\n"{1}"'.format
+                lines += [entry(point.time, _formatMark(point.mark))
+                          for point in tier]
+        return lines
+
+    def _binaryData(self, null):
+        maxT = self._writeMaxTime()
+        chunks = [BINARY_HEADER, _packString('TextGrid', _BINARY_U8),
+                  _BINARY_RANGE.pack(self.minTime, maxT),
+                  _BINARY_U8.pack(1), _BINARY_INT.pack(len(self))]
+        for tier in self.tiers:
+            if isinstance(tier, IntervalTier):
+                output = tier._fillInTheGaps(null)
+                chunks += [_packString('IntervalTier', _BINARY_U8),
+                           _packString('{0}'.format(tier.name)),
+                           _BINARY_TIER.pack(tier.minTime, maxT, len(output))]
+                pack_range = _BINARY_RANGE.pack
+                for interval in output:
+                    chunks.append(pack_range(interval.minTime, interval.maxTime))
+                    chunks.append(_packString(interval.mark))
+            elif isinstance(tier, PointTier):
+                chunks += [_packString('TextTier', _BINARY_U8),
+                           _packString('{0}'.format(tier.name)),
+                           _BINARY_TIER.pack(tier.minTime, maxT, len(tier))]
+                pack_time = _BINARY_TIME.pack
+                for point in tier:
+                    chunks.append(pack_time(point.time))
+                    chunks.append(_packString(point.mark))
+        return b''.join(chunks)
 
     # alternative constructor
 
     @classmethod
-    def fromFile(cls, f, name=None):
+    def fromFile(cls, f, name=None, columnar=False, tiers=None):
         tg = cls(name=name)
-        tg.read(f)
+        tg.read(f, columnar=columnar, tiers=tiers)
         return tg
 
 
@@ -847,44 +1437,8 @@ class MLF(object):
         while True:  # loop over text
             name = re.match('\"(.*)\"', source.readline().rstrip())
             if name:
-                name = name.groups()[0]
-                grid = TextGrid(name)
-                phon = IntervalTier(name='phones')
-                word = IntervalTier(name='words')
-                wmrk = ''
-                wsrt = 0.
-                wend = 0.
-                while 1:  # loop over the lines in each grid
-                    line = source.readline().rstrip().split()
-                    if len(line) == 4:  # word on this baby
-                        pmin = round(float(line[0]) / samplerate, round_digits)
-                        pmax = round(float(line[1]) / samplerate, round_digits)
-                        if pmin == pmax:
-                            raise ValueError('null duration interval')
-                        phon.add(pmin, pmax, line[2])
-                        if wmrk:
-                            word.add(wsrt, wend, wmrk)
-                        wmrk = decode(line[3])
-                        wsrt = pmin
-                        wend = pmax
-                    elif len(line) == 3:  # just phone
-                        pmin = round(float(line[0]) / samplerate, round_digits)
-                        pmax = round(float(line[1]) / samplerate, round_digits)
-                        if line[2] == 'sp' and pmin != pmax:
-                            if wmrk:
-                                word.add(wsrt, wend, wmrk)
-                            wmrk = decode(line[2])
-                            wsrt = pmin
-                            wend = pmax
-                        elif pmin != pmax:
-                            phon.add(pmin, pmax, line[2])
-                        wend = pmax
-                    else:  # it's a period
-                        word.add(wsrt, wend, wmrk)
-                        self.grids.append(grid)
-                        break
-                grid.append(phon)
-                grid.append(word)
+                self.grids.append(_readMLFUtterance(
+                    source.readline, name.groups()[0], samplerate, round_digits))
             else:
                 source.close()
                 break
@@ -901,8 +1455,167 @@ class MLF(object):
         The number of TextGrids is returned.
         """
         for grid in self.grids:
-            (junk, tail) = os.path.split(grid.name)
-            (root, junk) = os.path.splitext(tail)
-            my_path = os.path.join(prefix, root + '.TextGrid')
+            my_path = _mlfTextGridPath(prefix, grid.name)
             grid.write(codecs.open(my_path, 'w', 'UTF-8'))
         return len(self.grids)
+
+
+class MLFIndex(object):
+    """
+    Index of the utterances in a HTK .mlf file, mapping each label file
+    name to the byte offset of its first label line. The index is built in
+    a single scan, after which any utterance can be loaded as a TextGrid
+    on its own, without parsing the rest of the file. Iterating over the
+    index gives the utterance names in file order.
+    """
+
+    def __init__(self, f, samplerate=10e6, round_digits=DEFAULT_MLF_PRECISION):
+        self.path = f
+        self.samplerate = samplerate
+        self.round_digits = round_digits
+        self.entries = []  # (name, offset), in file order
+        self.offsets = {}
+        with open(f, 'rb') as source:
+            try:
+                data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return
+            try:
+                for m in _MLF_NAME.finditer(data):
+                    name = m.group(1).decode('utf-8')
+                    offset = m.end() + 1  # past the newline
+                    self.entries.append((name, offset))
+                    self.offsets.setdefault(name, offset)
+            finally:
+                data.close()
+
+    def __iter__(self):
+        return (name for name, offset in self.entries)
+
+    def __str__(self):
+        return '<MLFIndex {0}, {1} utterances>'.format(self.path, len(self))
+
+    def __repr__(self):
+        return 'MLFIndex({0})'.format(self.path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def load(self, name):
+        """
+        Return the TextGrid of the utterance with the given label file
+        name. Raises KeyError if there is no such utterance.
+        """
+        with open(self.path, 'rb') as source:
+            return self._load(source, name, self.offsets[name])
+
+    def _load(self, source, name, offset):
+        source.seek(offset)
+        readline = lambda: source.readline().decode('utf-8')
+        return _readMLFUtterance(readline, name, self.samplerate, self.round_digits)
+
+    def iterGrids(self, names=None):
+        """
+        Generator over the TextGrids of the given utterances (default:
+        all), loaded one at a time in file order.
+        """
+        if names is None:
+            entries = self.entries
+        else:
+            entries = sorted(((name, self.offsets[name]) for name in names),
+                             key=lambda entry: entry[1])
+        with open(self.path, 'rb') as source:
+            for name, offset in entries:
+                yield self._load(source, name, offset)
+
+    def convert(self, prefix='', processes=None, format='long', chunk_size=64):
+        """
+        Write every utterance to its own TextGrid, named as in MLF.write,
+        spreading the work over a pool of processes (default: one per
+        CPU; 1 converts in this process). format is passed on to
+        TextGrid.write. The number of TextGrids is returned.
+        """
+        chunks = [(self.path, self.samplerate, self.round_digits, prefix, format,
+                   self.entries[i:i + chunk_size])
+                  for i in range(0, len(self.entries), chunk_size)]
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes == 1 or len(chunks) < 2:
+            return sum(map(_convertMLFChunk, chunks))
+        pool = multiprocessing.Pool(processes)
+        try:
+            return sum(pool.imap_unordered(_convertMLFChunk, chunks))
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _mlfTextGridPath(prefix, name):
+    """
+    Path of the TextGrid written for the label file name: its base name in
+    the prefix folder.
+    """
+    (junk, tail) = os.path.split(name)
+    (root, junk) = os.path.splitext(tail)
+    return os.path.join(prefix, root + '.TextGrid')
+
+
+def _convertMLFChunk(args):
+    path, samplerate, round_digits, prefix, format, entries = args
+    index = MLFIndex.__new__(MLFIndex)
+    index.path = path
+    index.samplerate = samplerate
+    index.round_digits = round_digits
+    with open(path, 'rb') as source:
+        for name, offset in entries:
+            grid = index._load(source, name, offset)
+            grid.write(_mlfTextGridPath(prefix, name), format=format)
+    return len(entries)
+
+
+def _readMLFUtterance(readline, name, samplerate, round_digits):
+    """
+    Build the TextGrid of one utterance of a MLF file from its label
+    lines, read with readline up to the closing period (or the end of the
+    file).
+    """
+    grid = TextGrid(name)
+    phon = []  # (minTime, maxTime, mark) rows, in file order
+    word = []
+    wmrk = ''
+    wsrt = 0.
+    wend = 0.
+    while 1:  # loop over the lines in each grid
+        line = readline().rstrip().split()
+        if len(line) == 4:  # word on this baby
+            pmin = round(float(line[0]) / samplerate, round_digits)
+            pmax = round(float(line[1]) / samplerate, round_digits)
+            if pmin == pmax:
+                raise ValueError('null duration interval')
+            phon.append((pmin, pmax, line[2]))
+            if wmrk:
+                word.append((wsrt, wend, wmrk))
+            wmrk = decode(line[3])
+            wsrt = pmin
+            wend = pmax
+        elif len(line) == 3:  # just phone
+            pmin = round(float(line[0]) / samplerate, round_digits)
+            pmax = round(float(line[1]) / samplerate, round_digits)
+            if line[2] == 'sp' and pmin != pmax:
+                if wmrk:
+                    word.append((wsrt, wend, wmrk))
+                wmrk = decode(line[2])
+                wsrt = pmin
+                wend = pmax
+            elif pmin != pmax:
+                phon.append((pmin, pmax, line[2]))
+            wend = pmax
+        else:  # it's a period
+            word.append((wsrt, wend, wmrk))
+            break
+    grid.append(IntervalTier.fromSorted(phon, name='phones'))
+    grid.append(IntervalTier.fromSorted(word, name='words'))
+    return grid